@@ -0,0 +1,208 @@
+"""
+Capacity-aware batch assignment of urgent clients to therapists.
+
+Ranking clients one at a time points many urgent clients at the same few
+top-rated therapists. ``assign_urgent_clients`` instead takes every pending
+crisis/high-urgency client and every therapist's remaining capacity and
+solves one minimum-cost bipartite matching over the match scores:
+
+* each client is a row; each therapist contributes one column per free
+  slot (capped at the number of clients that could use it);
+* a client's edges go to the slots of their ``candidates`` best-ranked
+  therapists, costing ``COST_BASE - score``;
+* every client also has a private "unassigned" column, so a full matching
+  always exists. Its cost is ``COST_BASE`` plus an urgency penalty, which
+  makes scarce capacity go to crisis clients first.
+
+The sparse matching is solved with SciPy's LAPJVsp implementation; for
+thousands of clients it takes about a second, most of a batch's time goes
+into ranking each client's candidates.
+
+A therapist's caseload is their clients with an upcoming booked session
+(``professional.Appointment``) plus their assignments. An assignment is
+released once its client books a session, which then counts instead, or
+after CLIENT_ASSIGNMENT_DAYS without one, so the client can be assigned
+again. A run holds row locks on the therapists' profiles from reading
+their capacity until it stores its assignments, so concurrent runs never
+fill a therapist past ``max_active_clients``.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+
+from .matching_engine import TherapistPool
+from .matching_index import CandidateIndex
+from apps.professional.models import Appointment
+from apps.professional.slots import BOOKED_STATUSES
+from .models import ClientAssignment, ClientPreferences, TherapistProfile
+
+URGENT_LEVELS = ('crisis', 'high')
+
+# Therapists each client may be assigned to, taken from the top of their ranking
+DEFAULT_CANDIDATES = 25
+# Overall scores stay below 1.25 (urgency multiplier included), so
+# COST_BASE - score is always a positive edge cost
+COST_BASE = 2.0
+# Extra cost of leaving a client unassigned, on top of forgoing their score
+UNASSIGNED_PENALTY = {'crisis': 1.0, 'high': 0.0}
+
+
+def get_assignment_days() -> int:
+    return getattr(settings, 'CLIENT_ASSIGNMENT_DAYS', 7)
+
+
+def upcoming_sessions(now: Optional[datetime] = None):
+    """Booked appointments that have not started yet."""
+    return Appointment.objects.filter(status__in=BOOKED_STATUSES, date_time__gte=now or timezone.now())
+
+
+def release_assignments(now: Optional[datetime] = None) -> int:
+    """Delete assignments whose client booked a session or that expired; returns how many."""
+    now = now or timezone.now()
+    deleted, _ = ClientAssignment.objects.filter(
+        Q(client_id__in=upcoming_sessions(now).values('user_id'))
+        | Q(created_at__lte=now - timedelta(days=get_assignment_days()))
+    ).delete()
+    return deleted
+
+
+def pending_urgent_clients() -> List[ClientPreferences]:
+    """Urgent clients without an assignment or an upcoming appointment."""
+    return list(
+        ClientPreferences.objects.filter(
+            urgency__in=URGENT_LEVELS,
+            user__is_active=True,
+            user__therapist_assignment__isnull=True,
+        ).exclude(
+            user_id__in=upcoming_sessions().values('user_id')
+        ).select_related('user').order_by('pk')
+    )
+
+
+def remaining_capacity(profiles: List[TherapistProfile]) -> Dict[int, int]:
+    """Free client slots per therapist user id."""
+    user_ids = [profile.user_id for profile in profiles]
+    active = defaultdict(set)
+    for therapist_id, client_id in upcoming_sessions().filter(
+        therapist__user_id__in=user_ids,
+    ).values_list('therapist__user_id', 'user_id').distinct():
+        active[therapist_id].add(client_id)
+    for therapist_id, client_id in ClientAssignment.objects.filter(
+        therapist_id__in=user_ids
+    ).values_list('therapist_id', 'client_id'):
+        active[therapist_id].add(client_id)
+    return {
+        profile.user_id: max(profile.max_active_clients - len(active[profile.user_id]), 0)
+        for profile in profiles
+    }
+
+
+def solve_assignment(clients: List[ClientPreferences], pool: TherapistPool,
+                     capacity: Dict[int, int], service,
+                     candidates: int = DEFAULT_CANDIDATES) -> List[Tuple[int, Optional[int], Optional[float]]]:
+    """
+    Assign clients to pool therapists within their capacity.
+
+    Returns ``(client user id, therapist user id, score)`` per client, in
+    input order; therapist and score are None for unassigned clients.
+    """
+    if not clients:
+        return []
+    index = CandidateIndex(pool)
+
+    # Each client's best candidates and their rounded overall scores
+    options = []
+    demand = np.zeros(len(pool), dtype=np.int64)
+    for client_prefs in clients:
+        multiplier = service._get_urgency_multiplier(client_prefs.urgency)
+        ranked = index.rank(client_prefs, service.weights, multiplier, candidates)
+        overall = pool.score(client_prefs, service.weights, multiplier, rows=ranked)['overall_score']
+        options.append((ranked, [round(value, 3) for value in overall.tolist()]))
+        demand[ranked] += 1
+
+    # One column per usable slot of every therapist
+    slots = np.minimum(
+        np.array([capacity.get(profile.user_id, 0) for profile in pool.profiles], dtype=np.int64),
+        demand,
+    )
+    slot_start = np.concatenate(([0], np.cumsum(slots)))
+    slot_owner = np.repeat(np.arange(len(pool)), slots)
+    slot_count = int(slot_start[-1])
+
+    # Edges from every client to each slot of its candidates
+    client_rows = np.repeat(np.arange(len(clients)), [len(ranked) for ranked, _ in options])
+    therapist_rows = np.concatenate([ranked for ranked, _ in options])
+    edge_costs = COST_BASE - np.concatenate([scores for _, scores in options])
+    counts = slots[therapist_rows]
+    first_edge = np.repeat(np.cumsum(counts) - counts, counts)
+    rows = np.repeat(client_rows, counts)
+    columns = np.repeat(slot_start[therapist_rows], counts) + np.arange(counts.sum()) - first_edge
+    costs = np.repeat(edge_costs, counts)
+
+    # Plus each client's own "unassigned" column
+    rows = np.concatenate((rows, np.arange(len(clients))))
+    columns = np.concatenate((columns, slot_count + np.arange(len(clients))))
+    costs = np.concatenate((costs, [
+        COST_BASE + UNASSIGNED_PENALTY.get(client_prefs.urgency, 0.0) for client_prefs in clients
+    ]))
+
+    graph = csr_matrix((costs, (rows, columns)), shape=(len(clients), slot_count + len(clients)))
+    matched_rows, matched_columns = min_weight_full_bipartite_matching(graph)
+
+    results = []
+    for client_row, column in sorted(zip(matched_rows.tolist(), matched_columns.tolist())):
+        client_id = clients[client_row].user_id
+        if column >= slot_count:
+            results.append((client_id, None, None))
+            continue
+        therapist_row = int(slot_owner[column])
+        ranked, scores = options[client_row]
+        score = scores[ranked.tolist().index(therapist_row)]
+        results.append((client_id, pool.profiles[therapist_row].user_id, score))
+    return results
+
+
+def assign_urgent_clients(service, candidates: int = DEFAULT_CANDIDATES,
+                          dry_run: bool = False) -> List[Tuple[int, Optional[int], Optional[float]]]:
+    """
+    Assign every pending urgent client in one pass and store the result.
+
+    Released assignments go first. Only accepting therapists with free
+    capacity take part. With ``dry_run`` nothing is written or locked.
+    """
+    with transaction.atomic():
+        profiles = TherapistProfile.objects.filter(
+            search_entry__is_matchable=True,
+        ).select_related('user').order_by('pk')
+        if not dry_run:
+            # Being a write, this also takes SQLite's database lock before
+            # anything is read, which serializes runs there
+            release_assignments()
+            # Elsewhere runs serialize on the profile rows. Clients and
+            # capacity are read after the lock, so they include everything
+            # an earlier run committed
+            profiles = profiles.select_for_update(of=('self',))
+        profiles = list(profiles)
+        clients = pending_urgent_clients()
+        if not clients:
+            return []
+        capacity = remaining_capacity(profiles)
+        pool = TherapistPool([profile for profile in profiles if capacity[profile.user_id] > 0])
+        results = solve_assignment(clients, pool, capacity, service, candidates)
+
+        if not dry_run:
+            ClientAssignment.objects.bulk_create([
+                ClientAssignment(client_id=client_id, therapist_id=therapist_id, score=score)
+                for client_id, therapist_id, score in results
+                if therapist_id is not None
+            ])
+    return results
@@ -0,0 +1,146 @@
+"""
+Interval index of therapists' weekly free time.
+
+Free time is the therapist's ``professional.TherapistAvailability`` slots
+minus their scheduled or confirmed ``professional.Appointment`` bookings of
+the coming week, laid out on a minute-of-week axis (Monday 00:00 = 0). The
+free intervals of every indexed therapist live in one sorted array, row ``r``
+offset by ``r * MINUTES_PER_WEEK``, together with prefix sums of their
+lengths. The free minutes inside any window are then two binary searches
+away, so the overlap between a client's windows and a therapist's free time
+costs O(log n) per window.
+"""
+
+from datetime import timedelta
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from django.utils import timezone
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+# Daily windows behind the ClientPreferences.preferred_times labels, as
+# described on the preferences form
+TIME_WINDOWS = {
+    'morning': (8 * 60, 12 * 60),
+    'afternoon': (12 * 60, 17 * 60),
+    'evening': (17 * 60, 20 * 60),
+}
+
+BOOKED_STATUSES = ('scheduled', 'confirmed')
+
+
+def client_windows(preferred_times: Sequence[str]) -> List[Tuple[int, int]]:
+    """Minute-of-week windows of a client's preferred time labels, every day."""
+    daily = sorted({TIME_WINDOWS[label] for label in preferred_times if label in TIME_WINDOWS})
+    return [
+        (day * MINUTES_PER_DAY + start, day * MINUTES_PER_DAY + end)
+        for day in range(7)
+        for start, end in daily
+    ]
+
+
+def merge_intervals(intervals: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Sort and merge overlapping or touching intervals."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(free: List[Tuple[int, int]],
+                       busy: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Sweep merged ``busy`` intervals out of merged ``free`` intervals."""
+    result = []
+    busy_index = 0
+    for start, end in free:
+        while busy_index < len(busy) and busy[busy_index][1] <= start:
+            busy_index += 1
+        cursor = start
+        scan = busy_index
+        while scan < len(busy) and busy[scan][0] < end:
+            if busy[scan][0] > cursor:
+                result.append((cursor, busy[scan][0]))
+            cursor = max(cursor, busy[scan][1])
+            scan += 1
+        if cursor < end:
+            result.append((cursor, end))
+    return result
+
+
+class AvailabilityIndex:
+    """Sorted free intervals of a list of therapists (indexed by row)."""
+
+    def __init__(self, free_intervals: List[List[Tuple[int, int]]], has_slots: np.ndarray):
+        self.has_slots = has_slots
+        starts, ends = [], []
+        for row, intervals in enumerate(free_intervals):
+            offset = row * MINUTES_PER_WEEK
+            for start, end in intervals:
+                starts.append(offset + start)
+                ends.append(offset + end)
+        self.starts = np.array(starts, dtype=np.int64)
+        self.ends = np.array(ends, dtype=np.int64)
+        # prefix[i] = free minutes in all intervals before interval i
+        self.prefix = np.concatenate(([0], np.cumsum(self.ends - self.starts)))[:-1]
+
+    @classmethod
+    def build(cls, therapist_user_ids: List[int]) -> 'AvailabilityIndex':
+        """Index the weekly free time of therapists, given by user id."""
+        from apps.professional.models import Appointment, TherapistAvailability
+
+        rows = {user_id: row for row, user_id in enumerate(therapist_user_ids)}
+        slots: Dict[int, list] = {row: [] for row in rows.values()}
+        for user_id, weekday, start_time, end_time in TherapistAvailability.objects.filter(
+            therapist__user_id__in=therapist_user_ids, is_available=True
+        ).values_list('therapist__user_id', 'weekday', 'start_time', 'end_time'):
+            start = start_time.hour * 60 + start_time.minute
+            end = end_time.hour * 60 + end_time.minute or MINUTES_PER_DAY
+            if end > start:
+                offset = weekday * MINUTES_PER_DAY
+                slots[rows[user_id]].append((offset + start, offset + end))
+
+        now = timezone.now()
+        bookings: Dict[int, list] = {row: [] for row in rows.values()}
+        for user_id, date_time, duration in Appointment.objects.filter(
+            therapist__user_id__in=therapist_user_ids,
+            status__in=BOOKED_STATUSES,
+            date_time__gte=now,
+            date_time__lt=now + timedelta(days=7),
+        ).values_list('therapist__user_id', 'date_time', 'duration_minutes'):
+            local = timezone.localtime(date_time)
+            start = local.weekday() * MINUTES_PER_DAY + local.hour * 60 + local.minute
+            end = start + duration
+            bookings[rows[user_id]].append((start, min(end, MINUTES_PER_WEEK)))
+            if end > MINUTES_PER_WEEK:  # wraps past Sunday midnight
+                bookings[rows[user_id]].append((0, end - MINUTES_PER_WEEK))
+
+        free = [
+            subtract_intervals(merge_intervals(slots[row]), merge_intervals(bookings[row]))
+            for row in range(len(therapist_user_ids))
+        ]
+        has_slots = np.array([bool(slots[row]) for row in range(len(therapist_user_ids))], dtype=bool)
+        return cls(free, has_slots)
+
+    def free_minutes_before(self, points: np.ndarray) -> np.ndarray:
+        """Total indexed free minutes before each global minute in ``points``."""
+        if not len(self.starts):
+            return np.zeros(np.shape(points), dtype=np.int64)
+        last = np.searchsorted(self.starts, points, side='right') - 1
+        clipped = np.maximum(last, 0)
+        inside = np.clip(points - self.starts[clipped], 0, self.ends[clipped] - self.starts[clipped])
+        return np.where(last >= 0, self.prefix[clipped] + inside, 0)
+
+    def overlap_minutes(self, windows: List[Tuple[int, int]], rows: np.ndarray) -> np.ndarray:
+        """Free minutes inside ``windows`` for each therapist row in ``rows``."""
+        if not windows:
+            return np.zeros(len(rows), dtype=np.int64)
+        bounds = np.array(windows, dtype=np.int64)
+        offsets = np.asarray(rows, dtype=np.int64)[:, None] * MINUTES_PER_WEEK
+        covered = (self.free_minutes_before(offsets + bounds[:, 1])
+                   - self.free_minutes_before(offsets + bounds[:, 0]))
+        return covered.sum(axis=1)
@@ -0,0 +1,103 @@
+"""
+Version counters, statistics counters and locks of the versioned caches.
+
+A versioned cache puts a global version into every key, so bumping the
+version makes every entry computed before unaddressable. That only works
+if every worker process reads the same counter. The counters therefore
+live in the ``coordination`` cache alias rather than next to the cached
+results: they must never be culled by the results' LRU limit, and in
+production the alias is a Redis cache shared by all workers. The same
+goes for the locks that let one worker compute a missing entry while the
+others wait for it.
+``manage.py check --deploy`` reports an error while it is process-local.
+"""
+
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+
+# Backends whose entries only the process that wrote them can see
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def get_alias() -> str:
+    return getattr(settings, 'COORDINATION_CACHE_ALIAS', 'coordination')
+
+
+def get_cache():
+    return caches[get_alias()]
+
+
+def current(key: str) -> int:
+    """Current value of the version counter ``key``."""
+    cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a lost counter never reuses an old version
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump(key: str) -> None:
+    """Move the version counter ``key`` on, invalidating every entry keyed on it."""
+    try:
+        get_cache().incr(key)
+    except ValueError:
+        current(key)
+
+
+def count(key: str) -> None:
+    """Add one to the statistics counter ``key``."""
+    cache = get_cache()
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, timeout=None)
+
+
+def acquire(key: str, token: str, timeout: int) -> bool:
+    """Take the lock ``key`` for ``token`` unless another holder has it."""
+    return get_cache().add(key, token, timeout=timeout)
+
+
+def is_held(key: str) -> bool:
+    return get_cache().get(key) is not None
+
+
+def release(key: str, token: str) -> None:
+    """Drop the lock ``key`` if ``token`` still holds it."""
+    cache = get_cache()
+    if cache.get(key) == token:
+        cache.delete(key)
+
+
+def process_local() -> Optional[str]:
+    """The coordination cache's backend when each process has its own, else None."""
+    backend = settings.CACHES.get(get_alias(), {}).get('BACKEND')
+    return backend if backend in PROCESS_LOCAL_BACKENDS else None
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_coordination_cache(app_configs, **kwargs):
+    if get_alias() not in settings.CACHES:
+        return [checks.Error(
+            f"CACHES has no '{get_alias()}' alias for cache version counters.",
+            id='appointments.E001',
+        )]
+    backend = process_local()
+    if backend:
+        return [checks.Error(
+            f"The '{get_alias()}' cache uses {backend}, which every worker process keeps "
+            "separately, so cache invalidations and locks would not reach other workers.",
+            hint='Point it at a shared backend such as RedisCache.',
+            id='appointments.E002',
+        )]
+    return []
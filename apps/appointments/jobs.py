@@ -0,0 +1,68 @@
+"""
+Background jobs for therapist matching.
+
+Jobs run on a single in-process worker thread after the triggering
+transaction commits. Set MATCHING_RESCORE_ASYNC = False to run them inline
+(management commands, debugging).
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from .models import TherapistProfile
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='matching-jobs')
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def enqueue_rescore(therapist_profile_id: int) -> None:
+    """Queue a re-score of one therapist once the transaction commits; repeated requests coalesce."""
+    if getattr(settings, 'MATCHING_RESCORE_ASYNC', True):
+        transaction.on_commit(lambda: _submit_rescore(therapist_profile_id))
+    else:
+        transaction.on_commit(lambda: rescore_therapist(therapist_profile_id))
+
+
+def _submit_rescore(therapist_profile_id: int) -> None:
+    # Only recorded after the commit, so a rolled back transaction leaves nothing pending
+    with _pending_lock:
+        if therapist_profile_id in _pending:
+            return
+        _pending.add(therapist_profile_id)
+    try:
+        _executor.submit(_run_rescore, therapist_profile_id)
+    except Exception:
+        with _pending_lock:
+            _pending.discard(therapist_profile_id)
+        raise
+
+
+def rescore_therapist(therapist_profile_id: int) -> int:
+    """Update stored MatchingScore rows for one therapist."""
+    from .matching_service import TherapistMatchingService
+
+    with _pending_lock:
+        _pending.discard(therapist_profile_id)
+    try:
+        profile = TherapistProfile.objects.select_related('user').get(pk=therapist_profile_id)
+    except TherapistProfile.DoesNotExist:
+        return 0
+    return TherapistMatchingService().rescore_therapist(profile)
+
+
+def _run_rescore(therapist_profile_id: int) -> None:
+    close_old_connections()
+    try:
+        written = rescore_therapist(therapist_profile_id)
+        logger.info('Re-scored therapist profile %s: %s rows updated', therapist_profile_id, written)
+    except Exception:
+        logger.exception('Re-scoring therapist profile %s failed', therapist_profile_id)
+    finally:
+        connection.close()
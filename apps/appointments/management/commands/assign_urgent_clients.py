@@ -0,0 +1,45 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.appointments.assignment import DEFAULT_CANDIDATES, assign_urgent_clients
+from apps.appointments.matching_service import TherapistMatchingService, get_weight_profiles
+
+
+class Command(BaseCommand):
+    help = 'Assign pending crisis/high-urgency clients to therapists in one capacity-aware pass'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--candidates', type=int, default=DEFAULT_CANDIDATES,
+                            help=f'Best-ranked therapists considered per client (default: {DEFAULT_CANDIDATES})')
+        parser.add_argument('--profile', default='default',
+                            help='Weight profile to score with (default: default)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Solve and report without storing assignments')
+
+    def handle(self, *args, **options):
+        if options['candidates'] < 1:
+            raise CommandError('--candidates must be positive.')
+        try:
+            service = TherapistMatchingService(weight_profile=options['profile'])
+        except ValueError as e:
+            raise CommandError(f"{e}. Available: {', '.join(get_weight_profiles())}")
+
+        started = time.monotonic()
+        results = assign_urgent_clients(service, options['candidates'], options['dry_run'])
+        elapsed = time.monotonic() - started
+
+        assigned = [(therapist_id, score) for _, therapist_id, score in results if therapist_id is not None]
+        load = Counter(therapist_id for therapist_id, _ in assigned)
+        self.stdout.write(
+            f'{len(results)} pending urgent clients, {len(results) - len(assigned)} left unassigned'
+        )
+        if assigned:
+            mean_score = sum(score for _, score in assigned) / len(assigned)
+            self.stdout.write(
+                f'Spread over {len(load)} therapists (at most {max(load.values())} each), '
+                f'mean match score {mean_score:.3f}'
+            )
+        verb = 'Would assign' if options['dry_run'] else 'Assigned'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {len(assigned)} clients in {elapsed:.1f}s'))
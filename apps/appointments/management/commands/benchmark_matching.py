@@ -0,0 +1,354 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from decimal import Decimal
+from pathlib import Path
+
+import django
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.appointments import match_cache
+from apps.appointments.matching_engine import TherapistPool
+from apps.appointments.matching_index import CandidateIndex
+from apps.appointments.matching_service import TherapistMatchingService, get_weight_profiles
+from apps.appointments.models import ClientPreferences, TherapistProfile
+from apps.appointments.therapist_snapshot import TherapistSnapshot
+from apps.professional.search_index import rebuild_entries
+
+User = get_user_model()
+
+# Relative frequencies of the synthetic populations, roughly following what
+# a general-practice directory looks like: a few very common concerns and
+# languages, a long tail of rarer ones
+SPECIALIZATION_WEIGHTS = {
+    'anxiety': 30, 'depression': 28, 'trauma': 14, 'relationships': 12, 'family': 8,
+    'grief': 7, 'adolescent': 6, 'couples': 6, 'addiction': 5, 'adhd': 5, 'child': 4,
+    'ocd': 3, 'eating_disorders': 2, 'bipolar': 2,
+}
+APPROACH_WEIGHTS = {
+    'cbt': 35, 'mindfulness': 15, 'humanistic': 12, 'psychodynamic': 10, 'dbt': 9,
+    'systemic': 6, 'emdr': 5, 'gestalt': 3, 'somatic': 2, 'art_therapy': 2, 'music_therapy': 1,
+}
+# Share of therapists speaking each language besides English
+LANGUAGE_SHARES = {
+    'Spanish': 0.22, 'French': 0.05, 'Mandarin': 0.04, 'Hindi': 0.04, 'Arabic': 0.03,
+    'Portuguese': 0.03, 'German': 0.02, 'Korean': 0.02,
+}
+TIMES = ('morning', 'afternoon', 'evening')
+URGENCY_WEIGHTS = {'low': 30, 'medium': 45, 'high': 20, 'crisis': 5}
+# Metro areas the located profiles cluster around
+METROS = ((40.71, -74.01), (34.05, -118.24), (41.88, -87.63), (29.76, -95.37), (47.61, -122.33))
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+BATCH_SIZE = 2000
+
+# Stages timed once per benchmarked client; pool stages are timed --repeat times
+CLIENT_STAGES = ('find_matches_cold', 'find_matches_snapshot', 'find_matches_warm',
+                 'rank', 'score_rows', 'save_scores', 'build_matches')
+POOL_STAGES = ('load_pool', 'build_index', 'build_snapshot')
+
+
+class Command(BaseCommand):
+    help = ('Benchmark therapist matching against synthetic therapist/client populations '
+            'and write a JSON report. Synthetic rows are rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                            help='Therapist pool sizes to benchmark (default: 1000 10000 100000)')
+        parser.add_argument('--clients', type=int, default=20,
+                            help='Clients matched per pool size (default: 20)')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Timed repetitions of the pool-wide stages (default: 3)')
+        parser.add_argument('--limit', type=int, default=10,
+                            help='Matches requested per client (default: 10)')
+        parser.add_argument('--profile', default='default',
+                            help='Weight profile to match with (default: default)')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed of the synthetic populations (default: 0)')
+        parser.add_argument('--output', default='matching-benchmark.json',
+                            help='Path of the JSON report (default: matching-benchmark.json)')
+        parser.add_argument('--baseline',
+                            help='Earlier JSON report to compare median timings against')
+
+    def handle(self, *args, **options):
+        if min(options['sizes']) < 1 or options['clients'] < 1 or options['repeat'] < 1:
+            raise CommandError('--sizes, --clients and --repeat must be positive.')
+        if options['profile'] not in get_weight_profiles():
+            raise CommandError(f"Unknown weight profile '{options['profile']}'")
+        baseline = None
+        if options['baseline']:
+            try:
+                baseline = json.loads(Path(options['baseline']).read_text())
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read baseline report: {e}")
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'commit': _git_commit(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'numpy': np.__version__,
+                'database': connection.vendor,
+            },
+            'parameters': {
+                key: options[key] for key in ('sizes', 'clients', 'repeat', 'limit', 'profile', 'seed')
+            },
+            'results': [],
+        }
+        for size in options['sizes']:
+            self.stdout.write(f'Benchmarking {size} therapists x {options["clients"]} clients...')
+            result = self._benchmark_size(size, options)
+            report['results'].append(result)
+            for stage, summary in result['stages'].items():
+                self.stdout.write(
+                    f'  {stage:<21} median {summary["median_ms"]:9.2f} ms  '
+                    f'p95 {summary["p95_ms"]:9.2f} ms  {summary["queries"]:6.1f} queries  '
+                    f'peak {summary["peak_memory_kb"]:10.1f} KiB'
+                )
+
+        Path(options['output']).write_text(json.dumps(report, indent=2))
+        if baseline is not None:
+            self._compare(report, baseline)
+        self.stdout.write(self.style.SUCCESS(f'Wrote benchmark report to {options["output"]}'))
+
+    def _benchmark_size(self, size, options):
+        """Populate, measure and roll back one pool size."""
+        rng = np.random.default_rng(options['seed'] + size)
+        service = TherapistMatchingService(weight_profile=options['profile'])
+        limit = options['limit']
+        samples = {stage: [] for stage in (*POOL_STAGES, *CLIENT_STAGES)}
+        peaks = {}
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            client_users = _populate(rng, size, options['clients'])
+            setup_seconds = time.perf_counter() - started
+
+            for _ in range(options['repeat']):
+                samples['load_pool'].append(_measure(TherapistPool.load))
+                pool = samples['load_pool'][-1][2]
+                samples['build_index'].append(_measure(lambda: CandidateIndex(pool)))
+                index = samples['build_index'][-1][2]
+                samples['build_snapshot'].append(_measure(lambda: TherapistSnapshot(pool)))
+                snapshot = samples['build_snapshot'][-1][2]
+            peaks['load_pool'] = _peak_memory(TherapistPool.load)
+            peaks['build_index'] = _peak_memory(lambda: CandidateIndex(pool))
+            peaks['build_snapshot'] = _peak_memory(lambda: TherapistSnapshot(pool))
+
+            for position, client_user in enumerate(client_users):
+                client_prefs = ClientPreferences.objects.get(user=client_user)
+
+                def find_matches_cold():
+                    # A new pool version makes every cached ranking unreachable
+                    match_cache.bump_pool_version()
+                    return service.find_matches(client_user, limit=limit)
+
+                def find_matches_snapshot():
+                    # Misses the result cache but reuses the compiled pool snapshot
+                    match_cache.get_cache().delete(match_cache.cache_key(client_prefs, service.weights, limit))
+                    return service.find_matches(client_user, limit=limit)
+
+                def rank():
+                    return index.rank(client_prefs, service.weights,
+                                      service._get_urgency_multiplier(client_prefs.urgency), limit)
+
+                ranked = rank()
+
+                def score_rows():
+                    return service._round_scores(pool.score(
+                        client_prefs, service.weights,
+                        service._get_urgency_multiplier(client_prefs.urgency), rows=ranked,
+                    ))
+
+                rows = score_rows()
+                therapist_ids = [pool.profiles[row].user_id for row in ranked]
+
+                def build_matches():
+                    return [service._build_match(client_prefs, pool.profiles[row], score_data, snapshot)
+                            for row, score_data in zip(ranked.tolist(), rows)]
+
+                stages = {
+                    'find_matches_cold': find_matches_cold,
+                    'find_matches_snapshot': find_matches_snapshot,
+                    'find_matches_warm': lambda: service.find_matches(client_user, limit=limit),
+                    'rank': rank,
+                    'score_rows': score_rows,
+                    'save_scores': lambda: service.save_scores(client_user, therapist_ids, rows),
+                    'build_matches': build_matches,
+                }
+                for stage, fn in stages.items():
+                    samples[stage].append(_measure(fn))
+                if position == 0:
+                    # Memory is traced in a separate run so tracing never skews the timings
+                    for stage, fn in stages.items():
+                        peaks[stage] = _peak_memory(fn)
+
+            transaction.set_rollback(True)
+
+        return {
+            'therapists': size,
+            'accepting_therapists': len(pool),
+            'clients': len(client_users),
+            'setup_seconds': round(setup_seconds, 3),
+            'stages': {
+                stage: _summarize(measurements, peaks[stage])
+                for stage, measurements in samples.items()
+            },
+        }
+
+    def _compare(self, report, baseline):
+        """Print the change in median time of every stage present in both reports."""
+        previous = {result['therapists']: result['stages'] for result in baseline.get('results', [])}
+        self.stdout.write(f'Compared with baseline at commit {baseline.get("commit") or "unknown"}:')
+        for result in report['results']:
+            stages = previous.get(result['therapists'])
+            if stages is None:
+                continue
+            for stage, summary in result['stages'].items():
+                if stage not in stages or not stages[stage]['median_ms']:
+                    continue
+                change = summary['median_ms'] / stages[stage]['median_ms'] - 1
+                line = f'  {result["therapists"]:>7} {stage:<21} {change:+7.1%}'
+                self.stdout.write(self.style.WARNING(line) if change > 0.1 else line)
+
+
+def _populate(rng, therapists, clients):
+    """Bulk-create a synthetic population; returns the client users."""
+    password = make_password(None)
+    token = f'{time.time_ns():x}'
+    therapist_users = _create_users(password, token, 'therapist', therapists)
+    client_users = _create_users(password, token, 'client', clients)
+
+    profiles = []
+    for user in therapist_users:
+        rate = float(np.clip(round(rng.lognormal(np.log(130), 0.35) / 5) * 5, 40, 350))
+        rated = rng.random() < 0.8
+        located = rng.random() < 0.85
+        metro = METROS[rng.integers(len(METROS))]
+        profiles.append(TherapistProfile(
+            user=user,
+            license_number=f'BENCH-{user.pk}',
+            specializations=_weighted_sample(rng, SPECIALIZATION_WEIGHTS, rng.integers(1, 5)),
+            therapy_approaches=_weighted_sample(rng, APPROACH_WEIGHTS, rng.integers(1, 4)),
+            years_of_experience=int(min(rng.gamma(2.0, 5.0), 40)),
+            education='Synthetic benchmark profile',
+            bio='Synthetic benchmark profile',
+            rate_per_session=Decimal(str(rate)),
+            accepts_insurance=bool(rng.random() < 0.45),
+            languages_spoken=['English'] + [
+                language for language, share in LANGUAGE_SHARES.items() if rng.random() < share
+            ],
+            availability=(
+                {'preferred_times': [t for t in TIMES if rng.random() < 0.6]}
+                if rng.random() < 0.7 else {}
+            ),
+            is_accepting_clients=bool(rng.random() < 0.85),
+            rating=round(float(np.clip(rng.normal(4.4, 0.4), 1.0, 5.0)), 1) if rated else 0.0,
+            total_reviews=int(rng.integers(1, 200)) if rated else 0,
+            latitude=float(metro[0] + rng.normal(0, 0.2)) if located else None,
+            longitude=float(metro[1] + rng.normal(0, 0.2)) if located else None,
+        ))
+    TherapistProfile.objects.bulk_create(profiles, batch_size=BATCH_SIZE)
+    # bulk_create skips the signals that keep the search index in sync
+    rebuild_entries([user.pk for user in therapist_users])
+
+    preferences = []
+    for user in client_users:
+        located = rng.random() < 0.6
+        metro = METROS[rng.integers(len(METROS))]
+        preferences.append(ClientPreferences(
+            user=user,
+            preferred_specializations=_weighted_sample(rng, SPECIALIZATION_WEIGHTS, rng.integers(0, 4)),
+            preferred_therapy_approaches=_weighted_sample(rng, APPROACH_WEIGHTS, rng.integers(0, 3)),
+            therapist_gender_preference='female' if rng.random() < 0.3 else '',
+            age_preference='experienced' if rng.random() < 0.2 else '',
+            budget_max=None if rng.random() < 0.3 else Decimal(int(rng.choice([50, 100, 150, 200, 250]))),
+            insurance_provider='Aetna' if rng.random() < 0.35 else '',
+            preferred_languages=['Spanish'] if rng.random() < 0.15 else [],
+            preferred_times=[t for t in TIMES if rng.random() < 0.4],
+            urgency=_weighted_sample(rng, URGENCY_WEIGHTS, 1)[0],
+            latitude=float(metro[0] + rng.normal(0, 0.2)) if located else None,
+            longitude=float(metro[1] + rng.normal(0, 0.2)) if located else None,
+            max_distance_km=int(rng.choice([10, 25, 50])) if located and rng.random() < 0.5 else None,
+        ))
+    ClientPreferences.objects.bulk_create(preferences, batch_size=BATCH_SIZE)
+    return client_users
+
+
+def _create_users(password, token, user_type, count):
+    users = [
+        User(
+            username=f'bench-{token}-{user_type}-{i}',
+            email=f'bench-{token}-{user_type}-{i}@benchmark.invalid',
+            first_name='Bench',
+            last_name=f'{user_type.title()} {i}',
+            user_type=user_type,
+            password=password,
+        )
+        for i in range(count)
+    ]
+    User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+    # Not every backend returns primary keys from bulk_create
+    return list(User.objects.filter(username__startswith=f'bench-{token}-{user_type}-').order_by('pk'))
+
+
+def _weighted_sample(rng, weights, count):
+    """``count`` distinct keys of ``weights``, drawn proportionally to their weight."""
+    keys = list(weights)
+    probabilities = np.array([weights[key] for key in keys], dtype=np.float64)
+    chosen = rng.choice(len(keys), size=min(int(count), len(keys)), replace=False,
+                        p=probabilities / probabilities.sum())
+    return [keys[i] for i in chosen]
+
+
+def _measure(fn):
+    """(seconds, query count, result) of one call."""
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+    return elapsed, len(queries), result
+
+
+def _peak_memory(fn):
+    """Peak traced allocation of one call, in bytes."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _summarize(measurements, peak_bytes):
+    timings = sorted(seconds * 1000 for seconds, _, _ in measurements)
+    return {
+        'calls': len(timings),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(0.95 * len(timings)))], 3),
+        'max_ms': round(timings[-1], 3),
+        'queries': round(statistics.fmean(queries for _, queries, _ in measurements), 2),
+        'peak_memory_kb': round(peak_bytes / 1024, 1),
+    }
+
+
+def _git_commit():
+    """Commit of the working tree, when it is a git checkout."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=Path(__file__).resolve().parent, check=True,
+        ).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
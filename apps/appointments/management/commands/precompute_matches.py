@@ -0,0 +1,131 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from apps.appointments.matching_engine import TherapistPool
+from apps.appointments.matching_index import CandidateIndex
+from apps.appointments.matching_service import TherapistMatchingService
+from apps.appointments.models import ClientPreferences, MatchingScore
+
+# Read-only pool snapshot of a worker process, set by _init_worker
+_snapshot = None
+
+
+def _init_worker(pool):
+    global _snapshot
+    _snapshot = (pool, CandidateIndex(pool), TherapistMatchingService())
+
+
+def _score_chunk(client_ids, limit):
+    """Rank a chunk of clients against the worker's snapshot."""
+    pool, index, service = _snapshot
+    results = []
+    for client_prefs in ClientPreferences.objects.filter(user_id__in=client_ids).order_by('user_id'):
+        therapist_ids, rows = service.rank_client(client_prefs, pool, index, limit)
+        results.append((client_prefs.user_id, therapist_ids, rows))
+    return results
+
+
+class Command(BaseCommand):
+    help = 'Precompute top-N therapist matches for every client and store them as MatchingScore rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10,
+                            help='Matches stored per client (default: 10)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes; 0 scores in this process (default: CPU count)')
+        parser.add_argument('--chunk-size', type=int, default=200,
+                            help='Clients per worker task (default: 200)')
+        parser.add_argument('--start-id', type=int,
+                            help='First client user id to process (inclusive)')
+        parser.add_argument('--end-id', type=int,
+                            help='Last client user id to process (inclusive)')
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+        workers = options['workers']
+        chunk_size = options['chunk_size']
+        if limit < 1 or chunk_size < 1 or workers < 0:
+            raise CommandError('--limit and --chunk-size must be positive and --workers non-negative.')
+
+        clients = ClientPreferences.objects.order_by('user_id')
+        if options['start_id'] is not None:
+            clients = clients.filter(user_id__gte=options['start_id'])
+        if options['end_id'] is not None:
+            clients = clients.filter(user_id__lte=options['end_id'])
+        client_ids = list(clients.values_list('user_id', flat=True))
+        total = len(client_ids)
+
+        pool = TherapistPool.load()
+        self.stdout.write(f'Scoring {total} clients against {len(pool)} therapists...')
+
+        self.service = TherapistMatchingService()
+        self.processed = 0
+        self.started = time.monotonic()
+        chunks = [client_ids[i:i + chunk_size] for i in range(0, total, chunk_size)]
+
+        if workers == 0:
+            _init_worker(pool)
+            for chunk in chunks:
+                self._store(_score_chunk(chunk, limit), total)
+        else:
+            self._run_pool(pool, chunks, limit, workers, total)
+
+        elapsed = time.monotonic() - self.started
+        rate = self.processed / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f'Precomputed matches for {self.processed} clients in {elapsed:.1f}s ({rate:.1f} clients/sec)'
+        ))
+
+    def _run_pool(self, pool, chunks, limit, workers, total):
+        """
+        Fan chunks out to worker processes, keeping a bounded number in flight.
+
+        Workers are forked so they share the parent's pool snapshot
+        copy-on-write and inherit the configured Django settings.
+        """
+        # Forked workers must open their own database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('fork'),
+                                 initializer=_init_worker, initargs=(pool,)) as executor:
+            pending = {}  # future -> last client id of its chunk
+            submitted = []  # last client ids in submission order
+            done_ids = set()
+            for chunk in chunks:
+                future = executor.submit(_score_chunk, chunk, limit)
+                pending[future] = chunk[-1]
+                submitted.append(chunk[-1])
+                if len(pending) >= 2 * workers:
+                    self._collect(pending, done_ids, submitted, total)
+            while pending:
+                self._collect(pending, done_ids, submitted, total)
+
+    def _collect(self, pending, done_ids, submitted, total):
+        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in finished:
+            self._store(future.result(), total)
+            done_ids.add(pending.pop(future))
+
+        # Everything up to the first unfinished chunk is safely stored
+        while submitted and submitted[0] in done_ids:
+            watermark = submitted.pop(0)
+            self.stdout.write(f'  completed clients up to id {watermark} '
+                              f'(resume with --start-id {watermark + 1})')
+
+    def _store(self, results, total):
+        scores = [
+            MatchingScore(client_id=client_id, therapist_id=therapist_id, **score_data)
+            for client_id, therapist_ids, rows in results
+            for therapist_id, score_data in zip(therapist_ids, rows)
+        ]
+        self.service.upsert_scores(scores)
+
+        self.processed += len(results)
+        elapsed = time.monotonic() - self.started
+        rate = self.processed / elapsed if elapsed else 0.0
+        self.stdout.write(f'{self.processed}/{total} clients ({rate:.1f} clients/sec)')
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.appointments.matching_service import (
+    SERVING_PROFILE, TherapistMatchingService, get_weight_profiles,
+)
+from apps.appointments.models import MatchingScore
+
+
+class Command(BaseCommand):
+    help = (f"Recompute stored MatchingScore.overall_score with the '{SERVING_PROFILE}' weights in one "
+            "UPDATE, or preview a client's ranking under an experimental profile without writing")
+
+    def add_arguments(self, parser):
+        parser.add_argument('profile', nargs='?', default=SERVING_PROFILE,
+                            help=f'Weight profile name (default: {SERVING_PROFILE})')
+        parser.add_argument('--client-id', type=int,
+                            help='Only reweight (or preview) scores of this client user id')
+        parser.add_argument('--limit', type=int, default=10,
+                            help='Matches shown when previewing an experimental profile (default: 10)')
+        parser.add_argument('--list', action='store_true',
+                            help='List the available weight profiles and exit')
+
+    def handle(self, *args, **options):
+        profiles = get_weight_profiles()
+        if options['list']:
+            for name, weights in profiles.items():
+                self.stdout.write(f'{name}: ' + ', '.join(f'{k}={v}' for k, v in weights.items()))
+            return
+
+        try:
+            service = TherapistMatchingService(weight_profile=options['profile'])
+        except ValueError as e:
+            raise CommandError(f"{e}. Available: {', '.join(profiles)}")
+
+        if options['profile'] != SERVING_PROFILE:
+            self._preview(service, options)
+            return
+
+        scores = MatchingScore.objects.all()
+        if options['client_id'] is not None:
+            scores = scores.filter(client_id=options['client_id'])
+
+        updated = service.reweight_scores(scores)
+        self.stdout.write(self.style.SUCCESS(
+            f"Reweighted {updated} match scores with the '{options['profile']}' profile"
+        ))
+
+    def _preview(self, service, options):
+        # Experimental profiles never touch the scores users are served
+        if options['client_id'] is None:
+            raise CommandError(
+                f"'{options['profile']}' is an experimental profile and only previews rankings; "
+                f"pass --client-id"
+            )
+        ranked = service.rank_stored_scores(options['client_id'], limit=options['limit'])
+        for position, score in enumerate(ranked, 1):
+            self.stdout.write(
+                f'{position:>3}. therapist {score.therapist_id}: {score.weighted_score:.3f} '
+                f'(stored {score.overall_score:.3f})'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Ranked {len(ranked)} stored matches with the '{options['profile']}' profile; nothing was written"
+        ))
@@ -0,0 +1,225 @@
+"""
+Versioned cache for therapist match results.
+
+Entries are keyed on a fingerprint of the client's preference fields (plus
+the scoring weights and result limit) and on a global therapist-pool version.
+Saving or deleting a TherapistProfile bumps the version (see signals.py), so
+every cached ranking computed against the old pool stops being addressable
+and simply ages out of the cache. The version and the hit/miss counters are
+kept by ``cache_versions``, out of reach of this cache's LRU culling and
+shared by every worker process.
+
+Cache misses go through ``single_flight``: concurrent requests for the same
+key wait for one computation instead of each scoring the pool, coordinated
+by a process-local lock and, across worker processes, a lock entry in the
+coordination cache. The latter only spans processes when that cache is
+shared, as the production Redis cache is; with the default LocMemCache each
+worker still computes a missing entry once, by itself.
+
+Besides the rendered top matches, the cache holds the head of each
+client's ranking for the matches API: the first MATCH_RANKING_DEPTH
+therapist ids and their scores, packed as integer thousandths, plus the
+full ranking's length. That covers the pages clients actually read at a
+few KB per client however large the pool grows; deeper pages are ranked
+on demand.
+"""
+
+import hashlib
+import json
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import cache_versions
+from .models import TherapistProfile
+
+VERSION_KEY = 'matching:pool-version'
+HITS_KEY = 'matching:cache-hits'
+MISSES_KEY = 'matching:cache-misses'
+
+# Seconds a computation may hold the cross-process lock; waiters give up
+# and compute themselves after this long
+LOCK_TIMEOUT = 30
+POLL_INTERVAL = 0.05
+
+# ClientPreferences fields read by the scorer
+PREFERENCE_FIELDS = (
+    'preferred_specializations', 'preferred_therapy_approaches',
+    'therapist_gender_preference', 'age_preference', 'budget_max',
+    'insurance_provider', 'preferred_languages', 'preferred_times', 'urgency',
+    'latitude', 'longitude', 'max_distance_km',
+)
+
+
+def get_cache():
+    return caches[getattr(settings, 'MATCH_CACHE_ALIAS', 'default')]
+
+
+def get_timeout() -> Optional[int]:
+    return getattr(settings, 'MATCH_CACHE_TIMEOUT', 300)
+
+
+def get_ranking_depth() -> int:
+    return getattr(settings, 'MATCH_RANKING_DEPTH', 200)
+
+
+def pool_version() -> int:
+    """Current therapist-pool version."""
+    return cache_versions.current(VERSION_KEY)
+
+
+def bump_pool_version() -> None:
+    """Invalidate every cached match result."""
+    cache_versions.bump(VERSION_KEY)
+
+
+def preference_fingerprint(client_prefs, weights: Dict[str, float]) -> str:
+    """Stable hash of everything that decides a client's ranking."""
+    payload = {field: getattr(client_prefs, field) for field in PREFERENCE_FIELDS}
+    payload['weights'] = weights
+    encoded = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def cache_key(client_prefs, weights: Dict[str, float], limit: Optional[int]) -> str:
+    return 'matching:v{}:{}:{}:{}'.format(
+        pool_version(), client_prefs.user_id,
+        preference_fingerprint(client_prefs, weights), limit,
+    )
+
+
+def ranking_key(client_prefs, weights: Dict[str, float]) -> str:
+    return 'matching-ranking:v{}:{}:{}'.format(
+        pool_version(), client_prefs.user_id, preference_fingerprint(client_prefs, weights),
+    )
+
+
+def get_ranking(key: str) -> Optional[Tuple[np.ndarray, np.ndarray, int]]:
+    """Cached (therapist ids, thousandths score matrix, full length) of a ranking's head, or None."""
+    cached = get_cache().get(key)
+    cache_versions.count(MISSES_KEY if cached is None else HITS_KEY)
+    return cached
+
+
+def set_ranking(key: str, therapist_ids: np.ndarray, thousandths: np.ndarray, total: int) -> None:
+    # Copies, so the cache never keeps a slice's full-pool base array alive
+    get_cache().set(
+        key, (therapist_ids.copy(), thousandths.copy(), total), timeout=get_timeout(),
+    )
+
+
+def get_matches(key: str) -> Optional[List[Dict]]:
+    """Cached matches for ``key`` with therapist profiles reloaded, or None."""
+    cache = get_cache()
+    cached = cache.get(key)
+    if cached is None:
+        cache_versions.count(MISSES_KEY)
+        return None
+    cache_versions.count(HITS_KEY)
+
+    profiles = TherapistProfile.objects.select_related('user').in_bulk(
+        [entry['therapist'] for entry in cached]
+    )
+    return [
+        {**entry, 'therapist': profiles[entry['therapist']]}
+        for entry in cached
+        if entry['therapist'] in profiles
+    ]
+
+
+def set_matches(key: str, matches: List[Dict]) -> None:
+    """Cache matches, storing therapist profiles by primary key."""
+    get_cache().set(
+        key,
+        [{**match, 'therapist': match['therapist'].pk} for match in matches],
+        timeout=get_timeout(),
+    )
+
+
+def single_flight(key: str, compute: Callable[[], List[Dict]]) -> List[Dict]:
+    """
+    Cached matches for ``key``, computing them at most once when missing.
+
+    Threads of this process queue on a per-key lock and take the result of
+    the one that computed it. Other processes see the coordination cache
+    lock of the computing worker and poll the cache until the result appears, the
+    lock is released without one, or LOCK_TIMEOUT passes; then they compute
+    themselves.
+    """
+    cached = get_matches(key)
+    if cached is not None:
+        return cached
+
+    flight = _join_flight(key)
+    try:
+        with flight.lock:
+            if flight.result is not None:
+                return flight.result
+            flight.result = _compute_across_processes(key, compute)
+            return flight.result
+    finally:
+        _leave_flight(key, flight)
+
+
+def _compute_across_processes(key: str, compute: Callable[[], List[Dict]]) -> List[Dict]:
+    cache = get_cache()
+    lock_key = f'{key}:lock'
+    token = uuid.uuid4().hex
+    if not cache_versions.acquire(lock_key, token, LOCK_TIMEOUT):
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            # The holder stores its result before releasing the lock
+            if cache.get(key) is not None:
+                cached = get_matches(key)
+                if cached is not None:
+                    return cached
+            if not cache_versions.is_held(lock_key):
+                break
+        cache_versions.acquire(lock_key, token, LOCK_TIMEOUT)
+
+    try:
+        matches = compute()
+        set_matches(key, matches)
+        return matches
+    finally:
+        cache_versions.release(lock_key, token)
+
+
+class _Flight:
+    __slots__ = ('lock', 'result', 'callers')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.result = None
+        self.callers = 0
+
+
+_flights: Dict[str, _Flight] = {}
+_flights_lock = threading.Lock()
+
+
+def _join_flight(key: str) -> _Flight:
+    with _flights_lock:
+        flight = _flights.setdefault(key, _Flight())
+        flight.callers += 1
+        return flight
+
+
+def _leave_flight(key: str, flight: _Flight) -> None:
+    with _flights_lock:
+        flight.callers -= 1
+        if not flight.callers:
+            del _flights[key]
+
+
+def stats() -> Dict[str, int]:
+    """Hit/miss counters of this cache."""
+    values = cache_versions.get_cache().get_many([HITS_KEY, MISSES_KEY])
+    return {'hits': values.get(HITS_KEY, 0), 'misses': values.get(MISSES_KEY, 0)}
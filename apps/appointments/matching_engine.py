@@ -0,0 +1,357 @@
+"""
+Vectorized scoring engine for therapist matching.
+
+The accepting therapist pool is loaded once into column arrays: bitmasks for
+the code lists (specializations, approaches, languages, preferred times) and
+plain arrays for the scalar fields (rate, rating, experience, location). All component
+scores and the weighted overall score are then computed for the whole pool
+with a handful of NumPy operations, mirroring the scalar ``_calculate_*``
+methods of ``TherapistMatchingService`` operation for operation so that the
+results are bit-for-bit identical.
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .availability_index import AvailabilityIndex, client_windows
+from .models import TherapistProfile
+from .spatial_index import GridIndex, haversine_km
+
+# Code-list categories encoded as bitmasks (see therapist_codes/client_codes)
+CATEGORIES = ('specializations', 'approaches', 'languages', 'times')
+
+# Distance over which the distance score falls to its floor for clients
+# without a maximum distance
+DEFAULT_DISTANCE_KM = 50.0
+
+
+def therapist_codes(profile: TherapistProfile) -> Dict[str, list]:
+    """Return the code lists of a therapist profile, keyed by category."""
+    availability = profile.availability if isinstance(profile.availability, dict) else {}
+    return {
+        'specializations': profile.specializations or [],
+        'approaches': profile.therapy_approaches or [],
+        'languages': profile.languages_spoken or [],
+        'times': availability.get('preferred_times', []) or [],
+    }
+
+
+def client_codes(client_prefs) -> Dict[str, list]:
+    """Return the code lists of a client's preferences, keyed by category."""
+    return {
+        'specializations': client_prefs.preferred_specializations or [],
+        'approaches': client_prefs.preferred_therapy_approaches or [],
+        'languages': client_prefs.preferred_languages or [],
+        'times': client_prefs.preferred_times or [],
+    }
+
+
+def build_vocabulary(code_lists: Iterable[list]) -> Dict[str, int]:
+    """Assign a bit position to every distinct code, in first-seen order."""
+    vocabulary = {}
+    for codes in code_lists:
+        for code in codes:
+            if code not in vocabulary:
+                vocabulary[code] = len(vocabulary)
+    return vocabulary
+
+
+def encode_masks(code_lists: List[list], vocabulary: Dict[str, int]) -> np.ndarray:
+    """
+    Encode code lists as rows of 64-bit words.
+
+    Codes missing from the vocabulary are dropped: they cannot overlap with
+    anything on the other side.
+    """
+    words = max(1, (len(vocabulary) + 63) // 64)
+    rows = []
+    for codes in code_lists:
+        bits = 0
+        for code in codes:
+            position = vocabulary.get(code)
+            if position is not None:
+                bits |= 1 << position
+        rows.append([(bits >> (64 * word)) & 0xFFFFFFFFFFFFFFFF for word in range(words)])
+    return np.array(rows, dtype=np.uint64).reshape(len(code_lists), words)
+
+
+def overlap_counts(masks: np.ndarray, other: np.ndarray) -> np.ndarray:
+    """Number of codes shared between each row of ``masks`` and ``other``."""
+    return np.bitwise_count(masks & other).sum(axis=-1, dtype=np.int64)
+
+
+class ClientFeatures:
+    """Scalar features of one client's preferences, as read by the scorer."""
+
+    __slots__ = (
+        'spec_count', 'approach_count', 'time_count', 'lang_count',
+        'has_gender', 'has_age', 'budget', 'has_insurance', 'urgency_multiplier',
+        'window_minutes', 'latitude', 'longitude', 'max_distance_km', 'distance_scale',
+    )
+
+    def __init__(self, client_prefs, urgency_multiplier: float):
+        codes = client_codes(client_prefs)
+        self.spec_count = len(codes['specializations'])
+        self.approach_count = len(codes['approaches'])
+        self.time_count = len(codes['times'])
+        self.lang_count = len(codes['languages'])
+        self.has_gender = bool(client_prefs.therapist_gender_preference)
+        self.has_age = bool(client_prefs.age_preference)
+        self.budget = float(client_prefs.budget_max) if client_prefs.budget_max else np.nan
+        self.has_insurance = bool(client_prefs.insurance_provider)
+        self.urgency_multiplier = urgency_multiplier
+        self.window_minutes = sum(end - start for start, end in client_windows(codes['times']))
+        located = client_prefs.latitude is not None and client_prefs.longitude is not None
+        self.latitude = float(client_prefs.latitude) if located else np.nan
+        self.longitude = float(client_prefs.longitude) if located else np.nan
+        self.max_distance_km = float(client_prefs.max_distance_km) if client_prefs.max_distance_km else np.nan
+        self.distance_scale = float(client_prefs.max_distance_km or DEFAULT_DISTANCE_KM)
+
+
+class ClientBatch:
+    """Features of many clients' preferences as aligned arrays."""
+
+    def __init__(self, clients: List, urgency_multipliers: List[float]):
+        features = [
+            ClientFeatures(client_prefs, multiplier)
+            for client_prefs, multiplier in zip(clients, urgency_multipliers)
+        ]
+        for attribute in ClientFeatures.__slots__:
+            setattr(self, attribute, np.array([getattr(f, attribute) for f in features]))
+
+
+def score_columns(client, therapist, overlap: Dict[str, np.ndarray],
+                  weights: Dict[str, float]) -> Dict[str, np.ndarray]:
+    """
+    Compute every component score and the weighted overall score.
+
+    ``client`` and ``therapist`` expose the feature attributes used below as
+    scalars or arrays; they only need to broadcast against each other and
+    against the pairwise ``overlap`` features (shared-code counts, free slot
+    minutes and ``distance_km``, NaN where either side has no location).
+    Scores are returned unrounded.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 1. Specialization
+        specialization = np.where(
+            client.spec_count == 0, 0.8,
+            np.where(therapist.spec_count == 0, 0.3,
+                     np.where(overlap['specializations'] == 0, 0.2,
+                              np.minimum(0.2 + (overlap['specializations'] / client.spec_count * 0.8), 1.0))))
+
+        # 2. Therapy approach
+        approach = np.where(
+            client.approach_count == 0, 0.7,
+            np.where(therapist.approach_count == 0, 0.4,
+                     np.where(overlap['approaches'] > 0,
+                              np.minimum(0.3 + (overlap['approaches'] / client.approach_count * 0.7), 1.0),
+                              0.3)))
+
+        # 3. Availability: free minutes inside the client's windows when the
+        # therapist publishes weekly slots, coarse time labels otherwise
+        label_availability = np.where(
+            (client.time_count == 0) | np.logical_not(therapist.has_availability), 0.6,
+            np.where(therapist.time_count == 0, 0.5,
+                     np.where(overlap['times'] > 0,
+                              np.minimum(0.4 + (overlap['times'] / client.time_count * 0.6), 1.0),
+                              0.3)))
+        slot_availability = np.where(
+            overlap['slot_minutes'] > 0,
+            np.minimum(0.4 + (overlap['slot_minutes'] / client.window_minutes * 0.6), 1.0),
+            0.3)
+        availability = np.where(therapist.has_slots & (client.window_minutes > 0),
+                                slot_availability, label_availability)
+
+        # 4. Personal preferences
+        has_languages = client.lang_count > 0
+        preference_total = (
+            np.where(client.has_gender, 0.7, 0.0)
+            + np.where(has_languages, np.where(overlap['languages'] > 0, 1.0, 0.3), 0.0)
+            + np.where(client.has_age, np.where(therapist.experience >= 5, 0.8, 0.6), 0.0)
+        )
+        factors = (np.asarray(client.has_gender, dtype=np.int64)
+                   + has_languages + np.asarray(client.has_age, dtype=np.int64))
+        preference = np.where(factors > 0, preference_total / factors, 0.7)
+
+        # 5. Budget/price
+        no_budget = np.isnan(client.budget) | (client.budget == 0)
+        within_budget = 1.0 - (therapist.rate / client.budget * 0.3)
+        over_budget = np.maximum(0.1, 0.5 - ((therapist.rate - client.budget) / client.budget * 0.4))
+        price = np.where(
+            client.has_insurance & therapist.accepts_insurance, 1.0,
+            np.where(no_budget, 0.6,
+                     np.where(therapist.rate <= client.budget, within_budget, over_budget)))
+
+        # 6. Rating/quality
+        rating = np.minimum(therapist.rating / 5.0, 1.0)
+
+        # 7. Geographic proximity
+        distance = np.where(
+            np.isnan(overlap['distance_km']), 0.5,
+            np.maximum(0.1, 1.0 - (overlap['distance_km'] / client.distance_scale * 0.9)))
+
+    # 8. Urgency-adjusted weighted total
+    overall = (
+        specialization * weights['specialization'] +
+        approach * weights['approach'] +
+        availability * weights['availability'] +
+        preference * weights['preferences'] +
+        price * weights['budget'] +
+        rating * weights['rating'] +
+        distance * weights['distance']
+    ) * client.urgency_multiplier
+
+    return {
+        'overall_score': overall,
+        'specialization_score': specialization,
+        'approach_score': approach,
+        'availability_score': availability,
+        'preference_score': preference,
+        'price_score': price,
+        'distance_score': distance,
+    }
+
+
+class TherapistPool:
+    """
+    Column-oriented snapshot of the therapists accepting new clients.
+
+    Rows follow primary-key order, which is also the tie-break order of the
+    ranked results.
+    """
+
+    def __init__(self, profiles: List[TherapistProfile],
+                 availability: Optional[AvailabilityIndex] = None):
+        self.profiles = profiles
+        if availability is None:
+            availability = AvailabilityIndex.build([profile.user_id for profile in profiles])
+        self.availability = availability
+        self.has_slots = availability.has_slots
+        codes = [therapist_codes(profile) for profile in profiles]
+
+        self.vocabulary = {}
+        self.masks = {}
+        for category in CATEGORIES:
+            lists = [row[category] for row in codes]
+            self.vocabulary[category] = build_vocabulary(lists)
+            self.masks[category] = encode_masks(lists, self.vocabulary[category])
+
+        self.spec_count = np.array([len(row['specializations']) for row in codes], dtype=np.int64)
+        self.approach_count = np.array([len(row['approaches']) for row in codes], dtype=np.int64)
+        self.time_count = np.array([len(row['times']) for row in codes], dtype=np.int64)
+        self.has_availability = np.array([bool(p.availability) for p in profiles], dtype=bool)
+        self.experience = np.array([p.years_of_experience for p in profiles], dtype=np.int64)
+        self.rate = np.array([float(p.rate_per_session) for p in profiles], dtype=np.float64)
+        self.rating = np.array([p.rating for p in profiles], dtype=np.float64)
+        self.accepts_insurance = np.array([p.accepts_insurance for p in profiles], dtype=bool)
+        self.latitude = np.array([np.nan if p.latitude is None or p.longitude is None else p.latitude
+                                  for p in profiles], dtype=np.float64)
+        self.longitude = np.array([np.nan if p.latitude is None or p.longitude is None else p.longitude
+                                   for p in profiles], dtype=np.float64)
+        self.grid = GridIndex(self.latitude, self.longitude)
+
+    @classmethod
+    def load(cls) -> 'TherapistPool':
+        """Load every active therapist accepting clients, via the search index."""
+        profiles = list(
+            TherapistProfile.objects.filter(
+                search_entry__is_matchable=True
+            ).select_related('user').order_by('pk')
+        )
+        return cls(profiles)
+
+    def __len__(self):
+        return len(self.profiles)
+
+    def client_masks(self, client_prefs) -> Dict[str, np.ndarray]:
+        """Encode a client's code lists against this pool's vocabularies."""
+        codes = client_codes(client_prefs)
+        return {
+            category: encode_masks([codes[category]], self.vocabulary[category])[0]
+            for category in CATEGORIES
+        }
+
+    def candidate_rows(self, client_prefs) -> Optional[np.ndarray]:
+        """
+        Sorted rows within the client's maximum distance, from the grid index.
+
+        Returns None when the client sets no location or no maximum distance
+        (every row is a candidate). Therapists without a location are never
+        within a maximum distance.
+        """
+        client = ClientFeatures(client_prefs, 1.0)
+        if np.isnan(client.latitude) or np.isnan(client.max_distance_km):
+            return None
+        return self.grid.within(client.latitude, client.longitude, client.max_distance_km)
+
+    def within_reach(self, clients: List, row: int = 0) -> np.ndarray:
+        """Whether the therapist in pool row ``row`` is within each client's maximum distance."""
+        batch = ClientBatch(clients, [1.0] * len(clients))
+        distance = haversine_km(batch.latitude, batch.longitude, self.latitude[row], self.longitude[row])
+        unrestricted = np.isnan(batch.latitude) | np.isnan(batch.max_distance_km)
+        return unrestricted | (distance <= batch.max_distance_km)
+
+    def score(self, client_prefs, weights: Dict[str, float], urgency_multiplier: float,
+              rows: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """
+        Score a client against the pool, or against the subset ``rows``.
+
+        Returns unrounded score arrays aligned with ``rows`` (or the pool).
+        """
+        therapist = self if rows is None else _PoolRows(self, rows)
+        client_masks = self.client_masks(client_prefs)
+        overlap = {
+            category: overlap_counts(therapist.masks[category], client_masks[category])
+            for category in CATEGORIES
+        }
+        overlap['slot_minutes'] = self.availability.overlap_minutes(
+            client_windows(client_codes(client_prefs)['times']),
+            np.arange(len(self)) if rows is None else rows,
+        )
+        client = ClientFeatures(client_prefs, urgency_multiplier)
+        overlap['distance_km'] = haversine_km(client.latitude, client.longitude,
+                                              therapist.latitude, therapist.longitude)
+        return score_columns(client, therapist, overlap, weights)
+
+    def score_clients(self, clients: List, weights: Dict[str, float],
+                      urgency_multipliers: List[float], row: int = 0) -> Dict[str, np.ndarray]:
+        """
+        Score many clients against the therapist in pool row ``row``.
+
+        The transpose of ``score``: client code lists are encoded against the
+        pool's vocabularies, so codes the pool has never seen are dropped.
+        Returns unrounded score arrays aligned with ``clients``.
+        """
+        therapist = _PoolRows(self, np.array([row]))
+        codes = [client_codes(client_prefs) for client_prefs in clients]
+        overlap = {
+            category: overlap_counts(
+                encode_masks([c[category] for c in codes], self.vocabulary[category]),
+                therapist.masks[category][0],
+            )
+            for category in CATEGORIES
+        }
+        slot_minutes = {}
+        for c in codes:
+            windows = tuple(client_windows(c['times']))
+            if windows not in slot_minutes:
+                slot_minutes[windows] = self.availability.overlap_minutes(list(windows), np.array([row]))[0]
+        overlap['slot_minutes'] = np.array(
+            [slot_minutes[tuple(client_windows(c['times']))] for c in codes], dtype=np.int64
+        )
+        batch = ClientBatch(clients, urgency_multipliers)
+        overlap['distance_km'] = haversine_km(batch.latitude, batch.longitude,
+                                              therapist.latitude, therapist.longitude)
+        return score_columns(batch, therapist, overlap, weights)
+
+
+class _PoolRows:
+    """A row subset of a ``TherapistPool`` exposing the same columns."""
+
+    def __init__(self, pool: TherapistPool, rows: np.ndarray):
+        self.masks = {category: pool.masks[category][rows] for category in CATEGORIES}
+        for column in ('spec_count', 'approach_count', 'time_count', 'has_availability',
+                       'has_slots', 'experience', 'rate', 'rating', 'accepts_insurance',
+                       'latitude', 'longitude'):
+            setattr(self, column, getattr(pool, column)[rows])
@@ -0,0 +1,155 @@
+"""
+Inverted candidate index for therapist matching.
+
+Maps every specialization, approach, language and time-of-day code to the
+pool rows (therapists) listing it. For a client, the posting lists give the
+exact overlap counts of each code category; combined with pool-wide ceilings
+for the per-therapist scalar components (price, rating, experience) they
+yield an upper bound on every therapist's overall score. ``rank`` then scores
+candidates exactly in descending-bound order, keeps a top-k heap and stops as
+soon as no unscored candidate can beat the k-th score. The result is the same
+top-k, in the same order, as a full scan.
+
+Clients with a location and a maximum distance are first narrowed to the
+therapists the pool's grid index finds within that distance; bounds and exact
+scores are only ever computed for those candidates.
+"""
+
+import heapq
+from typing import Dict, Optional
+
+import numpy as np
+
+from .matching_engine import CATEGORIES, ClientFeatures, TherapistPool, client_codes, score_columns
+from .spatial_index import haversine_km
+
+# Candidates are scored exactly in blocks of at least this many rows.
+MIN_BLOCK_SIZE = 256
+
+
+class CandidateIndex:
+    """Posting lists and score ceilings for a ``TherapistPool``."""
+
+    def __init__(self, pool: TherapistPool):
+        self.pool = pool
+        self.postings = {}
+        for category in CATEGORIES:
+            rows_by_code = {}
+            for code, position in pool.vocabulary[category].items():
+                rows_by_code[code] = _rows_with_bit(pool.masks[category], position)
+            self.postings[category] = rows_by_code
+
+        # Ceilings of the per-therapist scalar features
+        self.max_experience = int(pool.experience.max()) if len(pool) else 0
+        self.max_rating = float(pool.rating.max()) if len(pool) else 0.0
+
+    def overlap_counts(self, client_prefs) -> Dict[str, np.ndarray]:
+        """Exact per-row overlap counts for each category, from the posting lists."""
+        codes = client_codes(client_prefs)
+        counts = {}
+        for category in CATEGORIES:
+            postings = self.postings[category]
+            hits = [postings[code] for code in set(codes[category]) if code in postings]
+            if hits:
+                counts[category] = np.bincount(np.concatenate(hits), minlength=len(self.pool))
+            else:
+                counts[category] = np.zeros(len(self.pool), dtype=np.int64)
+        return counts
+
+    def upper_bounds(self, client_prefs, weights: Dict[str, float], urgency_multiplier: float,
+                     rows: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """
+        Upper bound of the unrounded overall score of every row, or of ``rows``.
+
+        Returns None when no finite bound exists (negative budgets make the
+        over-budget price formula unbounded).
+        """
+        client = ClientFeatures(client_prefs, urgency_multiplier)
+        if client.budget < 0:
+            return None
+        pool = self.pool
+        if rows is None:
+            rows = np.arange(len(pool))
+        ceiling = _CeilingTherapist(self, rows)
+        overlap = {category: counts[rows] for category, counts in self.overlap_counts(client_prefs).items()}
+        # Every minute of the client's windows free is the best slot overlap
+        overlap['slot_minutes'] = np.full(len(rows), client.window_minutes, dtype=np.int64)
+        # Distances are exact and cheap, like the overlap counts
+        overlap['distance_km'] = haversine_km(client.latitude, client.longitude,
+                                              pool.latitude[rows], pool.longitude[rows])
+        return score_columns(client, ceiling, overlap, weights)['overall_score']
+
+    def rank(self, client_prefs, weights: Dict[str, float], urgency_multiplier: float,
+             limit: Optional[int] = None) -> np.ndarray:
+        """
+        Pool rows of the best ``limit`` matches, best first.
+
+        Ties on the rounded overall score are broken by pool row, exactly as
+        the stable sort of a full scan does. ``limit=None`` ranks every
+        candidate: the whole pool, or the rows within the client's maximum
+        distance.
+        """
+        pool = self.pool
+        candidates = pool.candidate_rows(client_prefs)
+        size = len(pool) if candidates is None else len(candidates)
+        bounds = None
+        if limit is not None and limit < size:
+            bounds = self.upper_bounds(client_prefs, weights, urgency_multiplier, rows=candidates)
+
+        if bounds is None:
+            overall = pool.score(client_prefs, weights, urgency_multiplier, rows=candidates)['overall_score']
+            rounded = np.array([round(value, 3) for value in overall.tolist()], dtype=np.float64)
+            ranked = np.argsort(-rounded, kind='stable')[:limit]
+            return ranked if candidates is None else candidates[ranked]
+
+        if limit <= 0:
+            return np.zeros(0, dtype=np.int64)
+
+        positions = np.argsort(-bounds, kind='stable')
+        order = positions if candidates is None else candidates[positions]
+        bounds = bounds[positions]
+        block_size = max(MIN_BLOCK_SIZE, 4 * limit)
+        heap = []  # (rounded score, -row): the root is the worst kept match
+
+        for start in range(0, len(order), block_size):
+            if len(heap) == limit and round(float(bounds[start]), 3) < heap[0][0]:
+                break  # nothing left can reach the k-th score, not even on a tie
+            block = order[start:start + block_size]
+            overall = pool.score(client_prefs, weights, urgency_multiplier, rows=block)['overall_score']
+            for row, value in zip(block.tolist(), overall.tolist()):
+                entry = (round(value, 3), -row)
+                if len(heap) < limit:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+
+        return np.array([-row for _, row in sorted(heap, reverse=True)], dtype=np.int64)
+
+
+class _CeilingTherapist:
+    """
+    Optimistic therapist features for bounding scores.
+
+    Code-list lengths and availability flags come from the pool (they decide
+    the set components together with the index overlaps); the scalar features
+    are replaced by their most favourable values.
+    """
+
+    def __init__(self, index: CandidateIndex, rows: np.ndarray):
+        pool = index.pool
+        self.spec_count = pool.spec_count[rows]
+        self.approach_count = pool.approach_count[rows]
+        self.time_count = pool.time_count[rows]
+        self.has_availability = pool.has_availability[rows]
+        self.has_slots = pool.has_slots[rows]
+        self.experience = index.max_experience
+        self.rating = index.max_rating
+        # A free session with insurance accepted maximises the price score
+        self.rate = 0.0
+        self.accepts_insurance = True
+
+
+def _rows_with_bit(masks: np.ndarray, position: int) -> np.ndarray:
+    """Rows of a bitmask matrix with the given bit set."""
+    word, bit = divmod(position, 64)
+    return np.flatnonzero((masks[:, word] >> np.uint64(bit)) & np.uint64(1))
@@ -4,14 +4,81 @@ This service provides personalized therapist recommendations based on
 client preferences, needs, and compatibility factors.
 """
 
-from typing import List, Dict, Tuple
-from django.db.models import Q
+from typing import Iterator, List, Dict, Optional, Tuple
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Case, ExpressionWrapper, F, FloatField, Min, OuterRef, Q, Subquery, Value, When
+)
+from django.db.models.functions import Coalesce, Least, Round
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from .models import TherapistProfile, ClientPreferences, MatchingScore
+from .availability_index import AvailabilityIndex, client_windows
+from .matching_engine import DEFAULT_DISTANCE_KM, TherapistPool
+from .matching_index import CandidateIndex
+from .spatial_index import haversine_km
+from .therapist_snapshot import TherapistRecord, TherapistSnapshot, get_snapshot
+from . import match_cache
+from itertools import islice
+import numpy as np
 import math
 
 User = get_user_model()
 
+# Named weightings of the score components. 'default' drives the matches
+# page and is the only one written to stored scores; the others exist for
+# read-only ranking experiments (see rank_stored_scores).
+# MATCHING_WEIGHT_PROFILES in settings adds or overrides profiles.
+SERVING_PROFILE = 'default'
+WEIGHT_PROFILES = {
+    'default': {
+        'specialization': 0.25,  # Most important factor
+        'approach': 0.20,        # Therapy method compatibility
+        'availability': 0.15,    # Scheduling compatibility
+        'preferences': 0.15,     # Personal preferences
+        'budget': 0.10,          # Financial considerations
+        'rating': 0.10,          # Quality/experience
+        # Served rankings use proximity only through the max-distance filter;
+        # distance_score is stored for experiments such as 'nearby'
+        'distance': 0.0,
+        'urgency': 0.05,         # Urgency adjustment
+    },
+    'clinical_fit': {
+        'specialization': 0.35,
+        'approach': 0.30,
+        'availability': 0.10,
+        'preferences': 0.10,
+        'budget': 0.05,
+        'rating': 0.10,
+        'distance': 0.0,
+        'urgency': 0.05,
+    },
+    'access': {
+        'specialization': 0.20,
+        'approach': 0.10,
+        'availability': 0.25,
+        'preferences': 0.10,
+        'budget': 0.25,
+        'rating': 0.10,
+        'distance': 0.0,
+        'urgency': 0.05,
+    },
+    'nearby': {
+        'specialization': 0.20,
+        'approach': 0.15,
+        'availability': 0.15,
+        'preferences': 0.10,
+        'budget': 0.10,
+        'rating': 0.10,
+        'distance': 0.15,
+        'urgency': 0.05,
+    },
+}
+
+def get_weight_profiles() -> Dict[str, Dict[str, float]]:
+    return {**WEIGHT_PROFILES, **getattr(settings, 'MATCHING_WEIGHT_PROFILES', {})}
+
 class TherapistMatchingService:
     """
     Advanced matching algorithm that considers multiple factors:
@@ -24,16 +91,30 @@ class TherapistMatchingService:
     - Previous client ratings
     """
     
-    def __init__(self):
-        self.weights = {
-            'specialization': 0.25,  # Most important factor
-            'approach': 0.20,        # Therapy method compatibility
-            'availability': 0.15,    # Scheduling compatibility
-            'preferences': 0.15,     # Personal preferences
-            'budget': 0.10,          # Financial considerations
-            'rating': 0.10,          # Quality/experience
-            'urgency': 0.05,         # Urgency adjustment
-        }
+    # Score columns written by save_scores
+    SCORE_FIELDS = (
+        'overall_score', 'specialization_score', 'approach_score',
+        'availability_score', 'preference_score', 'distance_score', 'price_score',
+    )
+    # Rows per INSERT ... ON CONFLICT statement; keeps SQLite under its
+    # bound-parameter limit (11 columns per row)
+    SAVE_BATCH_SIZE = 500
+    # Clients scored per vectorized pass by rescore_therapist
+    RESCORE_BATCH_SIZE = 2000
+    
+    URGENCY_MULTIPLIERS = {
+        'low': 1.0,
+        'medium': 1.05,
+        'high': 1.1,
+        'crisis': 1.2
+    }
+    
+    def __init__(self, weight_profile: str = 'default'):
+        profiles = get_weight_profiles()
+        if weight_profile not in profiles:
+            raise ValueError(f"Unknown weight profile '{weight_profile}'")
+        self.weight_profile = weight_profile
+        self.weights = dict(profiles[weight_profile])
     
     def find_matches(self, client_user, limit=10) -> List[Dict]:
         """
@@ -41,7 +122,8 @@ class TherapistMatchingService:
         
         Args:
             client_user: User object for the client
-            limit: Maximum number of matches to return
+            limit: Maximum number of matches to return, or None to rank
+                and store scores for the whole pool
             
         Returns:
             List of dictionaries containing therapist info and match scores
@@ -52,45 +134,391 @@ class TherapistMatchingService:
             # Return basic matches if no preferences set
             return self._get_basic_matches(limit)
         
-        # Get all available therapists
-        available_therapists = TherapistProfile.objects.filter(
-            is_accepting_clients=True,
-            user__is_active=True
-        ).select_related('user')
+        # Serve repeat visits from the versioned cache; concurrent misses for
+        # the same key (double clicks, several tabs) share one computation
+        cache_key = match_cache.cache_key(client_prefs, self.weights, limit)
+        return match_cache.single_flight(
+            cache_key, lambda: self._compute_matches(client_user, client_prefs, limit)
+        )
+    
+    def _compute_matches(self, client_user, client_prefs: ClientPreferences, limit) -> List[Dict]:
+        """Matches of a cache miss, from precomputed rows or the pool snapshot."""
+        # Read scores written by the precompute_matches command when they
+        # are newer than the client's preferences
+        if limit and getattr(settings, 'MATCHING_USE_PRECOMPUTED', False):
+            matches = self.get_precomputed_matches(client_prefs, limit)
+            if matches is not None:
+                return matches
+        
+        # Rank the compiled pool snapshot, scoring only candidates that can
+        # still make the top `limit`
+        snapshot = get_snapshot()
+        therapist_ids, rows = self.rank_client(
+            client_prefs, snapshot.pool, snapshot.index, limit
+        )
         
-        matches = []
+        # Store/update matching scores of the returned matches in database
+        self.save_scores(client_user, therapist_ids, rows)
         
-        for therapist_profile in available_therapists:
-            score_data = self._calculate_match_score(client_prefs, therapist_profile)
-            
-            # Store/update matching score in database
-            matching_score, created = MatchingScore.objects.update_or_create(
-                client=client_user,
-                therapist=therapist_profile.user,
-                defaults=score_data
+        return [
+            self._build_match(client_prefs, snapshot.profiles_by_user_id[therapist_id], score_data, snapshot)
+            for therapist_id, score_data in zip(therapist_ids, rows)
+        ]
+    
+    def rank_client(self, client_prefs: ClientPreferences, pool: TherapistPool,
+                    index: CandidateIndex, limit=None) -> Tuple[List[int], List[Dict[str, float]]]:
+        """
+        Rank a pool for one client without touching the database.
+        
+        Returns the therapist user ids of the best `limit` matches, best
+        first, and their rounded score dicts.
+        """
+        urgency_multiplier = self._get_urgency_multiplier(client_prefs.urgency)
+        ranked = index.rank(client_prefs, self.weights, urgency_multiplier, limit)
+        rows = self._round_scores(
+            pool.score(client_prefs, self.weights, urgency_multiplier, rows=ranked)
+        )
+        return [pool.profiles[i].user_id for i in ranked], rows
+    
+    def get_ranking(self, client_prefs: ClientPreferences,
+                    depth: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        The client's ranking, best first, cached per pool version.
+        
+        Returns the therapist user ids and an int32 matrix of their scores
+        (columns in SCORE_FIELDS order) in thousandths, at least `depth`
+        rows deep (default: the whole ranking), and the length of the full
+        ranking. Dividing by 1000 gives back exactly the rounded scores.
+        Only the first match_cache.get_ranking_depth() rows are cached;
+        deeper requests are ranked without caching.
+        """
+        cache_key = match_cache.ranking_key(client_prefs, self.weights)
+        ranking = match_cache.get_ranking(cache_key)
+        if ranking is not None:
+            therapist_ids, thousandths, total = ranking
+            if len(therapist_ids) == total or (depth is not None and depth <= len(therapist_ids)):
+                return ranking
+        
+        snapshot = get_snapshot()
+        pool = snapshot.pool
+        candidates = pool.candidate_rows(client_prefs)
+        total = len(pool) if candidates is None else len(candidates)
+        cached_depth = match_cache.get_ranking_depth()
+        limit = None if depth is None else max(depth, cached_depth)
+        urgency_multiplier = self._get_urgency_multiplier(client_prefs.urgency)
+        ranked = snapshot.index.rank(client_prefs, self.weights, urgency_multiplier, limit)
+        scores = pool.score(client_prefs, self.weights, urgency_multiplier, rows=ranked)
+        therapist_ids = np.array([pool.profiles[row].user_id for row in ranked.tolist()], dtype=np.int64)
+        thousandths = np.zeros((len(ranked), len(self.SCORE_FIELDS)), dtype=np.int32)
+        for column, field in enumerate(self.SCORE_FIELDS):
+            rounded = [round(value, 3) for value in scores[field].tolist()]
+            thousandths[:, column] = np.rint(np.array(rounded, dtype=np.float64) * 1000)
+        match_cache.set_ranking(cache_key, therapist_ids[:cached_depth], thousandths[:cached_depth], total)
+        return therapist_ids, thousandths, total
+    
+    def ranked_matches(self, client_prefs: ClientPreferences, offset: int = 0,
+                       limit: Optional[int] = None) -> Tuple[int, Iterator[Dict]]:
+        """
+        Page through the client's ranking without re-scoring.
+        
+        Returns the ranking length and a lazy iterator over the match dicts
+        at positions [offset, offset + limit). Nothing is written to the
+        database; matches of therapists who left the pool since the ranking
+        was cached are skipped.
+        """
+        stop = None if limit is None else offset + limit
+        therapist_ids, thousandths, total = self.get_ranking(client_prefs, stop)
+        snapshot = get_snapshot()
+        
+        def matches():
+            for therapist_id, scores in zip(therapist_ids[offset:stop].tolist(),
+                                            thousandths[offset:stop].tolist()):
+                profile = snapshot.profiles_by_user_id.get(therapist_id)
+                if profile is None:
+                    continue
+                score_data = {field: value / 1000 for field, value in zip(self.SCORE_FIELDS, scores)}
+                yield self._build_match(client_prefs, profile, score_data, snapshot)
+        
+        return total, matches()
+    
+    def rescore_therapist(self, therapist_profile: TherapistProfile) -> int:
+        """
+        Re-score one therapist against every stored ClientPreferences row.
+        
+        Clients are scored in vectorized batches. A MatchingScore row is
+        written only where it already exists and its scores changed, or where
+        the new score reaches the lowest score stored for that client (so the
+        therapist enters precomputed rankings it now belongs in). Existing
+        rows whose scores did not change get their updated_at moved on, so
+        get_precomputed_matches sees them checked against the edit. Stored
+        rows of clients the therapist is now beyond the maximum distance of
+        are deleted. Returns the number of rows written or deleted.
+        """
+        if not (therapist_profile.is_accepting_clients and therapist_profile.user.is_active):
+            return 0
+        
+        therapist_id = therapist_profile.user_id
+        pool = TherapistPool([therapist_profile])
+        existing = {
+            client_id: tuple(values)
+            for client_id, *values in MatchingScore.objects.filter(
+                therapist_id=therapist_id
+            ).values_list('client_id', *self.SCORE_FIELDS)
+        }
+        floors = dict(
+            MatchingScore.objects.values('client_id').annotate(
+                floor=Min('overall_score')
+            ).values_list('client_id', 'floor')
+        )
+        
+        written = 0
+        clients = ClientPreferences.objects.order_by('pk').iterator(chunk_size=self.RESCORE_BATCH_SIZE)
+        while True:
+            batch = list(islice(clients, self.RESCORE_BATCH_SIZE))
+            if not batch:
+                return written
+            rows = self._round_scores(pool.score_clients(
+                batch, self.weights,
+                [self._get_urgency_multiplier(client_prefs.urgency) for client_prefs in batch],
+            ))
+            changed = []
+            unchanged = []
+            out_of_reach = []
+            for client_prefs, score_data, reachable in zip(batch, rows, pool.within_reach(batch).tolist()):
+                client_id = client_prefs.user_id
+                if not reachable:
+                    if client_id in existing:
+                        out_of_reach.append(client_id)
+                    continue
+                if client_id in existing:
+                    if existing[client_id] == tuple(score_data[field] for field in self.SCORE_FIELDS):
+                        unchanged.append(client_id)
+                        continue
+                elif client_id not in floors or score_data['overall_score'] < floors[client_id]:
+                    continue
+                changed.append(MatchingScore(client_id=client_id, therapist_id=therapist_id, **score_data))
+            self.upsert_scores(changed)
+            if unchanged:
+                MatchingScore.objects.filter(therapist_id=therapist_id, client_id__in=unchanged).update(
+                    updated_at=timezone.now()
+                )
+            if out_of_reach:
+                MatchingScore.objects.filter(therapist_id=therapist_id, client_id__in=out_of_reach).delete()
+            written += len(changed) + len(out_of_reach)
+    
+    def weighted_score_expression(self):
+        """
+        ORM expression recomputing overall_score from stored components.
+        
+        Uses the service weights, the therapist's current rating and the
+        client's urgency. Components are stored rounded to 3 decimals, so the
+        result can differ from a full rescore in the last decimal.
+        """
+        rating_score = Subquery(
+            TherapistProfile.objects.filter(user_id=OuterRef('therapist_id')).annotate(
+                rating_score=Least(F('rating') / Value(5.0), Value(1.0))
+            ).values('rating_score')[:1],
+            output_field=FloatField(),
+        )
+        urgency_multiplier = Subquery(
+            ClientPreferences.objects.filter(user_id=OuterRef('client_id')).annotate(
+                multiplier=Case(
+                    *[When(urgency=urgency, then=Value(multiplier))
+                      for urgency, multiplier in self.URGENCY_MULTIPLIERS.items()],
+                    default=Value(1.0),
+                    output_field=FloatField(),
+                )
+            ).values('multiplier')[:1],
+            output_field=FloatField(),
+        )
+        return ExpressionWrapper(
+            (
+                F('specialization_score') * self.weights['specialization'] +
+                F('approach_score') * self.weights['approach'] +
+                F('availability_score') * self.weights['availability'] +
+                F('preference_score') * self.weights['preferences'] +
+                F('price_score') * self.weights['budget'] +
+                Coalesce(rating_score, Value(0.0)) * self.weights['rating'] +
+                F('distance_score') * self.weights['distance']
+            ) * Coalesce(urgency_multiplier, Value(1.0)),
+            output_field=FloatField(),
+        )
+    
+    def reweight_scores(self, queryset=None) -> int:
+        """
+        Rewrite overall_score of stored rows with the serving weights.
+        
+        One set-based UPDATE over `queryset` (default: every MatchingScore
+        row); no Python scoring is involved. Returns the number of rows.
+        overall_score is what the matches page serves, so only the serving
+        profile may write it; rank experiments with rank_stored_scores.
+        """
+        if self.weight_profile != SERVING_PROFILE:
+            raise ValueError(
+                f"Only the '{SERVING_PROFILE}' profile rewrites stored scores; "
+                f"'{self.weight_profile}' is read-only"
             )
-            
-            matches.append({
-                'therapist': therapist_profile,
-                'score': score_data['overall_score'],
-                'score_breakdown': {
-                    'specialization': score_data['specialization_score'],
-                    'approach': score_data['approach_score'],
-                    'availability': score_data['availability_score'],
-                    'preferences': score_data['preference_score'],
-                    'budget': score_data['price_score'],
-                    'rating': therapist_profile.rating,
-                },
-                'match_reasons': self._generate_match_reasons(client_prefs, therapist_profile)
-            })
-        
-        # Sort by overall score and return top matches
-        matches.sort(key=lambda x: x['score'], reverse=True)
-        return matches[:limit]
+        if queryset is None:
+            queryset = MatchingScore.objects.all()
+        # updated_at stays: reweighting checks nothing against the current
+        # pool, and get_precomputed_matches reads it as exactly that
+        updated = queryset.update(overall_score=Round(self.weighted_score_expression(), 3))
+        # Cached rankings may have been built from the old stored scores
+        match_cache.bump_pool_version()
+        return updated
+    
+    def rank_stored_scores(self, client_user, limit=10):
+        """
+        Stored matches of a client ranked by this service's weights.
+        
+        A read-only experiment: one query annotating `weighted_score`,
+        nothing is written.
+        """
+        return MatchingScore.objects.filter(client=client_user).annotate(
+            weighted_score=Round(self.weighted_score_expression(), 3)
+        ).order_by('-weighted_score', 'therapist_id')[:limit]
+    
+    def get_precomputed_matches(self, client_prefs: ClientPreferences,
+                                limit: int) -> Optional[List[Dict]]:
+        """
+        Build matches from stored MatchingScore rows.
+        
+        Returns None unless at least `limit` rows for accepting therapists
+        were written after the client's preferences last changed, and no
+        accepting therapist changed since the rows were written. A
+        therapist's change time is its search entry's updated_at, which
+        every TherapistProfile save rewrites; one it has no newer row for
+        may now rank differently than the stored rows say.
+        """
+        scores = list(
+            MatchingScore.objects.filter(
+                client_id=client_prefs.user_id,
+                therapist__therapist_search_entry__is_matchable=True,
+            ).select_related('therapist__therapist_profile')
+            .order_by('-overall_score', 'therapist_id')[:limit]
+        )
+        accepting = TherapistProfile.objects.filter(search_entry__is_matchable=True).count()
+        if len(scores) < min(limit, accepting):
+            return None
+        if any(score.updated_at < client_prefs.updated_at for score in scores):
+            return None
+        scored_at = Subquery(
+            MatchingScore.objects.filter(
+                client_id=client_prefs.user_id, therapist_id=OuterRef('user_id'),
+            ).values('updated_at')[:1]
+        )
+        changed_since = TherapistProfile.objects.filter(
+            search_entry__is_matchable=True,
+            search_entry__updated_at__gt=min(score.updated_at for score in scores),
+        ).annotate(scored_at=scored_at).filter(
+            Q(scored_at__isnull=True) | Q(scored_at__lt=F('search_entry__updated_at'))
+        )
+        if changed_since.exists():
+            return None
+        
+        return [
+            self._build_match(
+                client_prefs,
+                score.therapist.therapist_profile,
+                {field: getattr(score, field) for field in self.SCORE_FIELDS},
+            )
+            for score in scores
+        ]
+    
+    def save_scores(self, client_user, therapist_ids: List[int],
+                    rows: List[Dict[str, float]]) -> int:
+        """
+        Persist a client's scores with one upsert per batch.
+        
+        Existing rows are read in a single query and only new or changed
+        scores are written; unchanged ones just get their updated_at moved
+        on, which get_precomputed_matches reads as "checked against the
+        current pool". Returns the number of rows written.
+        """
+        existing = {
+            therapist_id: tuple(values)
+            for therapist_id, *values in MatchingScore.objects.filter(
+                client=client_user
+            ).values_list('therapist_id', *self.SCORE_FIELDS)
+        }
+        
+        changed = [
+            MatchingScore(client=client_user, therapist_id=therapist_id, **score_data)
+            for therapist_id, score_data in zip(therapist_ids, rows)
+            if existing.get(therapist_id) != tuple(score_data[field] for field in self.SCORE_FIELDS)
+        ]
+        self.upsert_scores(changed)
+        changed_ids = {score.therapist_id for score in changed}
+        unchanged = [therapist_id for therapist_id in therapist_ids if therapist_id not in changed_ids]
+        if unchanged:
+            MatchingScore.objects.filter(client=client_user, therapist_id__in=unchanged).update(
+                updated_at=timezone.now()
+            )
+        return len(changed)
+    
+    def upsert_scores(self, scores: List[MatchingScore]) -> None:
+        """Insert or update MatchingScore rows with one statement per batch."""
+        if not scores:
+            return
+        with transaction.atomic():
+            MatchingScore.objects.bulk_create(
+                scores,
+                batch_size=self.SAVE_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['client', 'therapist'],
+                update_fields=[*self.SCORE_FIELDS, 'updated_at'],
+            )
+    
+    def _round_scores(self, scores: Dict[str, np.ndarray]) -> List[Dict[str, float]]:
+        """
+        Turn engine score arrays into per-therapist score dicts.
+        
+        Python's round() is used rather than np.round() so stored and ranked
+        scores match the scalar scorer exactly.
+        """
+        columns = {key: values.tolist() for key, values in scores.items()}
+        return [
+            {key: round(values[i], 3) for key, values in columns.items()}
+            for i in range(len(columns['overall_score']))
+        ]
+    
+    def _build_match(self, client_prefs: ClientPreferences,
+                     therapist_profile: TherapistProfile,
+                     score_data: Dict[str, float],
+                     snapshot: Optional[TherapistSnapshot] = None) -> Dict:
+        """
+        Assemble the match dictionary rendered by the matches page.
+        
+        Reasons are generated from the therapist's compiled record, taken
+        from `snapshot` when given.
+        """
+        if snapshot is not None:
+            therapist = snapshot.record(therapist_profile)
+        else:
+            therapist = TherapistRecord(therapist_profile)
+        return {
+            'therapist': therapist_profile,
+            'score': score_data['overall_score'],
+            'score_breakdown': {
+                'specialization': score_data['specialization_score'],
+                'approach': score_data['approach_score'],
+                'availability': score_data['availability_score'],
+                'preferences': score_data['preference_score'],
+                'budget': score_data['price_score'],
+                'distance': score_data['distance_score'],
+                'rating': therapist.rating,
+            },
+            'match_reasons': self._generate_match_reasons(client_prefs, therapist)
+        }
     
     def _calculate_match_score(self, client_prefs: ClientPreferences, 
                               therapist_profile: TherapistProfile) -> Dict[str, float]:
-        """Calculate comprehensive matching score between client and therapist."""
+        """
+        Calculate comprehensive matching score between client and therapist.
+        
+        Scalar reference implementation of the scoring rules; find_matches
+        uses the vectorized TherapistPool engine, which must agree with it.
+        """
         
         # 1. Specialization Score
         specialization_score = self._calculate_specialization_score(
@@ -109,6 +537,13 @@ class TherapistMatchingService:
             client_prefs.preferred_times,
             therapist_profile.availability
         )
+        windows = client_windows(client_prefs.preferred_times or [])
+        slots = AvailabilityIndex.build([therapist_profile.user_id])
+        if windows and slots.has_slots[0]:
+            availability_score = self._calculate_slot_availability_score(
+                sum(end - start for start, end in windows),
+                int(slots.overlap_minutes(windows, np.array([0]))[0])
+            )
         
         # 4. Personal Preferences Score
         preference_score = self._calculate_preference_score(
@@ -126,7 +561,12 @@ class TherapistMatchingService:
         # 6. Rating/Quality Score
         rating_score = min(therapist_profile.rating / 5.0, 1.0)
         
-        # 7. Urgency Adjustment
+        # 7. Distance Score
+        distance_score = self._calculate_distance_score(
+            client_prefs, therapist_profile
+        )
+        
+        # 8. Urgency Adjustment
         urgency_multiplier = self._get_urgency_multiplier(client_prefs.urgency)
         
         # Calculate weighted overall score
@@ -136,7 +576,8 @@ class TherapistMatchingService:
             availability_score * self.weights['availability'] +
             preference_score * self.weights['preferences'] +
             price_score * self.weights['budget'] +
-            rating_score * self.weights['rating']
+            rating_score * self.weights['rating'] +
+            distance_score * self.weights['distance']
         ) * urgency_multiplier
         
         return {
@@ -146,7 +587,7 @@ class TherapistMatchingService:
             'availability_score': round(availability_score, 3),
             'preference_score': round(preference_score, 3),
             'price_score': round(price_score, 3),
-            'distance_score': 0.0,  # Placeholder for future geo features
+            'distance_score': round(distance_score, 3),
         }
     
     def _calculate_specialization_score(self, client_specializations: List[str], 
@@ -200,6 +641,13 @@ class TherapistMatchingService:
         
         return 0.3
     
+    def _calculate_slot_availability_score(self, window_minutes: int,
+                                           free_minutes: int) -> float:
+        """Calculate scheduling compatibility from weekly free minutes."""
+        if not free_minutes:
+            return 0.3
+        return min(0.4 + (free_minutes / window_minutes * 0.6), 1.0)
+    
     def _calculate_preference_score(self, client_prefs: ClientPreferences, 
                                   therapist_profile: TherapistProfile) -> float:
         """Calculate personal preference compatibility."""
@@ -252,67 +700,74 @@ class TherapistMatchingService:
             over_ratio = (therapist_rate - client_budget) / client_budget
             return max(0.1, 0.5 - (over_ratio * 0.4))
     
+    def _calculate_distance_score(self, client_prefs: ClientPreferences,
+                                  therapist_profile: TherapistProfile) -> float:
+        """Calculate geographic proximity from great-circle distance."""
+        locations = (client_prefs.latitude, client_prefs.longitude,
+                     therapist_profile.latitude, therapist_profile.longitude)
+        if any(value is None for value in locations):
+            return 0.5  # Neutral if either location is unknown
+        
+        distance_km = float(haversine_km(*(float(value) for value in locations)))
+        scale = float(client_prefs.max_distance_km or DEFAULT_DISTANCE_KM)
+        # Score falls linearly to its floor at the client's maximum distance
+        return max(0.1, 1.0 - (distance_km / scale * 0.9))
+    
     def _get_urgency_multiplier(self, urgency: str) -> float:
         """Adjust scores based on client urgency."""
-        multipliers = {
-            'low': 1.0,
-            'medium': 1.05,
-            'high': 1.1,
-            'crisis': 1.2
-        }
-        return multipliers.get(urgency, 1.0)
+        return self.URGENCY_MULTIPLIERS.get(urgency, 1.0)
     
     def _generate_match_reasons(self, client_prefs: ClientPreferences, 
-                              therapist_profile: TherapistProfile) -> List[str]:
-        """Generate human-readable reasons for the match."""
+                              therapist: TherapistRecord) -> List[str]:
+        """Generate human-readable reasons for the match from a compiled record."""
         reasons = []
         
-        # Specialization matches
-        spec_matches = (set(client_prefs.preferred_specializations) & 
-                       set(therapist_profile.specializations))
-        if spec_matches:
-            spec_names = [dict(TherapistProfile.SPECIALIZATIONS).get(spec, spec) 
-                         for spec in spec_matches if spec is not None]
-            spec_names = [name for name in spec_names if name is not None]
-            if spec_names:
-                reasons.append(f"Specializes in {', '.join(spec_names)}")
+        # Specialization matches, labels resolved when the record was compiled
+        client_specializations = set(client_prefs.preferred_specializations)
+        if client_specializations & therapist.specializations:
+            spec_names = [label for code, label in therapist.specialization_labels
+                          if code in client_specializations]
+            reasons.append(f"Specializes in {', '.join(spec_names)}")
         
         # Approach matches
-        approach_matches = (set(client_prefs.preferred_therapy_approaches) & 
-                          set(therapist_profile.therapy_approaches))
-        if approach_matches:
-            approach_names = [dict(TherapistProfile.THERAPY_APPROACHES).get(app, app) 
-                            for app in approach_matches if app is not None]
-            approach_names = [name for name in approach_names if name is not None]
-            if approach_names:
-                reasons.append(f"Uses {', '.join(approach_names)} approach")
+        client_approaches = set(client_prefs.preferred_therapy_approaches)
+        if client_approaches & therapist.approaches:
+            approach_names = [label for code, label in therapist.approach_labels
+                              if code in client_approaches]
+            reasons.append(f"Uses {', '.join(approach_names)} approach")
         
         # Experience
-        if therapist_profile.years_of_experience >= 10:
-            reasons.append(f"{therapist_profile.years_of_experience}+ years of experience")
+        if therapist.years_of_experience >= 10:
+            reasons.append(f"{therapist.years_of_experience}+ years of experience")
         
         # Insurance
         if (client_prefs.insurance_provider and 
-            therapist_profile.accepts_insurance):
+            therapist.accepts_insurance):
             reasons.append("Accepts your insurance")
         
         # Rating
-        if therapist_profile.rating >= 4.5:
-            reasons.append(f"Highly rated ({therapist_profile.rating:.1f}/5.0)")
+        if therapist.rating >= 4.5:
+            reasons.append(f"Highly rated ({therapist.rating:.1f}/5.0)")
         
         # Languages
-        lang_matches = (set(client_prefs.preferred_languages) & 
-                       set(therapist_profile.languages_spoken))
-        if lang_matches:
+        client_languages = set(client_prefs.preferred_languages)
+        if client_languages & therapist.languages:
+            lang_matches = [lang for lang in therapist.language_list if lang in client_languages]
             reasons.append(f"Speaks {', '.join(lang_matches)}")
         
+        # Proximity
+        locations = (client_prefs.latitude, client_prefs.longitude,
+                     therapist.latitude, therapist.longitude)
+        if len(reasons) < 4 and all(value is not None for value in locations):
+            distance_km = float(haversine_km(*(float(value) for value in locations)))
+            reasons.append(f"{distance_km:.0f} km from you")
+        
         return reasons[:4]  # Limit to top 4 reasons
     
     def _get_basic_matches(self, limit: int) -> List[Dict]:
         """Return basic matches when no client preferences are available."""
         therapists = TherapistProfile.objects.filter(
-            is_accepting_clients=True,
-            user__is_active=True
+            search_entry__is_matchable=True
         ).order_by('-rating', '-years_of_experience')[:limit]
         
         return [{
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchingscore',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
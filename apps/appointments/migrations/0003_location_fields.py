@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0002_matchingscore_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clientpreferences',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='clientpreferences',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='clientpreferences',
+            name='max_distance_km',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='therapistprofile',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='therapistprofile',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
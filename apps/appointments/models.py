@@ -47,8 +47,11 @@ class TherapistProfile(models.Model):
     age_groups = models.JSONField(default=list)  # ['children', 'adolescents', 'adults', 'seniors']
     gender_preference = models.CharField(max_length=20, blank=True)  # Client preference
     is_accepting_clients = models.BooleanField(default=True)
+    max_active_clients = models.PositiveIntegerField(default=20)  # Capacity used by batch assignment
     rating = models.FloatField(default=0.0)
     total_reviews = models.IntegerField(default=0)
+    latitude = models.FloatField(null=True, blank=True)  # Practice location, decimal degrees
+    longitude = models.FloatField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
@@ -83,6 +86,9 @@ class ClientPreferences(models.Model):
     preferred_times = models.JSONField(default=list)  # ['morning', 'afternoon', 'evening']
     urgency = models.CharField(max_length=20, choices=URGENCY_LEVELS, default='medium')
     previous_therapy_experience = models.BooleanField(default=False)
+    latitude = models.FloatField(null=True, blank=True)  # Client location, decimal degrees
+    longitude = models.FloatField(null=True, blank=True)
+    max_distance_km = models.PositiveIntegerField(null=True, blank=True)  # Blank = any distance
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -101,6 +107,7 @@ class MatchingScore(models.Model):
     distance_score = models.FloatField(default=0.0)
     price_score = models.FloatField(default=0.0)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         unique_together = ['client', 'therapist']
@@ -129,3 +136,13 @@ class Appointment(models.Model):
     
     def __str__(self):
         return f"{self.client.full_name} with {self.therapist.full_name} - {self.appointment_date}"
+
+class ClientAssignment(models.Model):
+    """Therapist assigned to a client by the urgent batch assignment"""
+    client = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='therapist_assignment')
+    therapist = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='client_assignments')
+    score = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.client.full_name} assigned to {self.therapist.full_name}"
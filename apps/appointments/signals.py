@@ -0,0 +1,22 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from apps.professional.models import TherapistAvailability
+from .models import TherapistProfile
+from . import jobs, match_cache
+
+@receiver(post_save, sender=TherapistProfile)
+@receiver(post_delete, sender=TherapistProfile)
+@receiver(post_save, sender=TherapistAvailability)
+@receiver(post_delete, sender=TherapistAvailability)
+def bump_matching_pool_version(sender, instance, **kwargs):
+    # Bookings also change free time but are left to the cache TTL and the
+    # snapshot's maximum age, since every booking would otherwise flush all
+    # cached rankings. Bump after commit so no process rebuilds its pool
+    # snapshot from the old rows under the new version.
+    transaction.on_commit(match_cache.bump_pool_version)
+
+@receiver(post_save, sender=TherapistProfile)
+def rescore_changed_therapist(sender, instance, raw=False, **kwargs):
+    if not raw:
+        jobs.enqueue_rescore(instance.pk)
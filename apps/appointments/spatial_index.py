@@ -0,0 +1,79 @@
+"""
+In-process uniform-grid spatial index for therapist locations.
+
+Points are bucketed into square latitude/longitude cells. A radius query
+visits only the cells overlapping the query's bounding box and then filters
+those candidates by exact great-circle distance, so "within 25 km" never
+touches therapists on the other side of the country. No external geo
+service is involved.
+"""
+
+import math
+from typing import Dict, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180  # Along a meridian
+
+# Edge of a grid cell; queries scan O((radius / cell)^2) cells
+DEFAULT_CELL_KM = 25.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; broadcasts over arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(value) for value in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GridIndex:
+    """Rows bucketed by grid cell. NaN coordinates are not indexed."""
+
+    def __init__(self, latitudes: np.ndarray, longitudes: np.ndarray,
+                 cell_km: float = DEFAULT_CELL_KM):
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.cell_degrees = cell_km / KM_PER_DEGREE
+        # Longitude cells tile the full circle exactly so the antimeridian wraps cleanly
+        self.lon_cells = math.ceil(360 / self.cell_degrees)
+        self.lon_cell_degrees = 360 / self.lon_cells
+
+        located = np.flatnonzero(~(np.isnan(latitudes) | np.isnan(longitudes)))
+        buckets: Dict[Tuple[int, int], list] = {}
+        for row in located.tolist():
+            buckets.setdefault(self._cell(latitudes[row], longitudes[row]), []).append(row)
+        self.cells = {cell: np.array(rows, dtype=np.int64) for cell, rows in buckets.items()}
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_degrees),
+                math.floor((lon + 180) / self.lon_cell_degrees) % self.lon_cells)
+
+    def within(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Sorted rows whose location lies within ``radius_km`` of a point."""
+        lat_span = radius_km / KM_PER_DEGREE
+        lat_low, lat_high = max(lat - lat_span, -90.0), min(lat + lat_span, 90.0)
+        # Degrees of longitude shrink towards the poles; size the longitude
+        # span for the most poleward latitude in range
+        narrowest_cos = min(math.cos(math.radians(lat_low)), math.cos(math.radians(lat_high)))
+        if narrowest_cos <= 1e-9 or radius_km / (KM_PER_DEGREE * narrowest_cos) >= 180:
+            lon_range = range(self.lon_cells)
+        else:
+            lon_span = radius_km / (KM_PER_DEGREE * narrowest_cos)
+            first = math.floor((lon - lon_span + 180) / self.lon_cell_degrees)
+            last = math.floor((lon + lon_span + 180) / self.lon_cell_degrees)
+            lon_range = [cell % self.lon_cells for cell in range(first, last + 1)]
+
+        candidates = [
+            self.cells[(lat_cell, lon_cell)]
+            for lat_cell in range(math.floor(lat_low / self.cell_degrees),
+                                  math.floor(lat_high / self.cell_degrees) + 1)
+            for lon_cell in set(lon_range)
+            if (lat_cell, lon_cell) in self.cells
+        ]
+        if not candidates:
+            return np.zeros(0, dtype=np.int64)
+        rows = np.unique(np.concatenate(candidates))
+        distances = haversine_km(lat, lon, self.latitudes[rows], self.longitudes[rows])
+        return rows[distances <= radius_km]
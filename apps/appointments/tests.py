@@ -0,0 +1,144 @@
+import random
+from datetime import time
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+
+from apps.authentication.models import CustomUser
+from apps.professional.models import Therapist, TherapistAvailability
+from . import matching_index
+from .matching_engine import TherapistPool
+from .matching_index import CandidateIndex
+from .matching_service import TherapistMatchingService
+from .models import ClientPreferences, TherapistProfile
+from .spatial_index import haversine_km
+
+SPECIALIZATIONS = ['anxiety', 'depression', 'trauma', 'grief', 'adhd', 'ocd', 'unknown_code']
+APPROACHES = ['cbt', 'dbt', 'emdr', 'gestalt', 'mindfulness']
+LANGUAGES = ['English', 'Spanish', 'French', 'Hindi']
+TIMES = ['morning', 'afternoon', 'evening']
+
+
+def sample(rng, values, most=3):
+    return [rng.choice(values) for _ in range(rng.randint(0, most))]
+
+
+def location(rng, share):
+    if rng.random() >= share:
+        return {}
+    return {'latitude': rng.uniform(39.5, 41.5), 'longitude': rng.uniform(-75.0, -73.0)}
+
+
+def create_therapists(rng, count):
+    profiles = []
+    for i in range(count):
+        user = CustomUser.objects.create(
+            username=f'therapist{i}', email=f'therapist{i}@example.com',
+            first_name='Therapist', last_name=str(i), user_type='therapist',
+        )
+        profiles.append(TherapistProfile.objects.create(
+            user=user, license_number=f'LIC-{i}', education='Education', bio='Bio',
+            specializations=sample(rng, SPECIALIZATIONS, 4),
+            therapy_approaches=sample(rng, APPROACHES),
+            languages_spoken=sample(rng, LANGUAGES),
+            availability=rng.choice([{}, {'preferred_times': sample(rng, TIMES)}, {'monday': ['9-5']}]),
+            years_of_experience=rng.randint(0, 20),
+            rate_per_session=Decimal(rng.randint(50, 250)),
+            accepts_insurance=rng.random() < 0.4,
+            rating=rng.choice([0.0, 3.3, 4.5, 5.0, round(rng.random() * 5, 2)]),
+            **location(rng, 0.8),
+        ))
+        if i % 4 == 0:
+            # Weekly hours give these therapists slot-based availability scores
+            therapist = Therapist.objects.create(
+                user=user, license_number=f'PRO-{i}', bio='Bio', years_experience=5,
+                education='Education', hourly_rate=Decimal('100.00'),
+            )
+            for weekday in rng.sample(range(7), 3):
+                start = rng.choice([7, 9, 12, 17])
+                TherapistAvailability.objects.create(
+                    therapist=therapist, weekday=weekday,
+                    start_time=time(start), end_time=time(start + rng.choice([2, 3, 5])),
+                )
+    return profiles
+
+
+def create_clients(rng, count):
+    clients = []
+    for i in range(count):
+        user = CustomUser.objects.create(
+            username=f'client{i}', email=f'client{i}@example.com',
+            first_name='Client', last_name=str(i),
+        )
+        clients.append(ClientPreferences.objects.create(
+            user=user,
+            preferred_specializations=sample(rng, SPECIALIZATIONS, 4),
+            preferred_therapy_approaches=sample(rng, APPROACHES),
+            preferred_languages=sample(rng, LANGUAGES),
+            preferred_times=sample(rng, TIMES),
+            therapist_gender_preference=rng.choice(['', 'female']),
+            age_preference=rng.choice(['', 'experienced']),
+            budget_max=rng.choice([None, Decimal('0'), Decimal(rng.randint(60, 200))]),
+            insurance_provider=rng.choice(['', 'Aetna']),
+            urgency=rng.choice(['low', 'medium', 'high', 'crisis']),
+            max_distance_km=rng.choice([None, 5, 25, 50, 100]),
+            **location(rng, 0.7),
+        ))
+    return clients
+
+
+class VectorizedScoringTests(TestCase):
+    """The vectorized engine and the pruned ranking against the scalar reference."""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(20261017)
+        create_therapists(rng, 120)
+        cls.clients = create_clients(rng, 60)
+
+    def setUp(self):
+        self.service = TherapistMatchingService()
+        self.pool = TherapistPool.load()
+        self.index = CandidateIndex(self.pool)
+
+    def reference_ranking(self, client_prefs):
+        """Therapist ids and score dicts of a full scalar scan, best first."""
+        scored = []
+        for profile in self.pool.profiles:
+            if client_prefs.max_distance_km and client_prefs.latitude is not None:
+                if profile.latitude is None or float(haversine_km(
+                    client_prefs.latitude, client_prefs.longitude, profile.latitude, profile.longitude,
+                )) > client_prefs.max_distance_km:
+                    continue
+            scored.append((profile.user_id, self.service._calculate_match_score(client_prefs, profile)))
+        # Stable, so ties keep pool order like the engine's
+        scored.sort(key=lambda match: -match[1]['overall_score'])
+        return [user_id for user_id, _ in scored], [scores for _, scores in scored]
+
+    def test_pool_scores_match_scalar_reference(self):
+        self.assertEqual(len(self.pool), TherapistProfile.objects.filter(search_entry__is_matchable=True).count())
+        for client_prefs in self.clients:
+            multiplier = self.service._get_urgency_multiplier(client_prefs.urgency)
+            rows = self.service._round_scores(self.pool.score(client_prefs, self.service.weights, multiplier))
+            reference = [self.service._calculate_match_score(client_prefs, profile) for profile in self.pool.profiles]
+            self.assertEqual(rows, reference, client_prefs.user.username)
+
+    def test_ranking_matches_full_scalar_scan(self):
+        # Small blocks so that pruning stops early on a pool this size
+        with mock.patch.object(matching_index, 'MIN_BLOCK_SIZE', 8):
+            for client_prefs in self.clients:
+                therapist_ids, rows = self.reference_ranking(client_prefs)
+                for limit in (5, None):
+                    with self.subTest(limit=limit, client=client_prefs.user.username):
+                        ranked = self.service.rank_client(client_prefs, self.pool, self.index, limit)
+                        self.assertEqual(ranked, (therapist_ids[:limit], rows[:limit]))
+
+    def test_upper_bounds_cover_exact_scores(self):
+        for client_prefs in self.clients:
+            multiplier = self.service._get_urgency_multiplier(client_prefs.urgency)
+            bounds = self.index.upper_bounds(client_prefs, self.service.weights, multiplier)
+            if bounds is None:
+                continue
+            exact = self.pool.score(client_prefs, self.service.weights, multiplier)['overall_score']
+            self.assertTrue((bounds >= exact - 1e-9).all(), client_prefs.user.username)
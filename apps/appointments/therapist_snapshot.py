@@ -0,0 +1,120 @@
+"""
+Compiled, per-process snapshot of the accepting therapist pool.
+
+Loading the pool means reading every accepting profile, their weekly slots
+and bookings, and encoding them into the scorer's column arrays. The
+snapshot does that once and keeps the result until the therapist-pool
+version (see match_cache.py) moves on, or until it is older than
+MATCHING_SNAPSHOT_MAX_AGE seconds so that new bookings, which do not bump
+the version, still reach the availability index.
+
+Besides the scorer's ``TherapistPool`` and ``CandidateIndex`` it holds one
+``TherapistRecord`` per therapist: frozen code sets with their display
+labels resolved up front, which is all match-reason generation reads.
+Nothing in the snapshot is mutated after it is built.
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+
+from . import match_cache
+from .matching_engine import TherapistPool
+from .matching_index import CandidateIndex
+from .models import TherapistProfile
+
+SPECIALIZATION_LABELS = dict(TherapistProfile.SPECIALIZATIONS)
+APPROACH_LABELS = dict(TherapistProfile.THERAPY_APPROACHES)
+
+
+class TherapistRecord:
+    """Read-only features of one therapist, as used by match reasons."""
+
+    __slots__ = (
+        'user_id', 'specializations', 'specialization_labels', 'approaches',
+        'approach_labels', 'languages', 'language_list', 'years_of_experience',
+        'rating', 'accepts_insurance', 'latitude', 'longitude',
+    )
+
+    def __init__(self, profile: TherapistProfile):
+        specializations = _codes(profile.specializations)
+        approaches = _codes(profile.therapy_approaches)
+        languages = _codes(profile.languages_spoken)
+        # Code sets for intersections; (code, label) pairs keep the profile's order
+        self.user_id = profile.user_id
+        self.specializations = frozenset(specializations)
+        self.specialization_labels = tuple(
+            (code, SPECIALIZATION_LABELS.get(code, code)) for code in specializations
+        )
+        self.approaches = frozenset(approaches)
+        self.approach_labels = tuple(
+            (code, APPROACH_LABELS.get(code, code)) for code in approaches
+        )
+        self.languages = frozenset(languages)
+        self.language_list = languages
+        self.years_of_experience = profile.years_of_experience
+        self.rating = profile.rating
+        self.accepts_insurance = profile.accepts_insurance
+        self.latitude = profile.latitude
+        self.longitude = profile.longitude
+
+
+class TherapistSnapshot:
+    """Pool, candidate index and therapist records of one pool version."""
+
+    def __init__(self, pool: TherapistPool, version: Optional[int] = None):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.pool = pool
+        self.index = CandidateIndex(pool)
+        self.records: Tuple[TherapistRecord, ...] = tuple(
+            TherapistRecord(profile) for profile in pool.profiles
+        )
+        self.records_by_user_id: Dict[int, TherapistRecord] = {
+            record.user_id: record for record in self.records
+        }
+        self.profiles_by_user_id: Dict[int, TherapistProfile] = {
+            profile.user_id: profile for profile in pool.profiles
+        }
+
+    def record(self, therapist_profile: TherapistProfile) -> TherapistRecord:
+        """The record of a therapist, compiled on the fly if not in this snapshot."""
+        record = self.records_by_user_id.get(therapist_profile.user_id)
+        return record if record is not None else TherapistRecord(therapist_profile)
+
+
+_snapshot: Optional[TherapistSnapshot] = None
+_lock = threading.Lock()
+
+
+def get_snapshot(version: Optional[int] = None) -> TherapistSnapshot:
+    """
+    Snapshot of the current pool version, rebuilding it when stale.
+
+    ``version`` saves a cache round trip when the caller already read the
+    pool version.
+    """
+    global _snapshot
+    if version is None:
+        version = match_cache.pool_version()
+    snapshot = _snapshot
+    if _is_current(snapshot, version):
+        return snapshot
+    with _lock:
+        # Another thread may have rebuilt it while we waited
+        if not _is_current(_snapshot, version):
+            _snapshot = TherapistSnapshot(TherapistPool.load(), version)
+        return _snapshot
+
+
+def _is_current(snapshot: Optional[TherapistSnapshot], version: int) -> bool:
+    max_age = getattr(settings, 'MATCHING_SNAPSHOT_MAX_AGE', 300)
+    return (snapshot is not None and snapshot.version == version
+            and (max_age is None or time.monotonic() - snapshot.built_at < max_age))
+
+
+def _codes(values) -> Tuple[str, ...]:
+    """Distinct non-null codes of a JSON list field, in listed order."""
+    return tuple(dict.fromkeys(code for code in values or () if code is not None))
@@ -1,9 +1,19 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.core import signing
+from django.http import JsonResponse, StreamingHttpResponse
 from .models import TherapistProfile, ClientPreferences, MatchingScore
 from .matching_service import TherapistMatchingService
+from . import match_cache
+import json
+
+MATCHES_PAGE_SIZE = 20
+MATCHES_MAX_PAGE_SIZE = 100
+MATCHES_CURSOR_SALT = 'appointments.matches-cursor'
+MATCHES_CURSOR_MAX_AGE = 3600  # Seconds a cursor stays valid
+# Upper bound of ClientPreferences.max_distance_km, about half the Earth's circumference
+MAX_DISTANCE_KM = 20000
 
 @login_required
 def appointments_list(request):
@@ -29,6 +39,100 @@ def find_matches(request):
     }
     return render(request, 'appointments/matches.html', context)
 
+@login_required
+def matches_api(request):
+    """
+    Ranked matches as JSON, paged with an opaque cursor.
+    
+    The head of the ranking (MATCH_RANKING_DEPTH positions) is computed once
+    and cached, so following `next_cursor` through it never re-scores the
+    pool; deeper pages are ranked per request. `?limit=` sets the page size.
+    With `?format=ndjson` (or `Accept: application/x-ndjson`) matches are
+    streamed one JSON object per line, followed by a line holding `total`
+    and `next_cursor`; a stream holds at most MATCH_RANKING_DEPTH matches.
+    
+    A cursor is tied to the pool version and the client's preferences it
+    was ranked under. Once either changes the ranking differs, so the
+    cursor is refused with 409 and the client starts again from the top.
+    """
+    try:
+        client_prefs = ClientPreferences.objects.get(user=request.user)
+    except ClientPreferences.DoesNotExist:
+        return JsonResponse({'error': 'Set up your preferences to get ranked matches'}, status=400)
+    
+    matching_service = TherapistMatchingService()
+    ranking_state = {
+        'user': request.user.pk,
+        'version': match_cache.pool_version(),
+        'fingerprint': match_cache.preference_fingerprint(client_prefs, matching_service.weights),
+    }
+    offset = 0
+    if request.GET.get('cursor'):
+        try:
+            cursor = signing.loads(request.GET['cursor'], salt=MATCHES_CURSOR_SALT,
+                                   max_age=MATCHES_CURSOR_MAX_AGE)
+        except signing.SignatureExpired:
+            return JsonResponse({'error': 'Cursor expired, start again without one'}, status=409)
+        except signing.BadSignature:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+        if cursor.get('user') != request.user.pk:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+        if any(cursor.get(field) != value for field, value in ranking_state.items()):
+            return JsonResponse({'error': 'Your matches changed, start again without a cursor'}, status=409)
+        offset = cursor['offset']
+    
+    streaming = (request.GET.get('format') == 'ndjson' or
+                 'application/x-ndjson' in request.headers.get('Accept', ''))
+    max_limit = match_cache.get_ranking_depth() if streaming else MATCHES_MAX_PAGE_SIZE
+    limit = max_limit if streaming else MATCHES_PAGE_SIZE
+    if request.GET.get('limit'):
+        try:
+            limit = int(request.GET['limit'])
+        except ValueError:
+            return JsonResponse({'error': 'Invalid limit'}, status=400)
+        if limit < 1:
+            return JsonResponse({'error': 'Invalid limit'}, status=400)
+        limit = min(limit, max_limit)
+    
+    total, matches = matching_service.ranked_matches(client_prefs, offset, limit)
+    next_cursor = None
+    if offset + limit < total:
+        next_cursor = signing.dumps({**ranking_state, 'offset': offset + limit}, salt=MATCHES_CURSOR_SALT)
+    
+    if not streaming:
+        return JsonResponse({
+            'matches': [_serialize_match(match) for match in matches],
+            'total': total,
+            'next_cursor': next_cursor,
+        })
+    
+    def lines():
+        for match in matches:
+            yield json.dumps(_serialize_match(match)) + '\n'
+        yield json.dumps({'total': total, 'next_cursor': next_cursor}) + '\n'
+    
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+
+def _serialize_match(match):
+    """JSON-ready form of a match dict built by TherapistMatchingService."""
+    profile = match['therapist']
+    return {
+        'therapist': {
+            'id': profile.user_id,
+            'name': profile.user.full_name,
+            'specializations': profile.get_specializations_display(),
+            'approaches': profile.get_approaches_display(),
+            'years_of_experience': profile.years_of_experience,
+            'rate_per_session': str(profile.rate_per_session),
+            'accepts_insurance': profile.accepts_insurance,
+            'languages': profile.languages_spoken,
+            'rating': profile.rating,
+        },
+        'score': match['score'],
+        'score_breakdown': match['score_breakdown'],
+        'match_reasons': match['match_reasons'],
+    }
+
 @login_required
 def setup_preferences(request):
     """Setup or update client preferences for matching"""
@@ -41,6 +145,23 @@ def setup_preferences(request):
         # Process form data and save preferences
         data = request.POST
         
+        max_distance_km = _parse_distance(data.get('max_distance_km'))
+        latitude = _parse_coordinate(data.get('latitude'), 90)
+        longitude = _parse_coordinate(data.get('longitude'), 180)
+        errors = {}
+        if max_distance_km is False:
+            errors['max_distance_km'] = f'Choose a whole number of kilometres between 1 and {MAX_DISTANCE_KM}.'
+        if latitude is False:
+            errors['latitude'] = 'Enter a latitude between -90 and 90.'
+        if longitude is False:
+            errors['longitude'] = 'Enter a longitude between -180 and 180.'
+        if not errors and (latitude is None) != (longitude is None):
+            errors['latitude' if latitude is None else 'longitude'] = 'Enter both latitude and longitude, or neither.'
+        if errors:
+            context = _preferences_context(preferences)
+            context['errors'] = errors
+            return render(request, 'appointments/preferences.html', context, status=400)
+        
         if preferences:
             # Update existing preferences
             preferences.concerns = data.getlist('concerns')
@@ -54,6 +175,9 @@ def setup_preferences(request):
             preferences.preferred_times = data.getlist('preferred_times')
             preferences.urgency = data.get('urgency', 'medium')
             preferences.previous_therapy_experience = data.get('previous_experience') == 'yes'
+            preferences.latitude = latitude
+            preferences.longitude = longitude
+            preferences.max_distance_km = max_distance_km
             preferences.save()
         else:
             # Create new preferences
@@ -69,20 +193,47 @@ def setup_preferences(request):
                 session_frequency=data.get('session_frequency', 'weekly'),
                 preferred_times=data.getlist('preferred_times'),
                 urgency=data.get('urgency', 'medium'),
-                previous_therapy_experience=data.get('previous_experience') == 'yes'
+                previous_therapy_experience=data.get('previous_experience') == 'yes',
+                latitude=latitude,
+                longitude=longitude,
+                max_distance_km=max_distance_km
             )
         
         messages.success(request, 'Your preferences have been saved! Let\'s find your matches.')
         return redirect('find-matches')
     
-    # Get choices for form
-    context = {
+    return render(request, 'appointments/preferences.html', _preferences_context(preferences))
+
+def _preferences_context(preferences):
+    """Preferences form context with the choices it offers"""
+    return {
         'preferences': preferences,
         'specializations': TherapistProfile.SPECIALIZATIONS,
         'therapy_approaches': TherapistProfile.THERAPY_APPROACHES,
         'urgency_levels': ClientPreferences.URGENCY_LEVELS,
+        'errors': {},
     }
-    return render(request, 'appointments/preferences.html', context)
+
+def _parse_distance(value):
+    """Parse the max distance form value: None when blank, False when invalid."""
+    if value is None or not value.strip():
+        return None
+    try:
+        distance = int(value)
+    except ValueError:
+        return False
+    return distance if 1 <= distance <= MAX_DISTANCE_KM else False
+
+def _parse_coordinate(value, bound):
+    """Parse a latitude/longitude form value: None when blank, False when invalid or out of range."""
+    if value is None or not value.strip():
+        return None
+    try:
+        coordinate = float(value)
+    except ValueError:
+        return False
+    # NaN fails both comparisons
+    return coordinate if -bound <= coordinate <= bound else False
 
 @login_required
 def therapist_detail(request, therapist_id):
@@ -4,3 +4,6 @@ class ProfessionalConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.professional'
     verbose_name = 'Professional Support'
+
+    def ready(self):
+        from . import signals  # noqa: F401
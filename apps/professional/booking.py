@@ -0,0 +1,267 @@
+"""
+Appointment booking through slot holds.
+
+Checking that a slot is free and then creating the appointment lets every
+concurrent booker pass the check, and all but one then fail on the
+appointment's unique constraint. Booking therefore goes in two steps:
+
+1. ``place_hold`` inserts a ``SlotHold`` row for the slot and one
+   ``SlotHoldCell`` row for every quarter hour the session touches. The
+   unique (therapist, starts_at) constraint on cells makes those inserts the
+   decision point, for holds on the same start time and for holds on other
+   start times that overlap it alike: exactly one concurrent caller
+   succeeds, the rest get ``SlotUnavailable`` straight away. A hold expires
+   after SLOT_HOLD_SECONDS.
+2. ``confirm_hold`` turns an unexpired hold into the appointment and drops
+   the hold, in one transaction. Dropping the hold frees its cells before
+   the slot calendar marks the appointment busy, so a hold placed in
+   between can be for booked time; confirming re-checks the therapist's
+   bookings for that reason.
+
+``book`` does both for callers that do not need the hold in between.
+Expired holds give way to the next ``place_hold`` overlapping them;
+``sweep_expired_holds`` removes the rest in bulk.
+
+``book_series`` books a weekly series (say every Tuesday at 15:00 for 12
+weeks) at once: all occurrences are checked against the slot bitmaps of
+their dates, computed from one range query of the therapist's bookings,
+then held through their cells like single slots and booked together, or
+none are and the conflicting dates are reported.
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import slot_calendar
+from .models import Appointment, SlotHold, SlotHoldCell, Therapist
+from .slots import MAX_SESSION_MINUTES, QUARTER_MINUTES, booked_intervals, day_bitmaps, fits
+
+MAX_SERIES_WEEKS = 52
+
+
+class SlotUnavailable(Exception):
+    """The slot is booked, held by someone else, or outside the therapist's hours."""
+
+
+class SeriesConflict(SlotUnavailable):
+    """Occurrences of a recurring series that cannot be booked."""
+
+    def __init__(self, conflicts: List[datetime]):
+        self.conflicts = conflicts
+        super().__init__(f'{len(conflicts)} of the sessions are not available')
+
+
+def get_hold_seconds() -> int:
+    return getattr(settings, 'SLOT_HOLD_SECONDS', 300)
+
+
+def session_terms(therapist: Therapist, session_type: str) -> Tuple[int, Decimal]:
+    """Duration in minutes and cost of a session type with a therapist."""
+    if session_type == 'intake':
+        return 90, therapist.hourly_rate * Decimal('1.5')
+    return 50, therapist.hourly_rate
+
+
+def active_holds(therapist: Therapist, start: datetime, end: datetime, now: Optional[datetime] = None):
+    """Unexpired holds of a therapist starting within a range."""
+    now = now or timezone.now()
+    return SlotHold.objects.filter(
+        therapist=therapist, date_time__gte=start, date_time__lt=end, expires_at__gt=now,
+    )
+
+
+def hold_cells(date_time: datetime, duration: int) -> List[datetime]:
+    """Starts of the quarter hours a session touches, partly covered ones included."""
+    quarter = timedelta(minutes=QUARTER_MINUTES)
+    # Quarters are counted from the epoch, so every start time shares one grid
+    epoch = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+    first = epoch + (date_time - epoch) // quarter * quarter
+    end = date_time + timedelta(minutes=duration)
+    cells = []
+    while first < end:
+        cells.append(first)
+        first += quarter
+    return cells
+
+
+def place_hold(therapist: Therapist, user, date_time: datetime,
+               session_type: str = 'therapy') -> SlotHold:
+    """Reserve a slot for ``user``; renews the user's own hold on it."""
+    now = timezone.now()
+    duration, _ = session_terms(therapist, session_type)
+    if date_time <= now:
+        raise SlotUnavailable('Time slot is in the past')
+    if not slot_calendar.is_free(therapist, date_time, duration):
+        raise SlotUnavailable('Time slot no longer available')
+
+    cells = hold_cells(date_time, duration)
+    try:
+        with transaction.atomic():
+            # Expired holds give up the quarters this session needs. Being a
+            # write, this also comes before any read, so SQLite never has to
+            # upgrade a read lock
+            SlotHoldCell.objects.filter(
+                therapist=therapist, starts_at__in=cells, hold__expires_at__lte=now,
+            ).delete()
+            SlotHold.objects.filter(therapist=therapist, date_time=date_time, expires_at__lte=now).delete()
+            # Renewing replaces the user's own hold on this slot under the same token
+            own = SlotHold.objects.filter(therapist=therapist, date_time=date_time, user=user)
+            token = own.values_list('token', flat=True).first()
+            own.delete()
+            hold = SlotHold.objects.create(
+                therapist=therapist, user=user, date_time=date_time,
+                duration_minutes=duration, session_type=session_type,
+                expires_at=now + timedelta(seconds=get_hold_seconds()),
+                **({'token': token} if token else {}),
+            )
+            SlotHoldCell.objects.bulk_create(
+                SlotHoldCell(hold=hold, therapist=therapist, starts_at=starts_at) for starts_at in cells
+            )
+            return hold
+    except IntegrityError:
+        raise SlotUnavailable('Time slot is being booked by someone else')
+
+
+def confirm_hold(token, user, notes: str = '', therapist: Optional[Therapist] = None) -> Appointment:
+    """Book the slot of an unexpired hold of ``user`` and release the hold."""
+    holds = SlotHold.objects.select_related('therapist').filter(token=token, user=user)
+    if therapist is not None:
+        holds = holds.filter(therapist=therapist)
+    hold = holds.first()
+    if hold is None or hold.expires_at <= timezone.now():
+        raise SlotUnavailable('Your hold on this time slot has expired')
+    _, cost = session_terms(hold.therapist, hold.session_type)
+    with transaction.atomic():
+        # Deleting the hold's cells claims it: a token confirms once, and the
+        # transaction writes before it reads, so it never has to upgrade a lock
+        claimed, _ = SlotHoldCell.objects.filter(hold=hold.pk, hold__expires_at__gt=timezone.now()).delete()
+        if not claimed:
+            raise SlotUnavailable('Your hold on this time slot has expired')
+        # A booking that overlaps committed before these cells could be
+        # taken, so it is visible here
+        end = hold.date_time + timedelta(minutes=hold.duration_minutes)
+        if booked_intervals(hold.therapist, hold.date_time, end):
+            raise SlotUnavailable('Time slot no longer available')
+        SlotHold.objects.filter(pk=hold.pk).delete()
+        try:
+            with transaction.atomic():
+                return Appointment.objects.create(
+                    user=user,
+                    therapist=hold.therapist,
+                    date_time=hold.date_time,
+                    duration_minutes=hold.duration_minutes,
+                    session_type=hold.session_type,
+                    notes_before=notes,
+                    cost=cost,
+                )
+        except IntegrityError:
+            raise SlotUnavailable('Time slot no longer available')
+
+
+def book(therapist: Therapist, user, date_time: datetime,
+         session_type: str = 'therapy', notes: str = '') -> Appointment:
+    """Hold and confirm a slot in one go."""
+    hold = place_hold(therapist, user, date_time, session_type)
+    return confirm_hold(hold.token, user, notes)
+
+
+def series_occurrences(first: datetime, weeks: int) -> List[datetime]:
+    """Start times of a weekly series, at the same local wall-clock time each week."""
+    local = timezone.localtime(first).replace(tzinfo=None)
+    return [timezone.make_aware(local + timedelta(weeks=week)) for week in range(weeks)]
+
+
+def series_conflicts(therapist: Therapist, user, occurrences: List[datetime], duration: int,
+                     now: Optional[datetime] = None) -> List[datetime]:
+    """
+    Occurrences that are past, outside the therapist's hours, booked, or
+    held by another user.
+
+    Bookings and holds over the whole series come from one range query
+    each; the occurrences are checked against the slot bitmaps of just
+    their own dates.
+    """
+    now = now or timezone.now()
+    range_start = occurrences[0]
+    range_end = occurrences[-1] + timedelta(minutes=duration)
+    holds = active_holds(
+        therapist, range_start - timedelta(minutes=MAX_SESSION_MINUTES), range_end, now,
+    ).exclude(user=user).values_list('date_time', 'duration_minutes')
+    bitmaps = day_bitmaps(
+        therapist,
+        {day for start in occurrences for day in slot_calendar.booking_dates(start, duration)},
+        busy=[(start, start + timedelta(minutes=held)) for start, held in holds],
+    )
+    return [start for start in occurrences if start <= now or not fits(bitmaps, start, duration)]
+
+
+def book_series(therapist: Therapist, user, first: datetime, weeks: int,
+                session_type: str = 'therapy', notes: str = '') -> List[Appointment]:
+    """
+    Book ``weeks`` weekly sessions starting at ``first``, all or none.
+
+    Raises ``SeriesConflict`` listing every occurrence that cannot be booked.
+    """
+    if not 1 <= weeks <= MAX_SERIES_WEEKS:
+        raise ValueError(f'A series runs for 1 to {MAX_SERIES_WEEKS} weeks')
+    duration, cost = session_terms(therapist, session_type)
+    occurrences = series_occurrences(first, weeks)
+    conflicts = series_conflicts(therapist, user, occurrences, duration)
+    if conflicts:
+        raise SeriesConflict(conflicts)
+
+    now = timezone.now()
+    cells = {start: hold_cells(start, duration) for start in occurrences}
+    all_cells = [starts_at for starts in cells.values() for starts_at in starts]
+    appointments = [
+        Appointment(
+            user=user, therapist=therapist, date_time=start, duration_minutes=duration,
+            session_type=session_type, notes_before=notes, cost=cost,
+        )
+        for start in occurrences
+    ]
+    try:
+        with transaction.atomic():
+            # Like place_hold, every occurrence is held before anything is
+            # read: expired holds and the user's own holds give way, then the
+            # occurrences' cells decide against concurrent holds and series
+            SlotHoldCell.objects.filter(
+                therapist=therapist, starts_at__in=all_cells, hold__expires_at__lte=now,
+            ).delete()
+            SlotHold.objects.filter(therapist=therapist, date_time__in=occurrences, expires_at__lte=now).delete()
+            SlotHold.objects.filter(therapist=therapist, user=user, cells__starts_at__in=all_cells).delete()
+            holds = [
+                SlotHold.objects.create(
+                    therapist=therapist, user=user, date_time=start, duration_minutes=duration,
+                    session_type=session_type, expires_at=now + timedelta(seconds=get_hold_seconds()),
+                )
+                for start in occurrences
+            ]
+            SlotHoldCell.objects.bulk_create(
+                SlotHoldCell(hold=hold, therapist=therapist, starts_at=starts_at)
+                for hold in holds for starts_at in cells[hold.date_time]
+            )
+            # Bookings committed since the check, before these cells were free
+            conflicts = series_conflicts(therapist, user, occurrences, duration, now)
+            if conflicts:
+                raise SeriesConflict(conflicts)
+            Appointment.objects.bulk_create(appointments)
+            SlotHold.objects.filter(pk__in=[hold.pk for hold in holds]).delete()
+            # bulk_create sends no post_save, so update the slot calendar here
+            dates = {day for start in occurrences for day in slot_calendar.booking_dates(start, duration)}
+            transaction.on_commit(lambda: slot_calendar.refresh_days(therapist.pk, dates))
+    except IntegrityError:
+        # Another hold or booking took one of the slots since the check
+        raise SeriesConflict(series_conflicts(therapist, user, occurrences, duration) or occurrences)
+    return appointments
+
+
+def sweep_expired_holds(now: Optional[datetime] = None) -> int:
+    """Delete every expired hold and its cells; returns how many holds."""
+    _, deleted = SlotHold.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted.get(SlotHold._meta.label, 0)
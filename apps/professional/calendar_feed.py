@@ -0,0 +1,152 @@
+"""
+iCalendar (.ics) feeds of users' appointments.
+
+Every user has one feed URL holding a signed token of their id and their
+``CalendarFeedKey``, so that calendar apps can subscribe without a
+session. Regenerating the key revokes every URL handed out before. The feed lists the
+appointments the user books as a client and the ones they hold as a
+therapist, from FEED_PAST_DAYS ago onwards.
+
+Calendar apps poll feeds every few minutes. ``feed_state`` gets the feed's
+latest ``updated_at`` and its row count from one aggregate query, and the
+view turns them into Last-Modified and an ETag. An unchanged feed is then
+answered with 304 before any row is read. Otherwise ``iter_calendar``
+renders the events while the rows stream from the database, so a long
+history is never built up in memory.
+"""
+
+import hashlib
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Iterator, Optional, Tuple
+
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import Appointment, CalendarFeedKey
+
+FEED_TOKEN_SALT = 'professional.calendar-feed'
+FEED_PAST_DAYS = 90
+CHUNK_SIZE = 500
+# iCalendar content lines are folded at 75 octets (RFC 5545, 3.1)
+LINE_OCTETS = 75
+
+EVENT_STATUS = {
+    'scheduled': 'TENTATIVE',
+    'cancelled': 'CANCELLED',
+    'rescheduled': 'CANCELLED',
+}
+
+User = get_user_model()
+
+
+def feed_token(user) -> str:
+    """The signed token of a user's feed URL, under their current feed key."""
+    feed_key, _ = CalendarFeedKey.objects.get_or_create(user=user)
+    return signing.Signer(salt=FEED_TOKEN_SALT).sign(f'{user.pk}:{feed_key.key}')
+
+
+def regenerate_feed_key(user) -> None:
+    """Give a user a new feed key, so their previous feed URLs stop working."""
+    CalendarFeedKey.objects.update_or_create(user=user, defaults={'key': uuid.uuid4()})
+
+
+def user_for_token(token: str):
+    """The active user a feed token belongs to, or None once its key was replaced."""
+    try:
+        user_id, key = signing.Signer(salt=FEED_TOKEN_SALT).unsign(token).split(':', 1)
+        key = uuid.UUID(key)
+    except (signing.BadSignature, ValueError):
+        return None
+    return User.objects.filter(pk=user_id, is_active=True, calendar_feed_key__key=key).first()
+
+
+def feed_appointments(user):
+    """Appointments in a user's feed, as client or as therapist."""
+    return Appointment.objects.filter(
+        Q(user=user) | Q(therapist__user=user),
+        date_time__gte=timezone.now() - timedelta(days=FEED_PAST_DAYS),
+    )
+
+
+def feed_state(user) -> Tuple[Optional[datetime], str]:
+    """Last modification and ETag of a user's feed, from one aggregate query."""
+    state = feed_appointments(user).aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+    # The count catches appointments leaving the feed, which moves no updated_at
+    fingerprint = f"{user.pk}:{state['count']}:{state['last_modified'] and state['last_modified'].isoformat()}"
+    return state['last_modified'], hashlib.md5(fingerprint.encode()).hexdigest()
+
+
+def iter_calendar(user) -> Iterator[str]:
+    """The lines of a user's feed, rendered as appointments are read."""
+    yield from _lines([
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//MindBridge//Appointments//EN',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_escape("MindBridge appointments")}',
+    ])
+    appointments = feed_appointments(user).select_related('user', 'therapist__user').order_by('date_time')
+    for appointment in appointments.iterator(chunk_size=CHUNK_SIZE):
+        yield from _lines(_event(appointment, user))
+    yield from _lines(['END:VCALENDAR'])
+
+
+def _event(appointment: Appointment, user) -> list:
+    if appointment.therapist.user_id == user.pk:
+        summary = f'Session with {appointment.user.get_full_name() or appointment.user.username}'
+    else:
+        summary = f'Session with {appointment.therapist.full_name}'
+    end = appointment.date_time + timedelta(minutes=appointment.duration_minutes)
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:{appointment.id}@mindbridge',
+        f'DTSTAMP:{_timestamp(appointment.updated_at)}',
+        f'LAST-MODIFIED:{_timestamp(appointment.updated_at)}',
+        f'DTSTART:{_timestamp(appointment.date_time)}',
+        f'DTEND:{_timestamp(end)}',
+        f'SUMMARY:{_escape(summary)}',
+        f'DESCRIPTION:{_escape(appointment.get_session_type_display())}',
+        f"STATUS:{EVENT_STATUS.get(appointment.status, 'CONFIRMED')}",
+    ]
+    if appointment.meeting_link:
+        lines.append(f'URL:{appointment.meeting_link}')
+    lines.append('END:VEVENT')
+    return lines
+
+
+def _timestamp(moment: datetime) -> str:
+    return moment.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _escape(text: str) -> str:
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _lines(lines) -> Iterator[str]:
+    for line in lines:
+        yield _fold(line) + '\r\n'
+
+
+def _fold(line: str) -> str:
+    """Split a content line into chunks of at most LINE_OCTETS octets."""
+    encoded = line.encode()
+    if len(encoded) <= LINE_OCTETS:
+        return line
+    chunks = []
+    start = 0
+    limit = LINE_OCTETS
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # Never split a multi-byte character
+        while end < len(encoded) and encoded[end] & 0xC0 == 0x80:
+            end -= 1
+        chunks.append(encoded[start:end].decode())
+        start = end
+        # Continuation lines start with a space, which counts towards the limit
+        limit = LINE_OCTETS - 1
+    return '\r\n '.join(chunks)
@@ -29,11 +29,37 @@ class TherapistSearchForm(forms.Form):
         widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Insurance provider'})
     )
     
+    # Languages are whatever therapists list, so the options come from the
+    # facet counts in show_counts; an unknown one just finds nobody
     language = forms.CharField(
         required=False,
-        max_length=50,
-        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Language spoken'})
+        max_length=100,
+        widget=forms.Select(attrs={'class': 'form-select'})
     )
+    
+    # Dropdown fields and the search facet kind they filter on
+    COUNTED_FIELDS = [
+        ('specialty', 'specialization'),
+        ('therapy_type', 'therapy_type'),
+        ('language', 'language'),
+    ]
+    
+    def show_counts(self, counts):
+        """Append the number of matching therapists to each dropdown option"""
+        languages = set(counts['language'])
+        # The chosen language stays listed even when nobody else matches it
+        selected = getattr(self, 'cleaned_data', {}).get('language')
+        if selected:
+            languages.add(selected)
+        self.fields['language'].widget.choices = [('', 'Any Language')] + [
+            (language, language) for language in sorted(languages)
+        ]
+        for field, kind in self.COUNTED_FIELDS:
+            widget = self.fields[field].widget
+            widget.choices = [
+                (value, f"{label} ({counts[kind].get(value, 0)})" if value else label)
+                for value, label in widget.choices
+            ]
 
 class AppointmentForm(ModelForm):
     class Meta:
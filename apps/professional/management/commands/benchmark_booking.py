@@ -0,0 +1,118 @@
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.utils import timezone
+
+from apps.professional import booking, slot_calendar
+from apps.professional.models import Appointment, Therapist
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Race many concurrent bookers for the same slots through the hold/confirm flow and '
+            'report winners per slot and booking latency. Synthetic rows are deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookers', type=int, default=50,
+                            help='Concurrent booking threads (default: 50)')
+        parser.add_argument('--slots', type=int, default=5,
+                            help='Slots the bookers compete for (default: 5)')
+        parser.add_argument('--confirm-delay', type=float, default=0.0,
+                            help='Seconds between placing a hold and confirming it (default: 0)')
+
+    def handle(self, *args, **options):
+        bookers, slot_count = options['bookers'], options['slots']
+        if bookers < 1 or slot_count < 1:
+            raise CommandError('--bookers and --slots must be positive')
+
+        therapist, clients = _create_population(bookers)
+        try:
+            slots = slot_calendar.free_slots(therapist, timezone.localdate() + timedelta(days=1), days=14)
+            if len(slots) < slot_count:
+                raise CommandError(f'Only {len(slots)} free slots to book, need {slot_count}')
+            targets = [slot['datetime'] for slot in slots[:slot_count]]
+
+            start = threading.Barrier(bookers)
+
+            def attempt(index):
+                client = clients[index]
+                slot = targets[index % slot_count]
+                start.wait()
+                started = time.perf_counter()
+                try:
+                    hold = booking.place_hold(therapist, client, slot)
+                    if options['confirm_delay']:
+                        time.sleep(options['confirm_delay'])
+                    booking.confirm_hold(hold.token, client)
+                    outcome = 'booked'
+                except booking.SlotUnavailable:
+                    outcome = 'rejected'
+                except Exception as e:
+                    outcome = f'error: {type(e).__name__}'
+                finally:
+                    connections.close_all()
+                return slot, outcome, time.perf_counter() - started
+
+            with ThreadPoolExecutor(max_workers=bookers) as executor:
+                results = list(executor.map(attempt, range(bookers)))
+
+            self._report(therapist, targets, results)
+        finally:
+            User.objects.filter(pk__in=[therapist.user_id] + [client.pk for client in clients]).delete()
+
+    def _report(self, therapist, targets, results):
+        outcomes = Counter(outcome for _, outcome, _ in results)
+        winners = Counter(slot for slot, outcome, _ in results if outcome == 'booked')
+        stored = Counter(
+            Appointment.objects.filter(therapist=therapist, date_time__in=targets)
+            .values_list('date_time', flat=True)
+        )
+        latencies = sorted(seconds * 1000 for _, _, seconds in results)
+
+        self.stdout.write(f'{len(results)} bookers on {len(targets)} slots ({connection.vendor})')
+        for outcome, count in sorted(outcomes.items()):
+            self.stdout.write(f'  {outcome:<24} {count}')
+        self.stdout.write('  latency ms: median {:.2f}  p95 {:.2f}  p99 {:.2f}  max {:.2f}'.format(
+            statistics.median(latencies), _percentile(latencies, 0.95),
+            _percentile(latencies, 0.99), latencies[-1],
+        ))
+        exact = all(winners[slot] == 1 and stored[slot] == 1 for slot in targets)
+        style = self.style.SUCCESS if exact else self.style.ERROR
+        self.stdout.write(style(
+            'Exactly one winner per slot' if exact else
+            'Winners per slot: ' + ', '.join(f'{winners[slot]} booked/{stored[slot]} stored' for slot in targets)
+        ))
+
+
+def _percentile(sorted_values, share):
+    return sorted_values[min(len(sorted_values) - 1, int(share * len(sorted_values)))]
+
+
+def _create_population(bookers):
+    token = f'{time.time_ns():x}'
+    password = make_password(None)
+    therapist_user = User.objects.create(
+        username=f'bench-{token}-therapist', email=f'bench-{token}-therapist@benchmark.invalid',
+        first_name='Bench', last_name='Therapist', user_type='therapist', password=password,
+    )
+    therapist = Therapist.objects.create(
+        user=therapist_user, license_number=f'BENCH-{token}', bio='Synthetic benchmark therapist',
+        years_experience=5, education='Synthetic', hourly_rate=Decimal('100.00'), verified=True,
+    )
+    User.objects.bulk_create([
+        User(username=f'bench-{token}-client-{i}', email=f'bench-{token}-client-{i}@benchmark.invalid',
+             first_name='Bench', last_name=f'Client {i}', user_type='client', password=password)
+        for i in range(bookers)
+    ])
+    clients = list(User.objects.filter(username__startswith=f'bench-{token}-client-').order_by('pk'))
+    return therapist, clients
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from apps.professional.search_index import rebuild_entries
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized therapist search entries and facets from both therapist models'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', type=int, action='append', dest='user_ids',
+                            help='Only rebuild this therapist user id (repeatable)')
+
+    def handle(self, *args, **options):
+        count = rebuild_entries(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} therapist search entries'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.professional.models import TherapistCalendarDay
+from apps.professional.slot_calendar import refresh_days
+
+
+class Command(BaseCommand):
+    help = 'Drop past days from the materialized slot calendar and recompute the rest'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--therapist-id', type=int, action='append', dest='therapist_ids',
+                            help='Only recompute this therapist id (repeatable)')
+
+    def handle(self, *args, **options):
+        pruned, _ = TherapistCalendarDay.objects.filter(date__lt=timezone.localdate()).delete()
+        therapist_ids = options['therapist_ids'] or sorted(set(
+            TherapistCalendarDay.objects.values_list('therapist_id', flat=True)
+        ))
+        refreshed = sum(refresh_days(therapist_id) for therapist_id in therapist_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Pruned {pruned} past days, recomputed {refreshed} days of {len(therapist_ids)} therapists'
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.professional.ratings import reconcile_ratings
+
+
+class Command(BaseCommand):
+    help = "Check every therapist's running rating aggregates against their reviews and repair drifted ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report drifted therapists, do not repair them')
+
+    def handle(self, *args, **options):
+        drifted = reconcile_ratings(repair=not options['dry_run'])
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('All therapist rating aggregates match their reviews'))
+            return
+        ids = ', '.join(str(pk) for pk in drifted[:20]) + (', ...' if len(drifted) > 20 else '')
+        action = 'Found' if options['dry_run'] else 'Repaired'
+        self.stdout.write(self.style.SUCCESS(f'{action} {len(drifted)} drifted therapist aggregates: {ids}'))
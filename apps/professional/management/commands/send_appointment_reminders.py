@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.professional.reminders import BATCH_SIZE, send_due_reminders
+
+
+class Command(BaseCommand):
+    help = ('Email reminders of appointments starting within APPOINTMENT_REMINDER_HOURS. '
+            'Several instances can run side by side.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help=f'Appointments claimed and emailed per batch (default: {BATCH_SIZE})')
+        parser.add_argument('--loop', type=float, metavar='SECONDS',
+                            help='Keep running, scanning for due reminders every SECONDS')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        while True:
+            sent = send_due_reminders(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Sent {sent} appointment reminders'))
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.professional.booking import sweep_expired_holds
+
+
+class Command(BaseCommand):
+    help = 'Delete expired appointment slot holds'
+
+    def handle(self, *args, **options):
+        deleted = sweep_expired_holds()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired slot holds'))
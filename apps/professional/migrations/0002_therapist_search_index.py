@@ -0,0 +1,105 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:54
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_search_index(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Therapist = apps.get_model('professional', 'Therapist')
+    TherapistProfile = apps.get_model('appointments', 'TherapistProfile')
+    TherapistSearchEntry = apps.get_model('professional', 'TherapistSearchEntry')
+    TherapistFacet = apps.get_model('professional', 'TherapistFacet')
+
+    sources = {}
+    for therapist in Therapist.objects.all():
+        sources.setdefault(therapist.user_id, [None, None])[0] = therapist
+    for profile in TherapistProfile.objects.all():
+        sources.setdefault(profile.user_id, [None, None])[1] = profile
+    active = set(User.objects.filter(pk__in=list(sources), is_active=True).values_list('pk', flat=True))
+
+    entries = []
+    facets = []
+    for user_id in sorted(sources):
+        therapist, profile = sources[user_id]
+        if therapist is not None:
+            fields = {
+                'hourly_rate': therapist.hourly_rate,
+                'rating': therapist.rating,
+                'total_reviews': therapist.total_reviews,
+                'years_experience': therapist.years_experience,
+            }
+            values = {
+                'specialization': therapist.specializations or [],
+                'therapy_type': therapist.therapy_types or [],
+                'language': therapist.languages_spoken or [],
+                'insurance': (therapist.insurance_accepted or []) if therapist.accepts_insurance else [],
+            }
+            for kind, kind_values in values.items():
+                for value in dict.fromkeys(kind_values):
+                    if isinstance(value, str) and value and len(value) <= 100:
+                        facets.append(TherapistFacet(entry_id=user_id, kind=kind, value=value))
+        else:
+            fields = {
+                'hourly_rate': profile.rate_per_session,
+                'rating': Decimal(str(round(profile.rating or 0.0, 2))),
+                'total_reviews': max(profile.total_reviews or 0, 0),
+                'years_experience': max(profile.years_of_experience or 0, 0),
+            }
+        entries.append(TherapistSearchEntry(
+            user_id=user_id,
+            therapist=therapist,
+            profile=profile,
+            accepts_insurance=any(
+                record is not None and record.accepts_insurance for record in (therapist, profile)
+            ),
+            is_searchable=therapist is not None and therapist.is_accepting_patients and therapist.verified,
+            is_matchable=(profile is not None and profile.is_accepting_clients
+                          and user_id in active),
+            **fields,
+        ))
+    TherapistSearchEntry.objects.bulk_create(entries, batch_size=1000)
+    TherapistFacet.objects.bulk_create(facets, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('appointments', '0004_client_assignment'),
+        ('professional', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TherapistSearchEntry',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='therapist_search_entry', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('hourly_rate', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('rating', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=3)),
+                ('total_reviews', models.PositiveIntegerField(default=0)),
+                ('years_experience', models.PositiveIntegerField(default=0)),
+                ('accepts_insurance', models.BooleanField(default=False)),
+                ('is_searchable', models.BooleanField(default=False)),
+                ('is_matchable', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('profile', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='search_entry', to='appointments.therapistprofile')),
+                ('therapist', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='search_entry', to='professional.therapist')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TherapistFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('specialization', 'Specialization'), ('therapy_type', 'Therapy Type'), ('language', 'Language'), ('insurance', 'Insurance')], max_length=20)),
+                ('value', models.CharField(max_length=100)),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='professional.therapistsearchentry')),
+            ],
+            options={
+                'unique_together': {('entry', 'kind', 'value')},
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
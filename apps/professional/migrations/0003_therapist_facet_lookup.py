@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('professional', '0002_therapist_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='therapistfacet',
+            index=models.Index(fields=['kind', 'value', 'entry'], name='therapist_facet_lookup'),
+        ),
+    ]
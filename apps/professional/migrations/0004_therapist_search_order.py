@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('professional', '0003_therapist_facet_lookup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='therapistsearchentry',
+            index=models.Index(condition=models.Q(('is_searchable', True)), fields=['-rating', '-total_reviews', 'hourly_rate', 'user'], name='therapist_search_order'),
+        ),
+    ]
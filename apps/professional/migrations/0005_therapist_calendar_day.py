@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('professional', '0004_therapist_search_order'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TherapistCalendarDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('available', models.BinaryField(max_length=12)),
+                ('free', models.BinaryField(max_length=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('therapist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calendar_days', to='professional.therapist')),
+            ],
+            options={
+                'ordering': ['therapist', 'date'],
+                'unique_together': {('therapist', 'date')},
+            },
+        ),
+    ]
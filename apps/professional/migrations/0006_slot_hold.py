@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('professional', '0005_therapist_calendar_day'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotHold',
+            fields=[
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('date_time', models.DateTimeField()),
+                ('duration_minutes', models.PositiveIntegerField(default=50)),
+                ('session_type', models.CharField(choices=[('intake', 'Initial Consultation'), ('therapy', 'Therapy Session'), ('followup', 'Follow-up'), ('crisis', 'Crisis Intervention'), ('group', 'Group Session')], default='therapy', max_length=20)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('therapist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_holds', to='professional.therapist')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_holds', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('therapist', 'date_time')},
+            },
+        ),
+    ]
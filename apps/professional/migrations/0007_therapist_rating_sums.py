@@ -0,0 +1,72 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:14
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+
+
+def count_reviews(apps, schema_editor):
+    Therapist = apps.get_model('professional', 'Therapist')
+    TherapistReview = apps.get_model('professional', 'TherapistReview')
+    TherapistSearchEntry = apps.get_model('professional', 'TherapistSearchEntry')
+    totals = {
+        row.pop('therapist'): row
+        for row in TherapistReview.objects.order_by().values('therapist').annotate(
+            total_reviews=Count('pk'),
+            recommend_count=Count('pk', filter=Q(would_recommend=True)),
+            rating_sum=Sum('rating'),
+            communication_sum=Sum('communication_rating'),
+            effectiveness_sum=Sum('effectiveness_rating'),
+        )
+    }
+    therapists = list(Therapist.objects.filter(pk__in=totals))
+    for therapist in therapists:
+        for field, value in totals[therapist.pk].items():
+            setattr(therapist, field, value)
+        therapist.rating = (Decimal(therapist.rating_sum) / therapist.total_reviews).quantize(
+            Decimal('0.01'), rounding=ROUND_HALF_UP,
+        )
+    Therapist.objects.bulk_update(
+        therapists,
+        ['rating', 'total_reviews', 'recommend_count', 'rating_sum', 'communication_sum', 'effectiveness_sum'],
+        batch_size=1000,
+    )
+    # Therapists without reviews keep the zeroed defaults
+    Therapist.objects.exclude(pk__in=totals).update(rating=Decimal('0.00'), total_reviews=0)
+    therapist = Therapist.objects.filter(pk=OuterRef('therapist_id'))
+    TherapistSearchEntry.objects.filter(therapist__isnull=False).update(
+        rating=Subquery(therapist.values('rating')[:1]),
+        total_reviews=Subquery(therapist.values('total_reviews')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('professional', '0006_slot_hold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='therapist',
+            name='communication_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='therapist',
+            name='effectiveness_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='therapist',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='therapist',
+            name='recommend_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_reviews, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('professional', '0007_therapist_rating_sums'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('reminder_sent', False)), fields=['reminder_sent', 'date_time'], name='appointment_reminder_due'),
+        ),
+    ]
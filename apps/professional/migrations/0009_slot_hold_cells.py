@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('professional', '0008_appointment_reminder_due'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotHoldCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('starts_at', models.DateTimeField()),
+                ('hold', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cells', to='professional.slothold')),
+                ('therapist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_hold_cells', to='professional.therapist')),
+            ],
+            options={
+                'unique_together': {('therapist', 'starts_at')},
+            },
+        ),
+    ]
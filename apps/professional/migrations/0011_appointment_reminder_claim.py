@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 06:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('professional', '0010_calendar_feed_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='reminder_claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
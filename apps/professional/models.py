@@ -51,6 +51,11 @@ class Therapist(models.Model):
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=Decimal('0.00'),
                                 validators=[MinValueValidator(0), MaxValueValidator(5)])
     total_reviews = models.PositiveIntegerField(default=0)
+    # Running sums over the therapist's reviews, kept by apps.professional.ratings
+    rating_sum = models.PositiveIntegerField(default=0)
+    communication_sum = models.PositiveIntegerField(default=0)
+    effectiveness_sum = models.PositiveIntegerField(default=0)
+    recommend_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -70,6 +75,21 @@ class Therapist(models.Model):
         spec_dict = dict(self.SPECIALIZATION_CHOICES)
         return [spec_dict.get(spec, spec) for spec in self.specializations]
     
+    @property
+    def communication_rating(self):
+        """Average communication rating of the therapist's reviews"""
+        return self.communication_sum / self.total_reviews if self.total_reviews else 0
+    
+    @property
+    def effectiveness_rating(self):
+        """Average effectiveness rating of the therapist's reviews"""
+        return self.effectiveness_sum / self.total_reviews if self.total_reviews else 0
+    
+    @property
+    def recommend_percentage(self):
+        """Share of reviewers who would recommend the therapist, in percent"""
+        return round(100 * self.recommend_count / self.total_reviews) if self.total_reviews else 0
+    
     @property
     def average_session_cost(self):
         """Calculate average cost based on therapy types"""
@@ -109,6 +129,7 @@ class Appointment(models.Model):
     cost = models.DecimalField(max_digits=8, decimal_places=2)
     paid = models.BooleanField(default=False)
     reminder_sent = models.BooleanField(default=False)
+    reminder_claimed_at = models.DateTimeField(null=True, blank=True)  # Set while a reminder worker sends it
     meeting_link = models.URLField(blank=True, help_text="Video call link")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -116,6 +137,14 @@ class Appointment(models.Model):
     class Meta:
         ordering = ['-date_time']
         unique_together = ['therapist', 'date_time']
+        indexes = [
+            # Due scan of the reminder dispatcher (reminders.py)
+            models.Index(
+                fields=['reminder_sent', 'date_time'],
+                name='appointment_reminder_due',
+                condition=models.Q(reminder_sent=False),
+            ),
+        ]
     
     def __str__(self):
         return f"{self.user.get_full_name()} - {self.therapist.full_name} - {self.date_time}"
@@ -201,6 +230,61 @@ class TherapistAvailability(models.Model):
         weekday_name = weekday_choices.get(self.weekday, 'Unknown')
         return f"{self.therapist.user.first_name} {self.therapist.user.last_name} - {weekday_name} {self.start_time}-{self.end_time}"
 
+class TherapistCalendarDay(models.Model):
+    """
+    Materialized free time of a therapist on one date, as bitmaps of the
+    day's 15-minute quarters (bit 0 = 00:00-00:15). Maintained by
+    slot_calendar.py.
+    """
+    therapist = models.ForeignKey(Therapist, on_delete=models.CASCADE, related_name='calendar_days')
+    date = models.DateField()
+    available = models.BinaryField(max_length=12)  # Inside the therapist's availability
+    free = models.BinaryField(max_length=12)  # Available and not booked
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['therapist', 'date']
+        ordering = ['therapist', 'date']
+    
+    def __str__(self):
+        return f"{self.therapist.full_name} - {self.date}"
+
+class SlotHold(models.Model):
+    """Short-lived reservation of a slot while its booking is confirmed"""
+    token = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    therapist = models.ForeignKey(Therapist, on_delete=models.CASCADE, related_name='slot_holds')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='slot_holds')
+    date_time = models.DateTimeField()
+    duration_minutes = models.PositiveIntegerField(default=50)
+    session_type = models.CharField(max_length=20, choices=Appointment.SESSION_TYPE_CHOICES, default='therapy')
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        # One holder per slot; the insert itself decides who gets it
+        unique_together = ['therapist', 'date_time']
+    
+    def __str__(self):
+        return f"Hold on {self.therapist.full_name} - {self.date_time} until {self.expires_at}"
+
+class SlotHoldCell(models.Model):
+    """One quarter hour a slot hold covers; unique per therapist, so overlapping holds cannot coexist"""
+    hold = models.ForeignKey(SlotHold, on_delete=models.CASCADE, related_name='cells')
+    therapist = models.ForeignKey(Therapist, on_delete=models.CASCADE, related_name='slot_hold_cells')
+    starts_at = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ['therapist', 'starts_at']
+
+class CalendarFeedKey(models.Model):
+    """Secret in a user's calendar feed URL; replacing it revokes the old URL"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='calendar_feed_key')
+    key = models.UUIDField(default=uuid.uuid4)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Calendar feed key of {self.user}"
+
 class InsuranceProvider(models.Model):
     """Insurance providers accepted by therapists"""
     name = models.CharField(max_length=100, unique=True)
@@ -214,3 +298,60 @@ class InsuranceProvider(models.Model):
     
     def __str__(self):
         return self.name
+
+class TherapistSearchEntry(models.Model):
+    """
+    One denormalized search row per therapist user, covering both the
+    professional ``Therapist`` and the matching ``TherapistProfile``.
+    Kept in sync by signals; see search_index.py.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True,
+                                related_name='therapist_search_entry')
+    therapist = models.OneToOneField(Therapist, on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='search_entry')
+    profile = models.OneToOneField('appointments.TherapistProfile', on_delete=models.SET_NULL,
+                                   null=True, blank=True, related_name='search_entry')
+    hourly_rate = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    rating = models.DecimalField(max_digits=3, decimal_places=2, default=Decimal('0.00'))
+    total_reviews = models.PositiveIntegerField(default=0)
+    years_experience = models.PositiveIntegerField(default=0)
+    accepts_insurance = models.BooleanField(default=False)
+    is_searchable = models.BooleanField(default=False)  # Listed by therapist search
+    is_matchable = models.BooleanField(default=False)  # Part of the matching pool
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Search result order (search_index.SEARCH_ORDER), for keyset pages
+            models.Index(
+                fields=['-rating', '-total_reviews', 'hourly_rate', 'user'],
+                name='therapist_search_order',
+                condition=models.Q(is_searchable=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"Search entry for {self.user.get_full_name()}"
+
+class TherapistFacet(models.Model):
+    """A searchable specialization, language, insurance or therapy type of a therapist"""
+    KIND_CHOICES = [
+        ('specialization', 'Specialization'),
+        ('therapy_type', 'Therapy Type'),
+        ('language', 'Language'),
+        ('insurance', 'Insurance'),
+    ]
+
+    entry = models.ForeignKey(TherapistSearchEntry, on_delete=models.CASCADE, related_name='facets')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    value = models.CharField(max_length=100)
+
+    class Meta:
+        unique_together = ['entry', 'kind', 'value']
+        indexes = [
+            # Facet lookups: all entries with a given value, read from the index alone
+            models.Index(fields=['kind', 'value', 'entry'], name='therapist_facet_lookup'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}: {self.value}"
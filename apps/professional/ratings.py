@@ -0,0 +1,132 @@
+"""
+Running rating aggregates of therapists.
+
+``Therapist`` keeps the sums of its reviews' ratings, communication and
+effectiveness ratings, the number of reviewers who would recommend it, and
+``total_reviews``. The signals in signals.py add a new review to them,
+apply the difference when one is edited and take a deleted one out,
+each with a single F-expression UPDATE that also recomputes
+``Therapist.rating`` from the new sums. No review table scan is needed,
+and concurrent reviews cannot lose each other's updates.
+
+The therapist's search entry gets the new rating and review count in the
+same transaction, so search ordering by rating stays current.
+``reconcile_ratings`` (``manage.py reconcile_ratings``) recomputes every
+aggregate from the reviews in one grouped query and repairs any that
+drifted.
+"""
+
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Dict, Iterable, List
+
+from django.db import transaction
+from django.db.models import (
+    Case, Count, DecimalField, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Cast, Round
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from .models import Therapist, TherapistReview, TherapistSearchEntry
+
+BATCH_SIZE = 1000
+# Therapist aggregate column -> TherapistReview column it sums
+SUMMED_FIELDS = {
+    'rating_sum': 'rating',
+    'communication_sum': 'communication_rating',
+    'effectiveness_sum': 'effectiveness_rating',
+}
+AGGREGATE_FIELDS = ('total_reviews', *SUMMED_FIELDS, 'recommend_count')
+
+
+def review_values(review) -> Dict[str, int]:
+    """What one review adds to its therapist's aggregates."""
+    values = {field: getattr(review, source) for field, source in SUMMED_FIELDS.items()}
+    values['total_reviews'] = 1
+    values['recommend_count'] = int(bool(review.would_recommend))
+    return values
+
+
+def average_rating(rating_sum: int, total_reviews: int) -> Decimal:
+    """``Therapist.rating`` of the given sums, as ``adjust`` computes it in SQL."""
+    if not total_reviews:
+        return Decimal('0.00')
+    return (Decimal(rating_sum) / total_reviews).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def adjust(therapist_id: int, deltas: Dict[str, int]) -> None:
+    """Add ``deltas`` (negative to take a review out) to a therapist's aggregates."""
+    changes = {field: F(field) + deltas.get(field, 0) for field in AGGREGATE_FIELDS}
+    # SET expressions all read the row's old values, so spell out the new sums
+    total_reviews = F('total_reviews') + deltas.get('total_reviews', 0)
+    rating_sum = F('rating_sum') + deltas.get('rating_sum', 0)
+    changes['rating'] = Case(
+        When(GreaterThan(total_reviews, 0), then=Cast(
+            Round(Cast(rating_sum, FloatField()) / total_reviews, 2),
+            DecimalField(max_digits=3, decimal_places=2),
+        )),
+        default=Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=3, decimal_places=2),
+    )
+    with transaction.atomic():
+        Therapist.objects.filter(pk=therapist_id).update(**changes)
+        sync_search_entries([therapist_id])
+
+
+def sync_search_entries(therapist_ids: Iterable[int]) -> int:
+    """Copy therapists' rating and review count into their search entries."""
+    therapist = Therapist.objects.filter(pk=OuterRef('therapist_id'))
+    return TherapistSearchEntry.objects.filter(therapist_id__in=list(therapist_ids)).update(
+        rating=Subquery(therapist.values('rating')[:1]),
+        total_reviews=Subquery(therapist.values('total_reviews')[:1]),
+        updated_at=timezone.now(),
+    )
+
+
+def reconcile_ratings(repair: bool = True) -> List[int]:
+    """
+    Compare every therapist's aggregates with its reviews, and its search
+    entry with those aggregates.
+
+    Returns the ids of therapists where either was off, after rewriting
+    them from the reviews unless ``repair`` is false.
+    """
+    actual = {
+        row.pop('therapist'): row
+        for row in TherapistReview.objects.order_by().values('therapist').annotate(
+            total_reviews=Count('pk'),
+            recommend_count=Count('pk', filter=Q(would_recommend=True)),
+            **{field: Sum(source) for field, source in SUMMED_FIELDS.items()},
+        )
+    }
+    empty = dict.fromkeys(AGGREGATE_FIELDS, 0)
+
+    drifted = []
+    for therapist in Therapist.objects.order_by('pk').only('rating', *AGGREGATE_FIELDS).iterator(
+        chunk_size=BATCH_SIZE,
+    ):
+        expected = actual.get(therapist.pk, empty)
+        rating = average_rating(expected['rating_sum'], expected['total_reviews'])
+        if therapist.rating != rating or any(
+            getattr(therapist, field) != expected[field] for field in AGGREGATE_FIELDS
+        ):
+            for field in AGGREGATE_FIELDS:
+                setattr(therapist, field, expected[field])
+            therapist.rating = rating
+            drifted.append(therapist)
+
+    ids = {therapist.pk for therapist in drifted}
+    # Search entries that missed an update of a correct therapist
+    ids.update(
+        TherapistSearchEntry.objects.filter(
+            ~Q(rating=F('therapist__rating')) | ~Q(total_reviews=F('therapist__total_reviews')),
+            therapist__isnull=False,
+        ).values_list('therapist_id', flat=True)
+    )
+    ids = sorted(ids)
+    if repair and ids:
+        with transaction.atomic():
+            Therapist.objects.bulk_update(drifted, ['rating', *AGGREGATE_FIELDS], batch_size=BATCH_SIZE)
+            for start in range(0, len(ids), BATCH_SIZE):
+                sync_search_entries(ids[start:start + BATCH_SIZE])
+    return ids
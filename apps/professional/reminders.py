@@ -0,0 +1,155 @@
+"""
+Appointment reminder emails.
+
+An appointment is due for its reminder once it starts within
+APPOINTMENT_REMINDER_HOURS and ``reminder_sent`` is still false. The due
+scan reads the ``appointment_reminder_due`` partial index on
+(reminder_sent, date_time), which only holds unsent reminders.
+
+``send_due_reminders`` works in batches. Each batch claims its rows in a
+short transaction: ``select_for_update(skip_locked=True)`` picks unclaimed
+rows and ``reminder_claimed_at`` marks them, and the claim commits before
+any email is sent, so no row locks are held while waiting on the mail
+server. The emails then go out over one connection of the configured
+email backend, and the rows are flagged sent. Several workers can
+therefore run side by side, each skipping the rows another one claimed.
+
+A reminder whose email fails has its claim dropped and is retried on the
+next run. A claim left behind by a worker that died mid-batch lapses after
+APPOINTMENT_REMINDER_CLAIM_SECONDS, and the reminder is sent again then.
+Users who turned off appointment reminders in their notification settings
+are flagged without an email.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.core import mail
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection, transaction
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Appointment
+from .slots import BOOKED_STATUSES
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+
+
+def get_reminder_hours() -> int:
+    return getattr(settings, 'APPOINTMENT_REMINDER_HOURS', 24)
+
+
+def get_claim_seconds() -> int:
+    return getattr(settings, 'APPOINTMENT_REMINDER_CLAIM_SECONDS', 600)
+
+
+def due_reminders(now: Optional[datetime] = None):
+    """Booked, not yet reminded or claimed appointments starting within the reminder window."""
+    now = now or timezone.now()
+    return Appointment.objects.filter(
+        Q(reminder_claimed_at__isnull=True)
+        | Q(reminder_claimed_at__lte=now - timedelta(seconds=get_claim_seconds())),
+        reminder_sent=False,
+        date_time__gt=now,
+        date_time__lte=now + timedelta(hours=get_reminder_hours()),
+        status__in=BOOKED_STATUSES,
+    ).order_by('date_time')
+
+
+def send_due_reminders(batch_size: int = BATCH_SIZE, now: Optional[datetime] = None) -> int:
+    """Send every due reminder, batch by batch; returns how many emails went out."""
+    sent = 0
+    # Reminders that failed in this run are left for the next one
+    failed: Set = set()
+    while True:
+        claimed, batch_sent = _send_batch(batch_size, now, failed)
+        sent += batch_sent
+        if claimed < batch_size:
+            return sent
+
+
+def _send_batch(batch_size: int, now: Optional[datetime], failed: Set):
+    """Claim, send and flag one batch; returns (claimed, sent)."""
+    ids, claimed_at = _claim(batch_size, now, failed)
+    if not ids:
+        return 0, 0
+    appointments = Appointment.objects.filter(pk__in=ids).select_related(
+        'user__profile', 'therapist__user',
+    ).order_by('date_time')
+
+    handled = []
+    sent = 0
+    try:
+        # Opening the connection up front keeps one SMTP session for the batch
+        with mail.get_connection() as mail_connection:
+            for appointment in appointments:
+                if not _wants_reminder(appointment.user):
+                    handled.append(appointment.pk)
+                    continue
+                try:
+                    if mail_connection.send_messages([_reminder_message(appointment)]):
+                        sent += 1
+                    handled.append(appointment.pk)
+                except Exception:
+                    failed.add(appointment.pk)
+                    logger.exception('Sending the reminder of appointment %s failed', appointment.pk)
+    finally:
+        Appointment.objects.filter(pk__in=handled).update(
+            reminder_sent=True, reminder_claimed_at=None, updated_at=timezone.now(),
+        )
+        # Unsent ones go back for the next run, unless their claim lapsed
+        # and another worker holds them now
+        Appointment.objects.filter(pk__in=ids, reminder_claimed_at=claimed_at).exclude(
+            pk__in=handled,
+        ).update(reminder_claimed_at=None)
+    logger.info('Sent %s of %s claimed appointment reminders', sent, len(ids))
+    return len(ids), sent
+
+
+def _claim(batch_size: int, now: Optional[datetime], failed: Set) -> Tuple[List, datetime]:
+    """Mark up to ``batch_size`` due reminders claimed and commit; returns their ids and the claim time."""
+    with transaction.atomic():
+        if not connection.features.has_select_for_update:
+            # Without row locks (SQLite) a write takes the database lock before
+            # the scan, so concurrent workers queue up instead of claiming the same rows
+            Appointment.objects.filter(pk__isnull=True).update(reminder_sent=True)
+        # The lock query stays free of joins so that FOR UPDATE only takes appointment rows
+        ids = list(
+            due_reminders(now).exclude(pk__in=failed).select_for_update(skip_locked=True)
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        claimed_at = timezone.now()
+        Appointment.objects.filter(pk__in=ids).update(reminder_claimed_at=claimed_at)
+    return ids, claimed_at
+
+
+def _wants_reminder(user) -> bool:
+    if not user.email:
+        return False
+    try:
+        preferences = user.profile.notification_preferences or {}
+    except ObjectDoesNotExist:
+        return True
+    return preferences.get('appointment_reminders', True)
+
+
+def _reminder_message(appointment: Appointment) -> mail.EmailMessage:
+    starts_at = timezone.localtime(appointment.date_time)
+    context = {
+        'appointment': appointment,
+        'user': appointment.user,
+        'therapist': appointment.therapist,
+        'starts_at': starts_at,
+    }
+    return mail.EmailMessage(
+        subject=f'Reminder: your session with {appointment.therapist.full_name} on '
+                f'{starts_at:%A, %B %d at %H:%M}',
+        body=render_to_string('professional/email/appointment_reminder.txt', context),
+        to=[appointment.user.email],
+    )
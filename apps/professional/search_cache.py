@@ -0,0 +1,63 @@
+"""
+Versioned cache for therapist search counts.
+
+Facet counts and result counts are keyed on the applied search filters and
+on a global search index version. Every rebuild of search entries, which signals.py runs when
+a Therapist or TherapistProfile is saved or deleted, bumps the version
+after commit, so counts computed against the old index stop being
+addressable and age out of the cache. The version is kept by
+``apps.appointments.cache_versions``, shared by every worker process.
+"""
+
+import hashlib
+import json
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from apps.appointments import cache_versions
+
+VERSION_KEY = 'search:index-version'
+
+
+def get_cache():
+    return caches[getattr(settings, 'SEARCH_CACHE_ALIAS', 'default')]
+
+
+def get_timeout() -> Optional[int]:
+    return getattr(settings, 'SEARCH_CACHE_TIMEOUT', 300)
+
+
+def index_version() -> int:
+    """Current search index version."""
+    return cache_versions.current(VERSION_KEY)
+
+
+def bump_index_version() -> None:
+    """Invalidate every cached search count."""
+    cache_versions.bump(VERSION_KEY)
+
+
+def facet_counts_key(filters: Dict) -> str:
+    return _filters_key('facet-counts', filters)
+
+
+def result_count_key(filters: Dict) -> str:
+    return _filters_key('result-count', filters)
+
+
+def get_counts(key: str):
+    return get_cache().get(key)
+
+
+def set_counts(key: str, value) -> None:
+    get_cache().set(key, value, get_timeout())
+
+
+def _filters_key(name: str, filters: Dict) -> str:
+    applied = {field: value for field, value in filters.items() if value}
+    encoded = json.dumps(applied, sort_keys=True, default=str)
+    return 'search:{}:{}:{}'.format(
+        name, index_version(), hashlib.sha256(encoded.encode()).hexdigest(),
+    )
@@ -0,0 +1,281 @@
+"""
+Denormalized therapist search index.
+
+A therapist can have a professional ``Therapist`` (search and booking), an
+``appointments.TherapistProfile`` (matching), or both. Each therapist user
+gets one ``TherapistSearchEntry`` row combining the two, so search filters
+and the matching pool read plain indexed columns instead of JSON lists.
+Search also gets one ``TherapistFacet`` row per specialization, therapy
+type, language and accepted insurance of the ``Therapist``. Only searchable
+entries are faceted and only a ``Therapist`` makes an entry searchable, so
+the profile's lists, which use their own vocabulary, are left out.
+
+Entries are rebuilt from the source rows by ``rebuild_entries``, which the
+signals in signals.py call on every save or delete, and which the
+``rebuild_search_index`` command runs in bulk.
+Per-value result counts for the search form's dropdowns come from one
+grouped query over the facet rows, cached per filter combination (see
+search_cache.py).
+"""
+
+import json
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from apps.appointments.models import TherapistProfile
+from . import search_cache
+from .models import Therapist, TherapistFacet, TherapistSearchEntry
+
+BATCH_SIZE = 1000
+# TherapistSearchEntry columns derived from the source rows
+ENTRY_FIELDS = (
+    'therapist', 'profile', 'hourly_rate', 'rating', 'total_reviews', 'years_experience',
+    'accepts_insurance', 'is_searchable', 'is_matchable', 'updated_at',
+)
+# TherapistFacet.value length
+MAX_VALUE_LENGTH = 100
+# Search result order; TherapistSearchEntry's therapist_search_order index matches it
+SEARCH_ORDER = ('-rating', '-total_reviews', 'hourly_rate', 'pk')
+# Facet kinds offered as search dropdowns, with counts
+COUNTED_FACETS = ('specialization', 'therapy_type', 'language')
+
+
+def entry_fields(therapist, profile, user) -> Dict:
+    """Column values of the search entry of one therapist user."""
+    # The professional record is what clients search and book, so its
+    # rate and reviews win where both exist
+    if therapist is not None:
+        hourly_rate = therapist.hourly_rate
+        rating = therapist.rating
+        total_reviews = therapist.total_reviews
+        years_experience = therapist.years_experience
+    else:
+        hourly_rate = profile.rate_per_session
+        rating = Decimal(str(round(profile.rating or 0.0, 2)))
+        total_reviews = max(profile.total_reviews or 0, 0)
+        years_experience = max(profile.years_of_experience or 0, 0)
+    return {
+        'therapist': therapist,
+        'profile': profile,
+        'hourly_rate': hourly_rate,
+        'rating': rating,
+        'total_reviews': total_reviews,
+        'years_experience': years_experience,
+        'accepts_insurance': any(
+            record is not None and record.accepts_insurance for record in (therapist, profile)
+        ),
+        'is_searchable': (therapist is not None and therapist.is_accepting_patients
+                          and therapist.verified),
+        'is_matchable': (profile is not None and profile.is_accepting_clients
+                         and user.is_active),
+    }
+
+
+def facet_values(therapist) -> List[Tuple[str, str]]:
+    """Distinct (kind, value) search facets of a professional therapist record."""
+    if therapist is None:
+        return []
+    sources = {
+        'specialization': therapist.specializations or [],
+        'therapy_type': therapist.therapy_types or [],
+        'language': therapist.languages_spoken or [],
+        'insurance': (therapist.insurance_accepted or []) if therapist.accepts_insurance else [],
+    }
+
+    facets = []
+    for kind, values in sources.items():
+        for value in dict.fromkeys(values):
+            if isinstance(value, str) and value and len(value) <= MAX_VALUE_LENGTH:
+                facets.append((kind, value))
+    return facets
+
+
+def rebuild_entries(user_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Rebuild the search entries of the given therapist users, or of all.
+
+    Users without either therapist record lose their entry. Returns the
+    number of entries written.
+    """
+    if user_ids is None:
+        return _rebuild(None)
+    user_ids = list(user_ids)
+    # Chunked to stay under the backend's query parameter limit
+    with transaction.atomic():
+        return sum(
+            _rebuild(user_ids[start:start + BATCH_SIZE])
+            for start in range(0, len(user_ids), BATCH_SIZE)
+        )
+
+
+def _rebuild(user_ids: Optional[List[int]]) -> int:
+    therapists = Therapist.objects.all()
+    profiles = TherapistProfile.objects.all()
+    existing_entries = TherapistSearchEntry.objects.all()
+    existing_facets = TherapistFacet.objects.all()
+    if user_ids is not None:
+        therapists = therapists.filter(user_id__in=user_ids)
+        profiles = profiles.filter(user_id__in=user_ids)
+        existing_entries = existing_entries.filter(user_id__in=user_ids)
+        existing_facets = existing_facets.filter(entry_id__in=user_ids)
+
+    sources: Dict[int, list] = {}
+    for therapist in therapists:
+        sources.setdefault(therapist.user_id, [None, None])[0] = therapist
+    for profile in profiles:
+        sources.setdefault(profile.user_id, [None, None])[1] = profile
+    users = get_user_model().objects.in_bulk(list(sources))
+
+    now = timezone.now()
+    entries = []
+    facets = set()
+    for user_id in sorted(sources):
+        if user_id not in users:
+            # Mid-way through deleting the user
+            continue
+        therapist, profile = sources[user_id]
+        entries.append(TherapistSearchEntry(
+            user_id=user_id, updated_at=now, **entry_fields(therapist, profile, users[user_id])
+        ))
+        facets.update((user_id, kind, value) for kind, value in facet_values(therapist))
+
+    # Write only what changed, so an unchanged facet keeps its index entries
+    entry_ids = set(existing_entries.values_list('pk', flat=True))
+    current_facets = {
+        (entry_id, kind, value): pk
+        for pk, entry_id, kind, value in existing_facets.values_list('pk', 'entry_id', 'kind', 'value')
+    }
+    removed_entries = entry_ids - {entry.pk for entry in entries}
+    removed_facets = [pk for key, pk in current_facets.items() if key not in facets]
+    with transaction.atomic():
+        _delete(TherapistSearchEntry, removed_entries)
+        _delete(TherapistFacet, removed_facets)
+        TherapistSearchEntry.objects.bulk_update(
+            [entry for entry in entries if entry.pk in entry_ids],
+            ENTRY_FIELDS, batch_size=BATCH_SIZE,
+        )
+        TherapistSearchEntry.objects.bulk_create(
+            [entry for entry in entries if entry.pk not in entry_ids], batch_size=BATCH_SIZE,
+        )
+        TherapistFacet.objects.bulk_create([
+            TherapistFacet(entry_id=entry_id, kind=kind, value=value)
+            for entry_id, kind, value in sorted(facets - current_facets.keys())
+        ], batch_size=BATCH_SIZE)
+        # Cached facet counts read the old rows until this commits
+        transaction.on_commit(search_cache.bump_index_version)
+    return len(entries)
+
+
+def _delete(model, pks) -> None:
+    pks = sorted(pks)
+    for start in range(0, len(pks), BATCH_SIZE):
+        model.objects.filter(pk__in=pks[start:start + BATCH_SIZE]).delete()
+
+
+def search_entries(specialty=None, therapy_type=None, max_rate=None,
+                   insurance=None, language=None):
+    """Searchable entries matching the therapist search filters, best rated first."""
+    entries = TherapistSearchEntry.objects.filter(is_searchable=True)
+    # Each facet filter reads only the (kind, value, entry) index; several
+    # are intersected in SQL before the entries are touched
+    selected = _selected_facets(specialty, therapy_type, insurance, language)
+    if selected:
+        entries = entries.filter(pk__in=_facet_entries(selected))
+    if insurance:
+        entries = entries.filter(accepts_insurance=True)
+    if max_rate:
+        entries = entries.filter(hourly_rate__lte=max_rate)
+    return entries.order_by(*SEARCH_ORDER)
+
+
+def facet_counts(specialty=None, therapy_type=None, max_rate=None,
+                 insurance=None, language=None) -> Dict[str, Dict[str, int]]:
+    """
+    Searchable therapists per value of each counted facet kind.
+
+    A value's count applies every filter except the one on its own kind, so
+    it is the number of results picking that value instead would give. All
+    kinds are counted in one grouped query.
+    """
+    selected = _selected_facets(specialty, therapy_type, insurance, language)
+    counted = Q()
+    for kind in COUNTED_FACETS:
+        condition = Q(kind=kind)
+        others = [(other, value) for other, value in selected if other != kind]
+        if others:
+            condition &= Q(entry_id__in=_facet_entries(others))
+        counted |= condition
+    rows = TherapistFacet.objects.filter(counted, entry__is_searchable=True)
+    if insurance:
+        rows = rows.filter(entry__accepts_insurance=True)
+    if max_rate:
+        rows = rows.filter(entry__hourly_rate__lte=max_rate)
+
+    counts = {kind: {} for kind in COUNTED_FACETS}
+    for kind, value, count in rows.values_list('kind', 'value').annotate(count=Count('pk')).order_by():
+        counts[kind][value] = count
+    return counts
+
+
+def cached_facet_counts(**filters) -> Dict[str, Dict[str, int]]:
+    """``facet_counts`` through the versioned search cache."""
+    key = search_cache.facet_counts_key(filters)
+    counts = search_cache.get_counts(key)
+    if counts is None:
+        counts = facet_counts(**filters)
+        search_cache.set_counts(key, counts)
+    return counts
+
+
+def cached_result_count(**filters) -> Tuple[int, bool]:
+    """
+    Number of search results and whether it is an estimate.
+
+    Exact counts are cached like facet counts. With
+    SEARCH_COUNT_ESTIMATE_ABOVE set, PostgreSQL's planner estimate is used
+    instead whenever it exceeds that many rows.
+    """
+    key = search_cache.result_count_key(filters)
+    cached = search_cache.get_counts(key)
+    if cached is None:
+        entries = search_entries(**filters)
+        threshold = getattr(settings, 'SEARCH_COUNT_ESTIMATE_ABOVE', None)
+        estimate = _planner_estimate(entries) if threshold is not None else None
+        if estimate is not None and estimate > threshold:
+            cached = (estimate, True)
+        else:
+            cached = (entries.count(), False)
+        search_cache.set_counts(key, cached)
+    return cached
+
+
+def _planner_estimate(queryset) -> Optional[int]:
+    """Row estimate of the query plan, where the backend reports one."""
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def _selected_facets(specialty, therapy_type, insurance, language) -> List[Tuple[str, str]]:
+    return [
+        (kind, value)
+        for kind, value in (('specialization', specialty), ('therapy_type', therapy_type),
+                            ('insurance', insurance), ('language', language))
+        if value
+    ]
+
+
+def _facet_entries(selected: List[Tuple[str, str]]):
+    """Subquery of the entry ids having every one of the selected facets."""
+    matches = [
+        TherapistFacet.objects.filter(kind=kind, value=value).values('entry_id')
+        for kind, value in selected
+    ]
+    return matches[0].intersection(*matches[1:]) if len(matches) > 1 else matches[0]
@@ -0,0 +1,107 @@
+"""
+Keyset pagination of therapist search results.
+
+Pages follow SEARCH_ORDER (``-rating, -total_reviews, hourly_rate, pk``).
+Instead of an OFFSET, each page token carries the sort key of the row it
+continues from, so every page is an index range scan of the same cost no
+matter how deep it is. Tokens are signed and opaque to clients; a tampered
+or outdated token just yields the first page.
+"""
+
+from decimal import Decimal
+from typing import List, Optional, Tuple
+
+from django.core import signing
+from django.db.models import Q
+
+from .search_index import SEARCH_ORDER
+
+PAGE_TOKEN_SALT = 'professional.search-page'
+DEFAULT_PAGE_SIZE = 12
+
+
+class KeysetPage:
+    """One page of search entries with tokens for its neighbours."""
+
+    __slots__ = ('entries', 'next_token', 'previous_token')
+
+    def __init__(self, entries: List, next_token: Optional[str], previous_token: Optional[str]):
+        self.entries = entries
+        self.next_token = next_token
+        self.previous_token = previous_token
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def get_page(entries, token: Optional[str] = None, size: int = DEFAULT_PAGE_SIZE) -> KeysetPage:
+    """The page of ``entries`` a token points at, or the first page."""
+    direction, key = _decode(token)
+    if direction == 'previous':
+        rows = list(entries.filter(_before(key)).order_by(*_reversed(SEARCH_ORDER))[:size + 1])
+        has_previous, has_next = len(rows) > size, True
+        rows = rows[:size][::-1]
+    else:
+        if key is not None:
+            entries = entries.filter(_after(key))
+        rows = list(entries.order_by(*SEARCH_ORDER)[:size + 1])
+        has_previous, has_next = key is not None, len(rows) > size
+        rows = rows[:size]
+    return KeysetPage(
+        rows,
+        _encode('next', rows[-1]) if rows and has_next else None,
+        _encode('previous', rows[0]) if rows and has_previous else None,
+    )
+
+
+def _sort_key(entry) -> Tuple:
+    return entry.rating, entry.total_reviews, entry.hourly_rate, entry.pk
+
+
+def _encode(direction: str, entry) -> str:
+    rating, total_reviews, hourly_rate, pk = _sort_key(entry)
+    return signing.dumps(
+        {'d': direction, 'k': [str(rating), total_reviews, str(hourly_rate), pk]},
+        salt=PAGE_TOKEN_SALT, compress=True,
+    )
+
+
+def _decode(token: Optional[str]) -> Tuple[Optional[str], Optional[Tuple]]:
+    if not token:
+        return None, None
+    try:
+        payload = signing.loads(token, salt=PAGE_TOKEN_SALT)
+        rating, total_reviews, hourly_rate, pk = payload['k']
+        key = (Decimal(rating), int(total_reviews), Decimal(hourly_rate), int(pk))
+    except (signing.BadSignature, KeyError, TypeError, ValueError, ArithmeticError):
+        return None, None
+    return payload.get('d'), key
+
+
+def _after(key: Tuple) -> Q:
+    """Rows sorting after ``key`` in SEARCH_ORDER."""
+    rating, total_reviews, hourly_rate, pk = key
+    return (
+        Q(rating__lt=rating)
+        | Q(rating=rating, total_reviews__lt=total_reviews)
+        | Q(rating=rating, total_reviews=total_reviews, hourly_rate__gt=hourly_rate)
+        | Q(rating=rating, total_reviews=total_reviews, hourly_rate=hourly_rate, pk__gt=pk)
+    )
+
+
+def _before(key: Tuple) -> Q:
+    """Rows sorting before ``key`` in SEARCH_ORDER."""
+    rating, total_reviews, hourly_rate, pk = key
+    return (
+        Q(rating__gt=rating)
+        | Q(rating=rating, total_reviews__gt=total_reviews)
+        | Q(rating=rating, total_reviews=total_reviews, hourly_rate__lt=hourly_rate)
+        | Q(rating=rating, total_reviews=total_reviews, hourly_rate=hourly_rate, pk__lt=pk)
+    )
+
+
+def _reversed(order: Tuple[str, ...]) -> Tuple[str, ...]:
+    return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in order)
@@ -0,0 +1,107 @@
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from apps.appointments.models import TherapistProfile
+from .models import (
+    Appointment, Therapist, TherapistAvailability, TherapistReview, TherapistSearchEntry,
+)
+from . import ratings, search_index, slot_calendar
+from .slots import BOOKED_STATUSES
+
+User = get_user_model()
+
+@receiver(post_save, sender=Therapist)
+@receiver(post_delete, sender=Therapist)
+@receiver(post_save, sender=TherapistProfile)
+@receiver(post_delete, sender=TherapistProfile)
+def sync_search_entry(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search_index.rebuild_entries([instance.user_id])
+
+@receiver(post_save, sender=User)
+def sync_search_entry_for_user(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Only the active flag is denormalized from the user, so logins and
+    # saves of non-therapists cost at most one lookup
+    if raw or (update_fields is not None and 'is_active' not in update_fields):
+        return
+    if TherapistSearchEntry.objects.filter(user_id=instance.pk).exists():
+        search_index.rebuild_entries([instance.pk])
+
+@receiver(pre_save, sender=Appointment)
+def remember_booked_interval(sender, instance, raw=False, **kwargs):
+    # The slot calendar needs to know which time an edit releases
+    instance._booked_before = None
+    if raw or instance._state.adding:
+        return
+    instance._booked_before = Appointment.objects.filter(
+        pk=instance.pk, status__in=BOOKED_STATUSES,
+    ).values_list('therapist_id', 'date_time', 'duration_minutes').first()
+
+@receiver(post_save, sender=Appointment)
+def update_slot_calendar(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    booked = instance.status in BOOKED_STATUSES
+    before = getattr(instance, '_booked_before', None)
+    if created or before is None:
+        if booked:
+            # Taking time only clears bits in place
+            end = instance.date_time + timedelta(minutes=instance.duration_minutes)
+            transaction.on_commit(lambda: slot_calendar.mark_busy(instance.therapist_id, instance.date_time, end))
+        return
+    therapist_id, date_time, duration = before
+    if booked and (therapist_id, date_time, duration) == (
+            instance.therapist_id, instance.date_time, instance.duration_minutes):
+        return
+    _refresh_after_commit(therapist_id, slot_calendar.booking_dates(date_time, duration))
+    if booked:
+        _refresh_after_commit(instance.therapist_id,
+                              slot_calendar.booking_dates(instance.date_time, instance.duration_minutes))
+
+@receiver(post_delete, sender=Appointment)
+def release_slot_calendar(sender, instance, **kwargs):
+    if instance.status in BOOKED_STATUSES:
+        _refresh_after_commit(instance.therapist_id,
+                              slot_calendar.booking_dates(instance.date_time, instance.duration_minutes))
+
+@receiver(post_save, sender=TherapistAvailability)
+@receiver(post_delete, sender=TherapistAvailability)
+def refresh_slot_calendar(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _refresh_after_commit(instance.therapist_id)
+
+@receiver(pre_save, sender=TherapistReview)
+def remember_review_values(sender, instance, raw=False, **kwargs):
+    # An edited review moves the aggregates by the difference
+    instance._counted_before = None
+    if raw or instance._state.adding:
+        return
+    previous = TherapistReview.objects.filter(pk=instance.pk).first()
+    if previous is not None:
+        instance._counted_before = (previous.therapist_id, ratings.review_values(previous))
+
+@receiver(post_save, sender=TherapistReview)
+def count_review(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    values = ratings.review_values(instance)
+    before = getattr(instance, '_counted_before', None)
+    if created or before is None:
+        ratings.adjust(instance.therapist_id, values)
+        return
+    therapist_id, previous = before
+    if therapist_id == instance.therapist_id:
+        if previous != values:
+            ratings.adjust(therapist_id, {field: values[field] - previous[field] for field in values})
+        return
+    ratings.adjust(therapist_id, {field: -value for field, value in previous.items()})
+    ratings.adjust(instance.therapist_id, values)
+
+@receiver(post_delete, sender=TherapistReview)
+def uncount_review(sender, instance, **kwargs):
+    ratings.adjust(instance.therapist_id, {field: -value for field, value in ratings.review_values(instance).items()})
+
+def _refresh_after_commit(therapist_id, dates=None):
+    transaction.on_commit(lambda: slot_calendar.refresh_days(therapist_id, dates))
@@ -0,0 +1,167 @@
+"""
+Materialized free-slot calendar of therapists.
+
+Each ``TherapistCalendarDay`` row stores the ``available`` and ``free``
+bitmaps ``slots.day_bitmaps`` computes for one date. Reading a therapist's
+slots, checking a booking and finding the next free slot are then bit tests
+on a handful of rows instead of recomputing availability minus bookings
+per request; the slots offered follow the same rules (see slots.py).
+
+Rows are materialized lazily the first time a date is read, and computed
+once more after they are committed, in case a booking slipped in between.
+After that they are kept current by the signals in signals.py:
+
+* a new booking clears its quarters in place (``mark_busy``);
+* cancelled, moved or deleted bookings and availability edits recompute the
+  affected materialized days (``refresh_days``), since freeing time needs to
+  know about overlapping bookings.
+
+``manage.py rebuild_slot_calendar`` prunes past days and recomputes the
+rest.
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import TherapistCalendarDay
+from .slots import (
+    QUARTERS_PER_DAY, SESSION_MINUTES, SLOT_STEP_MINUTES, day_bitmaps, fits,
+    local_datetime, quarter_masks, slot_quarters,
+)
+
+BITMAP_BYTES = QUARTERS_PER_DAY // 8
+# Days ahead ``next_available`` looks through
+SEARCH_DAYS = 28
+
+
+def _to_int(bitmap) -> int:
+    return int.from_bytes(bytes(bitmap), 'little')
+
+
+def _to_bytes(bits: int) -> bytes:
+    return bits.to_bytes(BITMAP_BYTES, 'little')
+
+
+def get_days(therapist, start_date: date, days: int) -> Dict[date, Tuple[int, int]]:
+    """(available, free) bitmaps of ``days`` dates, materializing missing ones."""
+    therapist_id = getattr(therapist, 'pk', therapist)
+    dates = [start_date + timedelta(days=offset) for offset in range(days)]
+    bitmaps = {
+        row_date: (_to_int(available), _to_int(free))
+        for row_date, available, free in TherapistCalendarDay.objects.filter(
+            therapist_id=therapist_id, date__gte=dates[0], date__lte=dates[-1],
+        ).values_list('date', 'available', 'free')
+    }
+    missing = [day for day in dates if day not in bitmaps]
+    if missing:
+        computed = day_bitmaps(therapist_id, missing)
+        # Rows a concurrent reader inserted first are kept
+        TherapistCalendarDay.objects.bulk_create([
+            TherapistCalendarDay(therapist_id=therapist_id, date=day,
+                                 available=_to_bytes(available), free=_to_bytes(free))
+            for day, (available, free) in computed.items()
+        ], ignore_conflicts=True)
+        transaction.on_commit(lambda: _verify(therapist_id, computed))
+        bitmaps.update(computed)
+    return bitmaps
+
+
+def _verify(therapist_id: int, computed: Dict[date, Tuple[int, int]]) -> None:
+    """
+    Recompute newly materialized days and repair them if they went stale.
+
+    A booking or availability change committed between computing the rows
+    and inserting them was not in the bits, and its ``mark_busy`` or
+    ``refresh_days`` ran before the rows existed. Either way it committed
+    before this read, which runs once the rows are committed.
+    """
+    current = day_bitmaps(therapist_id, list(computed))
+    stale = [day for day, bits in current.items() if bits != computed[day]]
+    if stale:
+        refresh_days(therapist_id, stale)
+
+
+def _lock(days, now: datetime) -> None:
+    """
+    Lock calendar rows by writing them before reading them.
+
+    Unlike ``select_for_update`` this also works on SQLite, where a
+    transaction that reads first cannot wait for a concurrent writer.
+    """
+    days.update(updated_at=now)
+
+
+def mark_busy(therapist_id: int, start: datetime, end: datetime) -> None:
+    """Clear the quarters of a new booking in the materialized days."""
+    masks = quarter_masks(start, end, inclusive=True)
+    days = TherapistCalendarDay.objects.filter(therapist_id=therapist_id, date__in=list(masks))
+    now = timezone.now()
+    with transaction.atomic():
+        _lock(days, now)
+        rows = list(days)
+        for row in rows:
+            row.free, row.updated_at = _to_bytes(_to_int(row.free) & ~masks[row.date]), now
+        TherapistCalendarDay.objects.bulk_update(rows, ['free', 'updated_at'])
+
+
+def refresh_days(therapist_id: int, dates: Optional[Iterable[date]] = None) -> int:
+    """Recompute materialized days of a therapist (all of them by default)."""
+    days = TherapistCalendarDay.objects.filter(therapist_id=therapist_id)
+    if dates is not None:
+        days = days.filter(date__in=list(dates))
+    now = timezone.now()
+    with transaction.atomic():
+        _lock(days, now)
+        rows = list(days)
+        computed = day_bitmaps(therapist_id, [row.date for row in rows])
+        for row in rows:
+            available, free = computed[row.date]
+            row.available, row.free, row.updated_at = _to_bytes(available), _to_bytes(free), now
+        TherapistCalendarDay.objects.bulk_update(rows, ['available', 'free', 'updated_at'])
+    return len(rows)
+
+
+def booking_dates(start: datetime, duration_minutes: int) -> List[date]:
+    """Local dates a booking touches."""
+    return list(quarter_masks(start, start + timedelta(minutes=duration_minutes), inclusive=True))
+
+
+def free_slots(therapist, start_date: date, days: int = 7,
+               duration: int = SESSION_MINUTES, step: int = SLOT_STEP_MINUTES,
+               not_before: Optional[datetime] = None) -> List[Dict]:
+    """
+    Bookable slots of ``duration`` minutes from ``start_date`` for ``days``.
+
+    Returns ``{'date', 'time', 'datetime'}`` dicts in time order; slots
+    starting before ``not_before`` (default: now) are left out. Candidates
+    step through each run of available quarters from its start, so slots
+    stay on the therapist's grid (9:00, 10:00, ...) even when a booking
+    ends off the hour.
+    """
+    not_before = not_before or timezone.now()
+    bitmaps = get_days(therapist, start_date, days)
+    slots = []
+    for day in sorted(bitmaps):
+        for quarter in slot_quarters(*bitmaps[day], duration=duration, step=step):
+            moment = local_datetime(day, quarter)
+            if moment >= not_before:
+                slots.append({'date': day, 'time': moment.time(), 'datetime': moment})
+    return slots
+
+
+def is_free(therapist, start: datetime, duration: int = SESSION_MINUTES) -> bool:
+    """Whether the whole of ``start`` + ``duration`` is free in the calendar."""
+    dates = booking_dates(start, duration)
+    return fits(get_days(therapist, dates[0], (dates[-1] - dates[0]).days + 1), start, duration)
+
+
+def next_available(therapist, after: Optional[datetime] = None,
+                   duration: int = SESSION_MINUTES, days: int = SEARCH_DAYS) -> Optional[Dict]:
+    """The therapist's first free slot after ``after`` (default: now)."""
+    after = after or timezone.now()
+    slots = free_slots(therapist, timezone.localtime(after).date(), days,
+                       duration=duration, not_before=after)
+    return slots[0] if slots else None
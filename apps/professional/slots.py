@@ -0,0 +1,159 @@
+"""
+The slot rules of therapists, shared by the slot calendar and booking.
+
+A therapist's weekly ``TherapistAvailability`` windows (or the default
+hours while none are set up) and their active bookings, each covering
+``duration_minutes``, read with one range query, are laid out as bitmaps
+of each date's 96 quarter hours: ``available`` (inside an availability
+window) and ``free`` (available and not busy). A quarter counts as
+available only when all of it is, and as busy when any of it is.
+
+A slot is offered wherever a whole session fits into the free quarters.
+Candidate starts step through each run of available quarters from its
+start, so slots stay on the therapist's grid (9:00, 10:00, ...) even when
+a booking ends off the hour.
+
+``slot_calendar`` materializes the bitmaps per day and offers slots from
+them; ``booking`` checks recurring series against bitmaps computed here.
+Times are wall-clock local time.
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from django.utils import timezone
+
+from .models import Appointment, TherapistAvailability
+
+BOOKED_STATUSES = ('scheduled', 'confirmed')
+SESSION_MINUTES = 50
+# Slots start every this many minutes from the start of an availability window
+SLOT_STEP_MINUTES = 60
+# Appointments starting this long before the range can still run into it
+MAX_SESSION_MINUTES = 24 * 60
+QUARTER_MINUTES = 15
+QUARTERS_PER_DAY = 24 * 60 // QUARTER_MINUTES
+
+# Weekly hours of therapists who have not set up any availability yet
+DEFAULT_AVAILABILITY = [
+    (weekday, start, end)
+    for weekday in range(5)
+    for start, end in ((time(9), time(11)), (time(14), time(17)))
+]
+
+
+def weekly_availability(therapist) -> List[Tuple[int, time, time]]:
+    """(weekday, start, end) windows the therapist takes appointments in."""
+    rows = list(
+        TherapistAvailability.objects.filter(therapist=therapist)
+        .values_list('weekday', 'start_time', 'end_time', 'is_available')
+    )
+    if not rows:
+        return DEFAULT_AVAILABILITY
+    return [(weekday, start, end) for weekday, start, end, available in rows if available]
+
+
+def booked_intervals(therapist, range_start: datetime, range_end: datetime) -> List[Tuple[datetime, datetime]]:
+    """Start and end of every active booking overlapping the range, in one query."""
+    bookings = Appointment.objects.filter(
+        therapist=therapist,
+        status__in=BOOKED_STATUSES,
+        date_time__gte=range_start - timedelta(minutes=MAX_SESSION_MINUTES),
+        date_time__lt=range_end,
+    ).values_list('date_time', 'duration_minutes')
+    return [
+        (start, start + timedelta(minutes=duration))
+        for start, duration in bookings
+        if start + timedelta(minutes=duration) > range_start
+    ]
+
+
+def quarter_mask(first: int, last: int) -> int:
+    """Bits of quarters ``first`` up to, not including, ``last``."""
+    return ((1 << max(last - first, 0)) - 1) << first
+
+
+def quarter_masks(start: datetime, end: datetime, inclusive: bool) -> Dict[date, int]:
+    """
+    Quarters of ``start``-``end`` per local date.
+
+    ``inclusive`` takes every quarter the interval touches (busy time);
+    otherwise only quarters it covers completely (available time).
+    """
+    start, end = timezone.localtime(start), timezone.localtime(end)
+    masks = {}
+    day = start.date()
+    while day <= end.date():
+        first_minute = start.hour * 60 + start.minute if day == start.date() else 0
+        last_minute = end.hour * 60 + end.minute if day == end.date() else 24 * 60
+        if inclusive:
+            first = first_minute // QUARTER_MINUTES
+            last = -(-last_minute // QUARTER_MINUTES)
+        else:
+            first = -(-first_minute // QUARTER_MINUTES)
+            last = last_minute // QUARTER_MINUTES
+        if last > first:
+            masks[day] = masks.get(day, 0) | quarter_mask(first, last)
+        day += timedelta(days=1)
+    return masks
+
+
+def local_datetime(day: date, quarter: int) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min) + timedelta(minutes=quarter * QUARTER_MINUTES))
+
+
+def day_bitmaps(therapist, dates: Iterable[date],
+                busy: Iterable[Tuple[datetime, datetime]] = ()) -> Dict[date, Tuple[int, int]]:
+    """
+    (available, free) bitmaps of the given dates.
+
+    Bookings over the dates come from one range query; ``busy`` adds other
+    intervals that are not free, such as holds.
+    """
+    dates = sorted(set(dates))
+    if not dates:
+        return {}
+    availability = weekly_availability(therapist)
+    available = {day: 0 for day in dates}
+    for day in dates:
+        for weekday, start, end in availability:
+            if weekday == day.weekday():
+                first = -(-(start.hour * 60 + start.minute) // QUARTER_MINUTES)
+                # An end of midnight closes the day
+                last = ((end.hour * 60 + end.minute) or 24 * 60) // QUARTER_MINUTES
+                available[day] |= quarter_mask(first, last)
+
+    taken = {day: 0 for day in dates}
+    range_start = timezone.make_aware(datetime.combine(dates[0], time.min))
+    range_end = timezone.make_aware(datetime.combine(dates[-1] + timedelta(days=1), time.min))
+    for start, end in booked_intervals(therapist, range_start, range_end) + list(busy):
+        for day, mask in quarter_masks(start, end, inclusive=True).items():
+            if day in taken:
+                taken[day] |= mask
+    return {day: (available[day], available[day] & ~taken[day]) for day in dates}
+
+
+def slot_quarters(available: int, free: int, duration: int = SESSION_MINUTES,
+                  step: int = SLOT_STEP_MINUTES) -> Iterator[int]:
+    """First quarters of the slots of one day's bitmaps, ascending."""
+    length = -(-duration // QUARTER_MINUTES)
+    stride = max(step // QUARTER_MINUTES, 1)
+    quarter = 0
+    while quarter < QUARTERS_PER_DAY:
+        if not (available >> quarter) & 1:
+            quarter += 1
+            continue
+        run_end = quarter
+        while run_end < QUARTERS_PER_DAY and (available >> run_end) & 1:
+            run_end += 1
+        for slot in range(quarter, run_end - length + 1, stride):
+            wanted = quarter_mask(slot, slot + length)
+            if free & wanted == wanted:
+                yield slot
+        quarter = run_end
+
+
+def fits(bitmaps: Dict[date, Tuple[int, int]], start: datetime, duration: int = SESSION_MINUTES) -> bool:
+    """Whether the whole of ``start`` + ``duration`` is free in the bitmaps."""
+    masks = quarter_masks(start, start + timedelta(minutes=duration), inclusive=True)
+    return all(day in bitmaps and bitmaps[day][1] & mask == mask for day, mask in masks.items())
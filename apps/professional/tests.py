@@ -0,0 +1,343 @@
+import threading
+import time as time_module
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, close_old_connections, connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from . import booking, ratings, slot_calendar
+from .search_index import search_entries
+from .search_pagination import get_page
+from .models import (
+    Appointment, SlotHold, SlotHoldCell, Therapist, TherapistCalendarDay, TherapistReview,
+    TherapistSearchEntry,
+)
+
+User = get_user_model()
+
+
+def create_therapist(username='therapist', **fields):
+    user = User.objects.create_user(username=username, email=f'{username}@example.com', password='x')
+    return Therapist.objects.create(**{
+        'user': user, 'license_number': f'LIC-{username}', 'bio': 'Bio', 'years_experience': 5,
+        'education': 'Education', 'hourly_rate': Decimal('100.00'), **fields,
+    })
+
+
+def next_monday_at(hour: int, minute: int = 0) -> datetime:
+    """A Monday at least a week ahead, inside the default availability."""
+    today = timezone.localdate()
+    monday = today + timedelta(days=14 - today.weekday())
+    return timezone.make_aware(datetime.combine(monday, time(hour, minute)))
+
+
+class HoldCellsTests(TestCase):
+    def test_cells_cover_partly_touched_quarters(self):
+        start = next_monday_at(9, 10)
+        cells = booking.hold_cells(start, 50)
+        self.assertEqual(cells[0], next_monday_at(9))
+        self.assertEqual(cells[-1], next_monday_at(9, 45))
+        self.assertEqual(len(cells), 4)
+
+    def test_aligned_session_ends_on_quarter(self):
+        self.assertEqual(len(booking.hold_cells(next_monday_at(9), 45)), 3)
+
+
+class SearchPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Few distinct sort values, so pages split inside runs of ties
+        for i in range(23):
+            create_therapist(
+                f'therapist{i}', verified=True, rating=Decimal(('4.50', '4.00')[i % 2]),
+                total_reviews=i % 3, hourly_rate=Decimal(120 if i % 5 == 0 else 80),
+            )
+
+    def walk(self, token=None, direction='next_token', size=5):
+        pages = []
+        while True:
+            page = get_page(search_entries(), token, size)
+            pages.append([entry.pk for entry in page])
+            token = getattr(page, direction)
+            if token is None:
+                return pages
+
+    def test_pages_cover_the_full_order_once(self):
+        pages = self.walk()
+        self.assertEqual([len(page) for page in pages], [5, 5, 5, 5, 3])
+        self.assertEqual(sum(pages, []), list(search_entries().values_list('pk', flat=True)))
+
+    def test_previous_tokens_walk_back_through_the_same_pages(self):
+        forward = self.walk()
+        last = get_page(search_entries(), None, 5)
+        while last.next_token:
+            last = get_page(search_entries(), last.next_token, 5)
+        backward = self.walk(last.previous_token, 'previous_token')
+        self.assertEqual(backward[::-1], forward[:-1])
+
+    def test_tampered_token_gives_the_first_page(self):
+        first = get_page(search_entries(), None, 5)
+        tampered = get_page(search_entries(), first.next_token[:-2] + 'xx', 5)
+        self.assertEqual(list(tampered), list(first))
+        self.assertIsNone(tampered.previous_token)
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        self.therapist = create_therapist(verified=True)
+        self.other = create_therapist('other', verified=True)
+
+    def review(self, username, rating, therapist=None, would_recommend=True):
+        user = User.objects.create_user(username=username, email=f'{username}@example.com', password='x')
+        therapist = therapist or self.therapist
+        appointment = Appointment.objects.create(
+            user=user, therapist=therapist, date_time=timezone.now() - timedelta(days=7),
+            cost=Decimal('100.00'), status='completed',
+        )
+        return TherapistReview.objects.create(
+            user=user, therapist=therapist, appointment=appointment, rating=rating,
+            communication_rating=rating, effectiveness_rating=rating, would_recommend=would_recommend,
+        )
+
+    def assertAggregates(self, therapist, rating, total_reviews, rating_sum):
+        therapist.refresh_from_db()
+        entry = TherapistSearchEntry.objects.get(therapist=therapist)
+        self.assertEqual(
+            (therapist.rating, therapist.total_reviews, therapist.rating_sum),
+            (Decimal(rating), total_reviews, rating_sum),
+        )
+        self.assertEqual((entry.rating, entry.total_reviews), (Decimal(rating), total_reviews))
+
+    def test_new_reviews_add_to_the_sums(self):
+        self.review('alice', 5)
+        self.review('bob', 4, would_recommend=False)
+        self.assertAggregates(self.therapist, '4.50', 2, 9)
+        self.assertEqual(self.therapist.recommend_count, 1)
+
+    def test_edit_applies_the_difference(self):
+        self.review('alice', 5)
+        review = self.review('bob', 4)
+        review.rating = 2
+        review.save()
+        self.assertAggregates(self.therapist, '3.50', 2, 7)
+
+    def test_moving_a_review_moves_its_values(self):
+        review = self.review('alice', 5)
+        self.review('bob', 2)
+        review.therapist = self.other
+        review.save()
+        self.assertAggregates(self.therapist, '2.00', 1, 2)
+        self.assertAggregates(self.other, '5.00', 1, 5)
+
+    def test_delete_takes_the_review_out(self):
+        review = self.review('alice', 5)
+        review.delete()
+        self.assertAggregates(self.therapist, '0.00', 0, 0)
+
+    def test_reconcile_repairs_drift(self):
+        self.review('alice', 5)
+        self.review('bob', 4)
+        self.assertEqual(ratings.reconcile_ratings(), [])
+        Therapist.objects.filter(pk=self.therapist.pk).update(rating_sum=1, rating=Decimal('0.50'))
+        self.assertEqual(ratings.reconcile_ratings(repair=False), [self.therapist.pk])
+        self.assertEqual(ratings.reconcile_ratings(), [self.therapist.pk])
+        self.assertAggregates(self.therapist, '4.50', 2, 9)
+
+
+class SlotCalendarTests(TestCase):
+    def setUp(self):
+        self.therapist = create_therapist()
+        self.client_user = User.objects.create_user(username='client', email='client@example.com', password='x')
+        self.monday = next_monday_at(0).date()
+
+    def book(self, start, minutes=50):
+        return Appointment.objects.create(
+            user=self.client_user, therapist=self.therapist, date_time=start,
+            duration_minutes=minutes, cost=Decimal('100.00'),
+        )
+
+    def slot_times(self):
+        return [slot['time'] for slot in slot_calendar.free_slots(self.therapist, self.monday, days=1)]
+
+    def test_default_hours_offer_hourly_slots(self):
+        self.assertEqual(self.slot_times(), [time(9), time(10), time(14), time(15), time(16)])
+
+    def test_booking_clears_the_quarters_it_touches(self):
+        self.slot_times()
+        # Runs into the 10:00 quarter, so 10:00 goes too
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(next_monday_at(9, 20))
+        self.assertEqual(self.slot_times(), [time(14), time(15), time(16)])
+        self.assertFalse(slot_calendar.is_free(self.therapist, next_monday_at(10)))
+
+    def test_cancelling_frees_the_slot_again(self):
+        appointment = self.book(next_monday_at(14))
+        self.assertNotIn(time(14), self.slot_times())
+        appointment.status = 'cancelled'
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.save()
+        self.assertIn(time(14), self.slot_times())
+
+    def test_booking_committed_while_materializing_is_caught(self):
+        computed = slot_calendar.day_bitmaps
+
+        def compute_then_book(therapist, dates, busy=()):
+            bitmaps = computed(therapist, dates, busy)
+            if not Appointment.objects.exists():
+                # As if committed now: its mark_busy would find no row to clear
+                # yet, so no signal is sent
+                Appointment.objects.bulk_create([Appointment(
+                    user=self.client_user, therapist=self.therapist, date_time=next_monday_at(9),
+                    duration_minutes=50, cost=Decimal('100.00'),
+                )])
+            return bitmaps
+
+        with mock.patch.object(slot_calendar, 'day_bitmaps', compute_then_book):
+            with self.captureOnCommitCallbacks(execute=True):
+                slot_calendar.get_days(self.therapist, self.monday, 1)
+        row = TherapistCalendarDay.objects.get(therapist=self.therapist, date=self.monday)
+        self.assertEqual(
+            (slot_calendar._to_int(row.available), slot_calendar._to_int(row.free)),
+            computed(self.therapist, [self.monday])[self.monday],
+        )
+        self.assertNotIn(time(9), self.slot_times())
+
+
+class PlaceHoldTests(TestCase):
+    def setUp(self):
+        self.therapist = create_therapist()
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='x')
+
+    def test_overlapping_off_grid_hold_is_refused(self):
+        booking.place_hold(self.therapist, self.alice, next_monday_at(9))
+        with self.assertRaises(booking.SlotUnavailable):
+            booking.place_hold(self.therapist, self.bob, next_monday_at(9, 40))
+
+    def test_adjacent_holds_coexist(self):
+        booking.place_hold(self.therapist, self.alice, next_monday_at(9))
+        booking.place_hold(self.therapist, self.bob, next_monday_at(10))
+        self.assertEqual(SlotHold.objects.count(), 2)
+
+    def test_renewal_keeps_token(self):
+        first = booking.place_hold(self.therapist, self.alice, next_monday_at(9))
+        renewed = booking.place_hold(self.therapist, self.alice, next_monday_at(9))
+        self.assertEqual(renewed.token, first.token)
+        self.assertEqual(SlotHoldCell.objects.count(), 4)
+
+    def test_expired_overlapping_hold_gives_way(self):
+        hold = booking.place_hold(self.therapist, self.alice, next_monday_at(9))
+        SlotHold.objects.filter(pk=hold.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        taken = booking.place_hold(self.therapist, self.bob, next_monday_at(9, 30))
+        self.assertEqual(taken.user, self.bob)
+        with self.assertRaises(booking.SlotUnavailable):
+            booking.confirm_hold(hold.token, self.alice)
+
+    def test_confirm_releases_cells(self):
+        hold = booking.place_hold(self.therapist, self.alice, next_monday_at(9))
+        booking.confirm_hold(hold.token, self.alice)
+        self.assertFalse(SlotHoldCell.objects.exists())
+        with self.assertRaises(booking.SlotUnavailable):
+            booking.confirm_hold(hold.token, self.alice)
+
+
+    def test_hold_placed_before_calendar_catches_up_cannot_confirm(self):
+        # The calendar only marks the booking busy on commit, which this
+        # test case never reaches, so the next hold still goes through
+        booking.book(self.therapist, self.alice, next_monday_at(9))
+        hold = booking.place_hold(self.therapist, self.bob, next_monday_at(9, 30))
+        with self.assertRaises(booking.SlotUnavailable):
+            booking.confirm_hold(hold.token, self.bob)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+
+class BookSeriesTests(TestCase):
+    def setUp(self):
+        self.therapist = create_therapist()
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='x')
+
+    def test_series_leaves_no_holds_behind(self):
+        booking.place_hold(self.therapist, self.alice, next_monday_at(9, 30))
+        booking.book_series(self.therapist, self.alice, next_monday_at(9), 3)
+        self.assertEqual(Appointment.objects.count(), 3)
+        self.assertFalse(SlotHold.objects.exists())
+        self.assertFalse(SlotHoldCell.objects.exists())
+
+    def test_hold_taken_after_the_check_stops_the_series(self):
+        check = booking.series_conflicts
+
+        def conflicts_then_hold(*args, **kwargs):
+            conflicts = check(*args, **kwargs)
+            if not SlotHold.objects.exists():
+                booking.place_hold(self.therapist, self.bob, next_monday_at(9, 30) + timedelta(weeks=1))
+            return conflicts
+
+        with mock.patch.object(booking, 'series_conflicts', conflicts_then_hold):
+            with self.assertRaises(booking.SeriesConflict):
+                booking.book_series(self.therapist, self.alice, next_monday_at(9), 3)
+        self.assertFalse(Appointment.objects.exists())
+
+
+class ConcurrentHoldTests(TransactionTestCase):
+    """Threads racing for overlapping holds; exactly one may win each race."""
+
+    THREADS = 8
+
+    def setUp(self):
+        self.therapist = create_therapist()
+        self.users = [
+            User.objects.create_user(username=f'client{i}', email=f'client{i}@example.com', password='x')
+            for i in range(self.THREADS)
+        ]
+
+    def race(self, starts):
+        barrier = threading.Barrier(len(starts))
+        outcomes = []
+
+        def attempt(user, start):
+            try:
+                barrier.wait()
+                outcomes.append(self.place(user, start))
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=attempt, args=(user, start))
+            for user, start in zip(self.users, starts)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def place(self, user, start):
+        # SQLite's shared-cache test database reports a busy table at once
+        # instead of waiting for it, so a locked attempt goes again
+        for _ in range(200):
+            close_old_connections()
+            try:
+                booking.place_hold(self.therapist, user, start)
+                return True
+            except booking.SlotUnavailable:
+                return False
+            except OperationalError:
+                time_module.sleep(0.01)
+        raise AssertionError('The database stayed locked')
+
+    def test_aligned_starts(self):
+        outcomes = self.race([next_monday_at(9)] * self.THREADS)
+        self.assertEqual(outcomes.count(True), 1)
+        self.assertEqual(SlotHold.objects.count(), 1)
+
+    def test_off_grid_overlapping_starts(self):
+        # Every start overlaps every other one by at least a few minutes
+        starts = [next_monday_at(9, minute) for minute in (0, 5, 10, 20, 25, 30, 35, 40)]
+        outcomes = self.race(starts[:self.THREADS])
+        self.assertEqual(outcomes.count(True), 1)
+        self.assertEqual(SlotHold.objects.count(), 1)
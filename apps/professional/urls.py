@@ -10,13 +10,17 @@ urlpatterns = [
     # Therapist search and booking
     path('therapists/', views.therapist_search, name='therapist-search'),
     path('therapists/<int:therapist_id>/', views.therapist_detail, name='therapist-detail'),
+    path('therapists/<int:therapist_id>/hold/', views.hold_slot, name='hold-slot'),
     path('therapists/<int:therapist_id>/book/', views.book_appointment, name='book-appointment'),
+    path('therapists/<int:therapist_id>/book-series/', views.book_series, name='book-series'),
     
     # Appointments
     path('appointments/', views.appointment_list, name='appointment-list'),
     path('appointments/<uuid:appointment_id>/', views.appointment_detail, name='appointment-detail'),
     path('appointments/<uuid:appointment_id>/cancel/', views.cancel_appointment, name='cancel-appointment'),
     path('appointments/<uuid:appointment_id>/review/', views.leave_review, name='leave-review'),
+    path('appointments/calendar/<str:token>.ics', views.calendar_feed_view, name='calendar-feed'),
+    path('appointments/calendar/regenerate/', views.regenerate_calendar_feed, name='regenerate-calendar-feed'),
     
     # Therapy goals
     path('goals/', views.therapy_goals, name='therapy-goals'),
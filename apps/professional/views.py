@@ -2,9 +2,9 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Q, Avg, Count
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
-from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.http import condition, require_POST, require_safe
 from django.utils import timezone
 from datetime import datetime, timedelta
 import json
@@ -14,51 +14,48 @@ from .models import (
     TherapistAvailability, InsuranceProvider
 )
 from .forms import AppointmentForm, TherapistSearchForm, TherapyGoalForm, ReviewForm
+from .search_index import cached_facet_counts, cached_result_count, search_entries
+from .search_pagination import get_page
+from . import booking, calendar_feed, slot_calendar
 
 @login_required
 def therapist_search(request):
     """Search and filter therapists"""
     form = TherapistSearchForm(request.GET or None)
-    therapists = Therapist.objects.filter(is_accepting_patients=True, verified=True)
+    filters = {}
     
     # Apply filters
     if form.is_valid():
-        specialty = form.cleaned_data.get('specialty')
-        therapy_type = form.cleaned_data.get('therapy_type')
-        max_rate = form.cleaned_data.get('max_rate')
-        insurance = form.cleaned_data.get('insurance')
-        language = form.cleaned_data.get('language')
-        
-        if specialty:
-            therapists = therapists.filter(specializations__contains=[specialty])
-        
-        if therapy_type:
-            therapists = therapists.filter(therapy_types__contains=[therapy_type])
-        
-        if max_rate:
-            therapists = therapists.filter(hourly_rate__lte=max_rate)
-        
-        if insurance:
-            therapists = therapists.filter(accepts_insurance=True, insurance_accepted__contains=[insurance])
-        
-        if language:
-            therapists = therapists.filter(languages_spoken__contains=[language])
-    
-    # Order by existing rating fields (simplified for now)
-    therapists = therapists.order_by('-rating', '-total_reviews', 'hourly_rate')
+        filters = {
+            field: form.cleaned_data.get(field)
+            for field in ('specialty', 'therapy_type', 'max_rate', 'insurance', 'language')
+        }
+    form.show_counts(cached_facet_counts(**filters))
+    entries = search_entries(**filters).select_related('therapist__user')
     
-    # Pagination
-    paginator = Paginator(therapists, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination; the count is computed once and cached per filter set
+    page = get_page(entries, request.GET.get('page'))
+    total_therapists, total_is_estimate = cached_result_count(**filters)
     
     context = {
         'form': form,
-        'therapists': page_obj,
-        'total_therapists': therapists.count(),
+        # The template renders the professional records behind the entries
+        'therapists': [entry.therapist for entry in page],
+        'total_therapists': total_therapists,
+        'total_is_estimate': total_is_estimate,
+        'previous_query': _page_query(request, page.previous_token),
+        'next_query': _page_query(request, page.next_token),
     }
     return render(request, 'professional/therapist_search.html', context)
 
+def _page_query(request, token):
+    """Query string of the current search moved to another page token"""
+    if not token:
+        return None
+    query = request.GET.copy()
+    query['page'] = token
+    return query.urlencode()
+
 @login_required
 def therapist_detail(request, therapist_id):
     """Detailed therapist profile with booking option"""
@@ -67,37 +64,16 @@ def therapist_detail(request, therapist_id):
     # Get reviews - for now, create empty list since models might not be migrated
     reviews = []  # Simplified to avoid model relation issues
     
-    # For now, create some dummy available slots
-    # In a real app, this would query the TherapistAvailability model
-    available_slots = []
-    today = timezone.now().date()
-    
-    # Generate some sample available slots for the next 7 days
-    for day in range(7):
-        check_date = today + timedelta(days=day)
-        # Skip weekends for simplicity
-        if check_date.weekday() < 5:  # Monday = 0, Friday = 4
-            for hour in [9, 10, 14, 15, 16]:  # 9am, 10am, 2pm, 3pm, 4pm
-                slot_datetime = timezone.make_aware(
-                    datetime.combine(check_date, timezone.datetime.min.time().replace(hour=hour))
-                )
-                
-                # Check if slot is not booked
-                try:
-                    is_booked = Appointment.objects.filter(
-                        therapist=therapist,
-                        date_time=slot_datetime,
-                        status__in=['scheduled', 'confirmed']
-                    ).exists()
-                except:
-                    is_booked = False
-                
-                if not is_booked:
-                    available_slots.append({
-                        'date': check_date,
-                        'time': slot_datetime.time(),
-                        'datetime': slot_datetime,
-                    })
+    # Free slots of the coming week, read from the materialized slot calendar
+    available_slots = slot_calendar.free_slots(therapist, timezone.localdate(), days=7)
+    # Slots someone else is confirming right now are not offered
+    held = {
+        hold.date_time for hold in booking.active_holds(
+            therapist, timezone.now(), timezone.now() + timedelta(days=7)
+        ).exclude(user=request.user)
+    }
+    available_slots = [slot for slot in available_slots if slot['datetime'] not in held]
+    next_slot = available_slots[0] if available_slots else slot_calendar.next_available(therapist)
     
     try:
         user_has_appointment = Appointment.objects.filter(
@@ -112,6 +88,7 @@ def therapist_detail(request, therapist_id):
         'therapist': therapist,
         'reviews': reviews,
         'available_slots': available_slots[:20],  # Show first 20 slots
+        'next_available': next_slot,
         'user_has_appointment': user_has_appointment,
     }
     return render(request, 'professional/therapist_detail.html', context)
@@ -124,36 +101,19 @@ def book_appointment(request, therapist_id):
     
     try:
         data = json.loads(request.body)
-        appointment_datetime = timezone.datetime.fromisoformat(data['datetime'])
-        session_type = data.get('session_type', 'therapy')
         notes = data.get('notes', '')
         
-        # Check if slot is still available
-        if Appointment.objects.filter(
-            therapist=therapist,
-            date_time=appointment_datetime,
-            status__in=['scheduled', 'confirmed']
-        ).exists():
-            return JsonResponse({'error': 'Time slot no longer available'}, status=400)
-        
-        # Calculate cost
-        duration = 50  # Default session duration
-        if session_type == 'intake':
-            duration = 90
-            cost = float(therapist.hourly_rate) * 1.5
-        else:
-            cost = float(therapist.hourly_rate)
-        
-        # Create appointment
-        appointment = Appointment.objects.create(
-            user=request.user,
-            therapist=therapist,
-            date_time=appointment_datetime,
-            duration_minutes=duration,
-            session_type=session_type,
-            notes_before=notes,
-            cost=cost,
-        )
+        try:
+            if data.get('hold_token'):
+                # Confirm a slot held through hold_slot
+                appointment = booking.confirm_hold(data['hold_token'], request.user, notes, therapist)
+            else:
+                appointment = booking.book(
+                    therapist, request.user, _parse_slot(data['datetime']),
+                    data.get('session_type', 'therapy'), notes,
+                )
+        except booking.SlotUnavailable as e:
+            return JsonResponse({'error': str(e)}, status=409)
         
         messages.success(request, f'Appointment booked with {therapist.full_name}!')
         return JsonResponse({'success': True, 'appointment_id': str(appointment.id)})
@@ -161,6 +121,59 @@ def book_appointment(request, therapist_id):
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
 
+@login_required
+@require_POST
+def book_series(request, therapist_id):
+    """Book a weekly series of sessions, e.g. every Tuesday at 15:00 for 12 weeks"""
+    therapist = get_object_or_404(Therapist, id=therapist_id, verified=True)
+    
+    try:
+        data = json.loads(request.body)
+        appointments = booking.book_series(
+            therapist, request.user, _parse_slot(data['datetime']), int(data.get('weeks', 12)),
+            data.get('session_type', 'therapy'), data.get('notes', ''),
+        )
+    except booking.SeriesConflict as e:
+        return JsonResponse({
+            'error': str(e),
+            'conflicts': [timezone.localtime(start).isoformat() for start in e.conflicts],
+        }, status=409)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    messages.success(request, f'{len(appointments)} weekly sessions booked with {therapist.full_name}!')
+    return JsonResponse({
+        'success': True,
+        'appointment_ids': [str(appointment.id) for appointment in appointments],
+    })
+
+@login_required
+@require_POST
+def hold_slot(request, therapist_id):
+    """Reserve a slot for a few minutes while the user confirms the booking"""
+    therapist = get_object_or_404(Therapist, id=therapist_id, verified=True)
+    
+    try:
+        data = json.loads(request.body)
+        hold = booking.place_hold(
+            therapist, request.user, _parse_slot(data['datetime']),
+            data.get('session_type', 'therapy'),
+        )
+    except booking.SlotUnavailable as e:
+        return JsonResponse({'error': str(e)}, status=409)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse({
+        'hold_token': str(hold.token),
+        'expires_at': hold.expires_at.isoformat(),
+    })
+
+def _parse_slot(value):
+    """Aware datetime of an ISO slot time; naive times are in the site timezone"""
+    slot = timezone.datetime.fromisoformat(value)
+    return timezone.make_aware(slot) if timezone.is_naive(slot) else slot
+
 @login_required
 def appointment_list(request):
     """List user's appointments"""
@@ -174,9 +187,43 @@ def appointment_list(request):
     context = {
         'upcoming_appointments': upcoming,
         'past_appointments': past,
+        'calendar_feed_url': request.build_absolute_uri(
+            reverse('professional:calendar-feed', args=[calendar_feed.feed_token(request.user)])
+        ),
     }
     return render(request, 'professional/appointment_list.html', context)
 
+def _calendar_feed_state(request, token):
+    """Feed user, last modification and ETag, looked up once per request"""
+    if not hasattr(request, '_calendar_feed_state'):
+        user = calendar_feed.user_for_token(token)
+        if user is None:
+            raise Http404('Unknown calendar feed')
+        request._calendar_feed_state = (user, *calendar_feed.feed_state(user))
+    return request._calendar_feed_state
+
+@login_required
+@require_POST
+def regenerate_calendar_feed(request):
+    """Replace the user's calendar feed URL; the previous one stops working"""
+    calendar_feed.regenerate_feed_key(request.user)
+    messages.success(request, 'Your calendar feed has a new address. Update the subscription in your calendar app.')
+    return redirect('professional:appointment-list')
+
+@require_safe
+@condition(
+    etag_func=lambda request, token: _calendar_feed_state(request, token)[2],
+    last_modified_func=lambda request, token: _calendar_feed_state(request, token)[1],
+)
+def calendar_feed_view(request, token):
+    """iCalendar feed of a user's appointments; the signed token in the URL replaces a login until it is regenerated"""
+    user, _, _ = _calendar_feed_state(request, token)
+    response = StreamingHttpResponse(
+        calendar_feed.iter_calendar(user), content_type='text/calendar; charset=utf-8',
+    )
+    response['Content-Disposition'] = 'inline; filename="mindbridge-appointments.ics"'
+    return response
+
 @login_required
 def appointment_detail(request, appointment_id):
     """Detailed appointment view"""
@@ -293,13 +340,9 @@ def leave_review(request, appointment_id):
             review.user = request.user
             review.therapist = appointment.therapist
             review.appointment = appointment
+            # Saving it also adds it to the therapist's rating aggregates (see ratings.py)
             review.save()
             
-            # Update therapist's overall rating - simplified for now
-            therapist = appointment.therapist
-            # Skip rating update until models are properly migrated
-            # This would normally update therapist.rating and therapist.total_reviews
-            
             messages.success(request, 'Review submitted successfully!')
             return redirect('appointment-detail', appointment_id=appointment_id)
     else:
@@ -4,57 +4,14 @@ from django.contrib import messages
 from django.db.models import Q, Avg, Count
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
-from django.core.paginator import Paginator
 from django.utils import timezone
 from datetime import datetime, timedelta
 import json
 
 from .models import Therapist, Appointment, TherapyGoal, InsuranceProvider
 from .forms import AppointmentForm, TherapistSearchForm, TherapyGoalForm
-
-@login_required
-def therapist_search(request):
-    """Search and filter therapists"""
-    form = TherapistSearchForm(request.GET or None)
-    therapists = Therapist.objects.filter(is_accepting_patients=True, verified=True)
-    
-    # Apply filters
-    if form.is_valid():
-        specialty = form.cleaned_data.get('specialty')
-        therapy_type = form.cleaned_data.get('therapy_type')
-        max_rate = form.cleaned_data.get('max_rate')
-        insurance = form.cleaned_data.get('insurance')
-        language = form.cleaned_data.get('language')
-        
-        if specialty:
-            therapists = therapists.filter(specializations__contains=[specialty])
-        
-        if therapy_type:
-            therapists = therapists.filter(therapy_types__contains=[therapy_type])
-        
-        if max_rate:
-            therapists = therapists.filter(hourly_rate__lte=max_rate)
-        
-        if insurance:
-            therapists = therapists.filter(accepts_insurance=True, insurance_accepted__contains=[insurance])
-        
-        if language:
-            therapists = therapists.filter(languages_spoken__contains=[language])
-    
-    # Order by rating and review count (simplified)
-    therapists = therapists.order_by('-rating', '-total_reviews', 'hourly_rate')
-    
-    # Pagination
-    paginator = Paginator(therapists, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    context = {
-        'form': form,
-        'therapists': page_obj,
-        'total_therapists': therapists.count(),
-    }
-    return render(request, 'professional/therapist_search.html', context)
+# Search is shared with the full views so it only exists once
+from .views import therapist_search
 
 @login_required
 def therapist_detail(request, therapist_id):
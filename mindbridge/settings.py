@@ -74,6 +74,49 @@ DATABASES = {
     }
 }
 
+# Caches
+# The matches cache uses LRU eviction: with CULL_FREQUENCY equal to
+# MAX_ENTRIES, LocMemCache drops exactly one least-recently-used entry
+# when full. The coordination cache holds the version counters of the
+# versioned caches, which must never be culled and must be shared by every
+# worker process; production points it at Redis.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'matches': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'therapist-matches',
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+            'CULL_FREQUENCY': 5000,
+        },
+    },
+    'coordination': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'coordination',
+    },
+}
+COORDINATION_CACHE_ALIAS = 'coordination'
+
+# Therapist matching
+MATCH_CACHE_ALIAS = 'matches'
+MATCH_CACHE_TIMEOUT = 300  # Seconds a cached ranking stays valid
+MATCH_RANKING_DEPTH = 200  # Ranking positions cached per client for the matches API
+MATCHING_USE_PRECOMPUTED = False  # Serve rows stored by `manage.py precompute_matches`
+MATCHING_RESCORE_ASYNC = True  # Re-score edited therapists on a background thread
+MATCHING_SNAPSHOT_MAX_AGE = 300  # Seconds before the compiled therapist pool is rebuilt regardless
+CLIENT_ASSIGNMENT_DAYS = 7  # Days an urgent client's assignment waits for a booking before it is released
+
+# Therapist search
+SEARCH_CACHE_TIMEOUT = 300  # Seconds cached facet and result counts stay valid
+SEARCH_COUNT_ESTIMATE_ABOVE = None  # Rows above which PostgreSQL planner estimates replace exact counts
+
+# Appointment booking
+SLOT_HOLD_SECONDS = 300  # How long a slot hold reserves a slot for its confirmation
+APPOINTMENT_REMINDER_HOURS = 24  # How long before a session its reminder email goes out
+APPOINTMENT_REMINDER_CLAIM_SECONDS = 600  # How long a claimed reminder is left to its worker before another one retries it
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {